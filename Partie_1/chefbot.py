@@ -1,31 +1,46 @@
 from dotenv import load_dotenv
-from groq import Groq
-from langfuse import observe, get_client, propagate_attributes
+from langfuse import get_client, propagate_attributes
+import asyncio
 import json
+import os
+import sys
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List
+
+# Permet d'importer le dossier common/ quand on lance Partie_1/chefbot.py
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.clients import get_async_groq, get_groq
+from common.llm import acomplete, complete
+from common.metrics import metrics, metrics_labels
+from common.rate_limit import get_rate_limiter
+from common.streaming import astream_completion, stream_completion
+from common.tracing import observe
 
 load_dotenv()
 
-groq_client = Groq()
-langfuse = get_client()
+MODEL_ID = "openai/gpt-oss-120b"
+SYSTEM_PROMPT = """
+                        Tu es un chef cuisinier français spécialisé en cuisine de saison
+                        """
+
+# Nombre max d'appels Groq simultanés pendant un balayage de températures
+MAX_CONCURRENCY = 4
+
+
+def _chef_messages(question: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": question},
+    ]
+
 
 @observe(name="Groupe_SZUREK_KUSNIEREK_GOSSELIN_Partie_1")
 def ask_chef(question:str,temperature:float)->str:
-    with propagate_attributes(tags=["Partie_1","Groupe_SZUREK_KUSNIEREK_GOSSELIN"]):
+    with propagate_attributes(tags=["Partie_1","Groupe_SZUREK_KUSNIEREK_GOSSELIN"]), metrics_labels(part="1"):
         try:
-            response = groq_client.chat.completions.create(
-                model="openai/gpt-oss-120b",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": 
-                        """
-                        Tu es un chef cuisinier français spécialisé en cuisine de saison
-                        """
-                    },
-                    {"role": "user", "content": question}
-                ],
-                temperature=temperature
-                )
+            response = complete(MODEL_ID, _chef_messages(question), temperature=temperature)
 
 
             get_client().update_current_span(
@@ -43,18 +58,122 @@ def ask_chef(question:str,temperature:float)->str:
                 level="ERROR",
                 status_message=str(e)
             )
+            raise
+    return response.choices[0].message.content
+
+
+@observe(name="Groupe_SZUREK_KUSNIEREK_GOSSELIN_Partie_1")
+async def ask_chef_async(question: str, temperature: float) -> str:
+    """Version asynchrone de ask_chef (même span Langfuse, même metadata)."""
+    with propagate_attributes(tags=["Partie_1", "Groupe_SZUREK_KUSNIEREK_GOSSELIN"]), metrics_labels(part="1"):
+        waits: List[float] = []
+        start = time.perf_counter()
+        try:
+            response = await acomplete(MODEL_ID, _chef_messages(question), queue_waits=waits, temperature=temperature)
+        except Exception as e:
+            get_client().update_current_span(level="ERROR", status_message=str(e))
+            raise
+
+        get_client().update_current_span(
+            metadata={
+                "type": "response",
+                "season": "winter",
+                "output": response.choices[0].message.content,
+                "temperature": temperature,
+                "partie": "1",
+                "latency_s": round(time.perf_counter() - start, 3),
+                "queue_wait_s": round(sum(waits), 3),
+                "attempts": len(waits),
+                "status": "success",
+            }
+        )
     return response.choices[0].message.content
 
+
+@observe(name="Groupe_SZUREK_KUSNIEREK_GOSSELIN_Partie_1_sweep")
+async def ask_chef_many(
+    question: str,
+    temperatures: List[float],
+    max_concurrency: int = MAX_CONCURRENCY,
+) -> List[Dict[str, Any]]:
+    """
+    Envoie une requête par température en parallèle (au plus `max_concurrency`
+    en vol) et retourne [{"temperature", "output", "latency_s"}] dans l'ordre
+    des températures.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _one(temperature: float) -> Dict[str, Any]:
+        async with semaphore:
+            start = time.perf_counter()
+            output = await ask_chef_async(question=question, temperature=temperature)
+            return {
+                "temperature": temperature,
+                "output": output,
+                "latency_s": time.perf_counter() - start,
+            }
+
+    with propagate_attributes(tags=["Partie_1", "Groupe_SZUREK_KUSNIEREK_GOSSELIN", "sweep"]):
+        start = time.perf_counter()
+        results = await asyncio.gather(*(_one(t) for t in temperatures))
+        wall_clock_s = time.perf_counter() - start
+
+        # Comparaison temps réel vs somme des latences (= coût d'une boucle séquentielle)
+        sum_latency_s = sum(r["latency_s"] for r in results)
+        get_client().update_current_span(
+            metadata={
+                "partie": "1",
+                "num_calls": len(results),
+                "max_concurrency": max_concurrency,
+                "wall_clock_s": round(wall_clock_s, 3),
+                "sum_latency_s": round(sum_latency_s, 3),
+                "speedup": round(sum_latency_s / wall_clock_s, 2) if wall_clock_s > 0 else None,
+                "rate_limit": get_rate_limiter().stats(),
+                "metrics": metrics.span_metadata(),
+                "status": "success",
+            }
+        )
+    return list(results)
+
+
+def ask_chef_stream(question: str, temperature: float) -> Iterator[str]:
+    """Comme ask_chef, mais renvoie les morceaux de réponse au fil de l'eau."""
+    return stream_completion(
+        get_groq(),
+        name="Groupe_SZUREK_KUSNIEREK_GOSSELIN_Partie_1_stream",
+        model=MODEL_ID,
+        messages=_chef_messages(question),
+        temperature=temperature,
+        metadata={"type": "response", "season": "winter", "partie": "1"},
+    )
+
+
+def ask_chef_stream_async(question: str, temperature: float) -> AsyncIterator[str]:
+    """Version `async for` de ask_chef_stream."""
+    return astream_completion(
+        get_async_groq(),
+        name="Groupe_SZUREK_KUSNIEREK_GOSSELIN_Partie_1_stream",
+        model=MODEL_ID,
+        messages=_chef_messages(question),
+        temperature=temperature,
+        metadata={"type": "response", "season": "winter", "partie": "1"},
+    )
+
+
 if __name__ == "__main__":
     prompt = """
     Que proposez-vous comme repas pour ce midi ?
     """
     temperatures = [0.1, 0.7, 1.2]
-    for temperature in temperatures:
+    start = time.perf_counter()
+    results = asyncio.run(ask_chef_many(question=prompt, temperatures=temperatures))
+    wall_clock_s = time.perf_counter() - start
+
+    for result in results:
         print(
-            f"Temperature at {temperature}\n\n",
+            f"Temperature at {result['temperature']} ({result['latency_s']:.2f}s)\n\n",
             "_" * 50,
-            ask_chef(question=prompt, temperature=temperature),
+            result["output"],
             end="\n\n",
         )
         # Pour une température de 0.1 :
@@ -71,6 +190,8 @@ if __name__ == "__main__":
         # Une température basse prendra des réponses très stricts (prend
         # les probabilités les plus hautes et c'est tout).
         # Une température élevé aura des réponses bien plus flexible (probabilité plus réparti)
-        
 
-    langfuse.flush()
+    sum_latency_s = sum(r["latency_s"] for r in results)
+    print(f"Temps réel: {wall_clock_s:.2f}s | somme des latences: {sum_latency_s:.2f}s")
+
+    get_client().flush()
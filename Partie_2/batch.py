@@ -0,0 +1,135 @@
+"""
+Planification en lot: un plan_weekly_menu par ligne d'un fichier JSONL.
+
+    python batch.py foyers.jsonl menus.jsonl --workers 8
+
+Entrée : {"id": "foyer-42", "constraints": "..."} par ligne (id optionnel:
+         à défaut, hash des contraintes).
+Sortie : {"id", "status": "ok"|"error", "menu"|"error", "latency_s"} par ligne,
+         écrite au fil de l'eau. Relancer la même commande reprend là où le
+         run précédent s'est arrêté (les id déjà "ok" sont sautés).
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Set
+
+from langfuse import get_client
+
+from planner import plan_weekly_menu
+
+
+def _item_id(item: Dict[str, Any]) -> str:
+    if item.get("id") is not None:
+        return str(item["id"])
+    return hashlib.sha256(str(item.get("constraints", "")).encode("utf-8")).hexdigest()[:16]
+
+
+def _load_done(output_path: str) -> Set[str]:
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # dernière ligne coupée par un crash
+            if row.get("status") == "ok":
+                done.add(str(row.get("id")))
+    return done
+
+
+def _ends_mid_line(path: str) -> bool:
+    # crash pendant une écriture: on repart sur une nouvelle ligne
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+def _iter_items(input_path: str) -> Iterator[Dict[str, Any]]:
+    with open(input_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def run_batch(input_path: str, output_path: str, workers: int = 4) -> Dict[str, Any]:
+    done = _load_done(output_path)
+    lock = threading.Lock()
+    latencies: List[float] = []
+    stats = {"ok": 0, "failed": 0, "skipped": 0}
+
+    def _run_one(item: Dict[str, Any], item_id: str) -> None:
+        start = time.perf_counter()
+        try:
+            menu = plan_weekly_menu(item["constraints"], flush=False)
+            row = {"id": item_id, "status": "ok", "menu": menu}
+        except Exception as e:
+            row = {"id": item_id, "status": "error", "error": f"{type(e).__name__}: {e}"}
+        row["latency_s"] = round(time.perf_counter() - start, 3)
+
+        with lock:
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()
+            stats["ok" if row["status"] == "ok" else "failed"] += 1
+            latencies.append(row["latency_s"])
+
+    start = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        if _ends_mid_line(output_path):
+            out.write("\n")
+        # Au plus 2 * workers foyers en mémoire: l'entrée est lue au fil de l'eau
+        in_flight = set()
+        for item in _iter_items(input_path):
+            item_id = _item_id(item)
+            if item_id in done:
+                stats["skipped"] += 1
+                continue
+            done.add(item_id)  # doublons dans l'entrée
+            if len(in_flight) >= 2 * workers:
+                _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            in_flight.add(pool.submit(_run_one, item, item_id))
+        wait(in_flight)
+
+    wall_s = time.perf_counter() - start
+    get_client().flush()
+
+    processed = stats["ok"] + stats["failed"]
+    return {
+        **stats,
+        "wall_s": round(wall_s, 2),
+        "throughput_per_min": round(processed / wall_s * 60, 2) if wall_s > 0 else None,
+        "latency_p50_s": _percentile(latencies, 0.50),
+        "latency_p95_s": _percentile(latencies, 0.95),
+    }
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Planification de menus en lot (JSONL -> JSONL).")
+    parser.add_argument("input", help="JSONL: {id, constraints} par ligne")
+    parser.add_argument("output", help="JSONL des résultats (ouvert en ajout, sert aussi à la reprise)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("CHEFBOT_BATCH_WORKERS", "4")))
+    args = parser.parse_args(argv)
+
+    report = run_batch(args.input, args.output, workers=args.workers)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
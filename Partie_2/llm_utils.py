@@ -1,41 +1,49 @@
-import json
-from typing import Any, Dict, List
+import os
+import sys
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 
 from dotenv import load_dotenv
-from groq import Groq
-from langfuse import get_client
 
-load_dotenv()
+# Permet d'importer le dossier common/ quand on lance main.py depuis ce dossier
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common import llm
+from common.llm import SchemaValidationError, record_usage, response_cache
+from common.metrics import metrics, metrics_labels
+from common.rate_limit import get_rate_limiter
+from common.resilience import resilience_stats
+from common.tracing import observe
 
-groq_client = Groq()
-langfuse = get_client()
+load_dotenv()
 
 MODEL_ID = "openai/gpt-oss-120b"
 
 
-def chat(messages: List[Dict[str, str]], temperature: float = 0.2) -> str:
-    resp = groq_client.chat.completions.create(
-        model=MODEL_ID,
-        messages=messages,
-        temperature=temperature,
-    )
-    return (resp.choices[0].message.content or "").strip()
+def chat(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.2,
+    use_cache: bool = True,
+    model: str = MODEL_ID,
+    accept: Optional[Callable[[str], bool]] = None,
+) -> str:
+    return llm.chat(messages, temperature=temperature, use_cache=use_cache, model=model, accept=accept)
+
 
+def chat_stream(messages: List[Dict[str, str]], temperature: float = 0.2) -> Iterator[str]:
+    return llm.chat_stream(messages, temperature=temperature, model=MODEL_ID)
 
-def safe_json_loads(raw: str) -> Any:
-    raw = raw.strip()
-    try:
-        return json.loads(raw)
-    except Exception:
-        pass
 
-    # extraction JSON si le modèle ajoute du texte
-    a, b = raw.find("{"), raw.rfind("}")
-    if a != -1 and b != -1 and b > a:
-        return json.loads(raw[a : b + 1])
+def achat_stream(messages: List[Dict[str, str]], temperature: float = 0.2) -> AsyncIterator[str]:
+    return llm.achat_stream(messages, temperature=temperature, model=MODEL_ID)
 
-    a, b = raw.find("["), raw.rfind("]")
-    if a != -1 and b != -1 and b > a:
-        return json.loads(raw[a : b + 1])
 
-    raise ValueError("JSON introuvable dans la réponse.")
+def chat_json(
+    messages: List[Dict[str, str]],
+    schema: Dict[str, Any],
+    name: str,
+    temperature: float = 0.2,
+    fill: Optional[Callable[[Any], Any]] = None,
+    model: str = MODEL_ID,
+) -> Tuple[Any, Dict[str, Any]]:
+    return llm.chat_json(messages, schema, name, temperature=temperature, model=model, fill=fill)
@@ -7,11 +7,16 @@ import sys
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT)
 
-from Partie_1.chefbot import ask_chef  # Partie 1 (inchangée)
 from Partie_2.planner import plan_weekly_menu
+from llm_utils import response_cache
+from plan_cache import get_plan_cache
+from routing import get_router
 
 
 def run_part1_demo():
+    # Import local: la Partie 1 n'est chargée que si on lance sa démo
+    from Partie_1.chefbot import ask_chef
+
     prompt = "Que proposez-vous comme repas pour ce midi ?"
     temperatures = [0.1, 0.7, 1.2]
     for t in temperatures:
@@ -23,6 +28,9 @@ def run_part2_demo():
     constraints = "Menu pour 2 personnes, budget moyen, cuisine de saison, sans porc, 2 repas végétariens, rapide en semaine."
     menu = plan_weekly_menu(constraints)
     print(json.dumps(menu, indent=2, ensure_ascii=False))
+    print("Cache LLM:", response_cache.stats())
+    print("Cache de plans:", get_plan_cache().stats())
+    print("Routage des modèles:", json.dumps(get_router().stats(), indent=2))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,231 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.cache import DEFAULT_CACHE_PATH
+from common.cassette import llm_mode
+
+# Paramètres reconnus dans les contraintes: "<nombre> <mot>" et exclusions ("sans porc")
+_QUANTITY = re.compile(r"(?<![\d.,])(\d+(?:[.,]\d+)?) ([a-z]+)")
+_EXCLUSION = re.compile(r"\b(sans|allergie aux?|allergique aux?) ([a-z]+(?: d[eu] [a-z]+)?)")
+_LIGATURES = {"œ": "oe", "æ": "ae", "ß": "ss"}
+
+
+def prompt_version(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+def _fold_with_map(text: str) -> Tuple[str, List[int]]:
+    """Texte en minuscules sans accents + index du caractère d'origine pour chaque caractère plié."""
+    out: List[str] = []
+    index: List[int] = []
+    for i, c in enumerate(text.lower()):
+        folded = _LIGATURES.get(c) or unicodedata.normalize("NFD", c)[0]
+        out.append(folded)
+        index.extend([i] * len(folded))
+    return "".join(out), index
+
+
+def normalize_constraints(constraints: str) -> str:
+    t = re.sub(r"[^a-z0-9.,]+", " ", _fold_with_map(constraints)[0])
+    return re.sub(r"\s+", " ", t).strip(" .,")
+
+
+def constraint_profile(normalized: str) -> Tuple[str, Dict[str, List[str]]]:
+    """Profil = contraintes normalisées avec les paramètres remplacés par des jokers."""
+    exclusions = [m.group(2) for m in _EXCLUSION.finditer(normalized)]
+    profile = _EXCLUSION.sub(lambda m: f"{m.group(1)} <x>", normalized)
+    quantities = [f"{m.group(1)} {m.group(2)}" for m in _QUANTITY.finditer(profile)]
+    profile = _QUANTITY.sub(lambda m: f"<n> {m.group(2)}", profile)
+    return profile, {"quantities": quantities, "exclusions": exclusions}
+
+
+def _pattern(value: str) -> str:
+    return rf"(?<![\w.,]){re.escape(value)}(?!\w)"
+
+
+def _replace_folded(text: str, old: str, new: str) -> str:
+    # Recherche sans accents, remplacement dans le texte d'origine
+    folded, index = _fold_with_map(text)
+    out, last = [], 0
+    for m in re.finditer(_pattern(old), folded):
+        start, end = index[m.start()], index[m.end() - 1] + 1
+        out.append(text[last:start])
+        out.append(new)
+        last = end
+    out.append(text[last:])
+    return "".join(out)
+
+
+def swap_parameters(plan: Dict[str, Any], old: Dict[str, List[str]], new: Dict[str, List[str]]) -> Optional[Dict[str, Any]]:
+    """
+    Adapte un plan mis en cache aux paramètres des nouvelles contraintes.
+    None si l'échange est ambigu (même ancienne valeur -> deux nouvelles valeurs)
+    ou si une ancienne valeur reste dans le plan après remplacement.
+    """
+    pairs: Dict[str, str] = {}
+    for kind in ("quantities", "exclusions"):
+        if len(old.get(kind, [])) != len(new.get(kind, [])):
+            return None
+        for a, b in zip(old[kind], new[kind]):
+            if pairs.setdefault(a, b) != b:
+                return None
+    changes = {a: b for a, b in pairs.items() if a != b}
+    new_numbers = {q.split(" ")[0] for q in new.get("quantities", [])}
+
+    plan = copy.deepcopy(plan)
+    for step in plan.get("steps", []):
+        for field in ("title", "prompt"):
+            if not isinstance(step.get(field), str):
+                continue
+            # jetons temporaires pour ne pas enchaîner 2->4 puis 4->6
+            text = step[field]
+            for i, value in enumerate(changes):
+                text = _replace_folded(text, value, f"\x00{i}\x00")
+            for i, value in enumerate(changes.values()):
+                text = text.replace(f"\x00{i}\x00", value)
+
+            # ancienne valeur encore présente (ex: nombre seul, autre formulation) -> plan périmé
+            folded = _fold_with_map(text)[0]
+            stale = list(changes) + [a.split(" ")[0] for a in changes if a.split(" ")[0] not in new_numbers]
+            if any(re.search(_pattern(v), folded) for v in stale):
+                return None
+            step[field] = text
+    return plan
+
+
+class PlanCache:
+    """
+    Cache des plans de _plan_steps, clé = contraintes normalisées + version des prompts.
+    Mode gabarit: sans entrée exacte, réutilise le plan le plus récent du même profil
+    en remplaçant ses paramètres (nombre de personnes, allergène...).
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, enabled: Optional[bool] = None):
+        self.path = path
+        # En enregistrement, chaque plan passe par le LLM pour avoir sa cassette
+        self.enabled = llm_mode() != "record" if enabled is None else enabled
+        self._conn: Optional[sqlite3.Connection] = None
+        self._memory: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits_exact = 0
+        self.hits_template = 0
+        self.template_rejected = 0
+        self.misses = 0
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS plans ("
+                " key TEXT PRIMARY KEY, profile TEXT NOT NULL, prompt_version TEXT NOT NULL,"
+                " params TEXT NOT NULL, plan TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS plans_profile ON plans(profile, prompt_version)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _key(normalized: str, version: str) -> str:
+        return hashlib.sha256(f"{version}\x1f{normalized}".encode("utf-8")).hexdigest()
+
+    def lookup(self, constraints: str, version: str, allow_template: bool = False) -> Tuple[Optional[Dict[str, Any]], str]:
+        """(plan, source) avec source dans "exact" / "template" / "miss" / "disabled"."""
+        if not self.enabled:
+            return None, "disabled"
+        normalized = normalize_constraints(constraints)
+        key = self._key(normalized, version)
+        with self._lock:
+            row = self._memory.get(key)
+            db = self._db()
+            if row is None and db is not None:
+                found = db.execute("SELECT params, plan FROM plans WHERE key = ?", (key,)).fetchone()
+                if found:
+                    row = {"params": json.loads(found[0]), "plan": json.loads(found[1])}
+                    self._memory[key] = row
+            if row is not None:
+                self.hits_exact += 1
+                return copy.deepcopy(row["plan"]), "exact"
+
+            if allow_template and db is not None:
+                profile, params = constraint_profile(normalized)
+                found = db.execute(
+                    "SELECT params, plan FROM plans WHERE profile = ? AND prompt_version = ?"
+                    " ORDER BY created_at DESC LIMIT 1",
+                    (profile, version),
+                ).fetchone()
+                if found:
+                    plan = swap_parameters(json.loads(found[1]), json.loads(found[0]), params)
+                    if plan is not None:
+                        self.hits_template += 1
+                        return plan, "template"
+                    self.template_rejected += 1
+
+            self.misses += 1
+            return None, "miss"
+
+    def store(self, constraints: str, version: str, plan: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        normalized = normalize_constraints(constraints)
+        key = self._key(normalized, version)
+        profile, params = constraint_profile(normalized)
+        with self._lock:
+            self._memory[key] = {"params": params, "plan": copy.deepcopy(plan)}
+            db = self._db()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO plans (key, profile, prompt_version, params, plan, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, profile, version, json.dumps(params), json.dumps(plan, ensure_ascii=False), time.time()),
+                )
+                db.commit()
+
+    def invalidate(self, keep_version: Optional[str] = None) -> int:
+        """Supprime les plans (tous, ou ceux d'une autre version de prompt que keep_version)."""
+        with self._lock:
+            self._memory.clear()
+            db = self._db()
+            if db is None:
+                return 0
+            if keep_version is None:
+                cur = db.execute("DELETE FROM plans")
+            else:
+                cur = db.execute("DELETE FROM plans WHERE prompt_version != ?", (keep_version,))
+            db.commit()
+            return cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.hits_exact + self.hits_template
+        total = hits + self.misses
+        return {
+            "hits_exact": self.hits_exact,
+            "hits_template": self.hits_template,
+            "template_rejected": self.template_rejected,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 3) if total else None,
+        }
+
+
+_plan_cache: Optional[PlanCache] = None
+
+
+def get_plan_cache() -> PlanCache:
+    global _plan_cache
+    if _plan_cache is None:
+        _plan_cache = PlanCache()
+    return _plan_cache
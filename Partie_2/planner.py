@@ -1,71 +1,192 @@
 import json
-from typing import Any, Dict
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Any, Dict, List, Optional, Set
 
-from langfuse import observe, get_client, propagate_attributes
+from langfuse import get_client, propagate_attributes
 
-from llm_utils import chat, safe_json_loads, langfuse
+from llm_utils import chat, chat_json, get_rate_limiter, metrics, metrics_labels, observe, resilience_stats, response_cache
+from plan_cache import get_plan_cache, prompt_version
+from routing import get_router, step_output_ok
+from step_context import StepContextManager
 
 GROUP = "Groupe_SZUREK_KUSNIEREK_GOSSELIN"
 
+# Nombre max d'étapes exécutées en même temps quand le plan déclare depends_on
+MAX_PARALLEL_STEPS = int(os.getenv("CHEFBOT_MAX_PARALLEL_STEPS", "4"))
+
+# Mode gabarit du cache de plans (réutilise le plan d'un profil de contraintes proche)
+PLAN_TEMPLATE_MODE = os.getenv("CHEFBOT_PLAN_TEMPLATES", "0") == "1"
+
+PLAN_SYSTEM = "Tu es un planificateur. Réponds UNIQUEMENT en JSON valide."
+PLAN_USER = """
+Contraintes:
+{constraints}
+
+Retourne un JSON EXACT:
+{{
+  "steps": [
+    {{"id": 1, "title": "...", "prompt": "...", "depends_on": []}}
+  ]
+}}
+"depends_on" liste les id des étapes dont le résultat est nécessaire
+(liste vide si l'étape est indépendante).
+"""
+PLAN_RETRY_SYSTEM = "Tu dois produire UNIQUEMENT un JSON valide. Aucun texte. Aucun backtick."
+PLAN_RETRY_USER = """
+Contraintes:
+{constraints}
+
+Retourne EXACTEMENT:
+{{
+  "steps": [
+    {{"id": 1, "title": "...", "prompt": "...", "depends_on": []}}
+  ]
+}}
+"""
+
+# Schémas des sorties JSON (mode structured output + validation locale)
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "steps": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "title": {"type": "string"},
+                    "prompt": {"type": "string"},
+                    # Requis (le mode json_schema strict l'exige), liste vide permise, sans défaut:
+                    # null ou absent (mode json_object) -> pas de dépendances déclarées, exécution en séquence
+                    "depends_on": {"type": ["array", "null"], "items": {"type": "integer"}},
+                },
+                "required": ["id", "title", "prompt", "depends_on"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["steps"],
+    "additionalProperties": False,
+}
+
+WEEKLY_MENU_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "weekly_menu": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "day": {"type": "string"},
+                    "lunch": {"type": "string"},
+                    "dinner": {"type": "string"},
+                    "notes": {"type": "string", "default": ""},
+                },
+                "required": ["day", "lunch", "dinner", "notes"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["weekly_menu"],
+    "additionalProperties": False,
+}
+
+# Change dès qu'un prompt de planification ou le modèle change -> invalide le cache de plans
+PLAN_PROMPT_VERSION = prompt_version(
+    repr(get_router().routes["plan"]), PLAN_SYSTEM, PLAN_USER, PLAN_RETRY_SYSTEM, PLAN_RETRY_USER, json.dumps(PLAN_SCHEMA, sort_keys=True)
+)
+
 
 @observe(name=f"{GROUP}_Partie_2",as_type="chain")
-def plan_weekly_menu(constraints: str) -> Dict[str, Any]:
+def plan_weekly_menu(
+    constraints: str,
+    use_plan_cache: bool = True,
+    plan_templates: bool = PLAN_TEMPLATE_MODE,
+    flush: bool = True,
+) -> Dict[str, Any]:
     # Trace + tags groupe
-    with propagate_attributes(tags=["Partie_2", GROUP]):
+    with propagate_attributes(tags=["Partie_2", GROUP]), metrics_labels(part="2"):
         get_client().update_current_span(metadata={"partie": "2", "status": "start"})
 
-        plan = _plan_steps_with_retry(constraints)
-
-        context: Dict[str, Any] = {"constraints": constraints}
-        step_outputs: Dict[str, str] = {}
+        plan = _cached_plan(constraints, use_plan_cache, plan_templates)
 
-        # Exécution multi-étapes (1 call / step)
-        for step in plan["steps"]:
-            key = f"{step.get('id', len(step_outputs)+1)}_{step.get('title', 'step')}"
-            out = _execute_step(step, context)
-            step_outputs[key] = out
-            context["step_outputs"] = step_outputs
+        # Exécution multi-étapes (1 call / step), en parallèle si le plan le permet
+        step_outputs = _run_steps(plan["steps"], constraints)
 
         menu = _synthesize(constraints, plan, step_outputs)
 
-        get_client().update_current_span(metadata={"status": "success"})
-        langfuse.flush()
+        get_client().update_current_span(
+            metadata={
+                "status": "success",
+                "cache": response_cache.stats(),
+                "plan_cache": get_plan_cache().stats(),
+                "rate_limit": get_rate_limiter().stats(),
+                "resilience": resilience_stats(),
+                "routing": get_router().stats(),
+                "metrics": metrics.span_metadata(),
+            }
+        )
+        if flush:
+            get_client().flush()
         return menu
 
 
-@observe(name=f"plan")
-def _plan_steps(constraints: str) -> Dict[str, Any]:
-    with propagate_attributes(tags=["Partie_2", GROUP, "plan"]):
-        system = "Tu es un planificateur. Réponds UNIQUEMENT en JSON valide."
-        user = f"""
-Contraintes:
-{constraints}
+@observe(name=f"plan_cache")
+def _cached_plan(constraints: str, use_plan_cache: bool, plan_templates: bool) -> Dict[str, Any]:
+    if not use_plan_cache:
+        return _plan_steps_with_retry(constraints)
 
-Retourne un JSON EXACT:
-{{
-  "steps": [
-    {{"id": 1, "title": "...", "prompt": "..."}}
-  ]
-}}
-"""
+    plan_cache = get_plan_cache()
+    plan, source = plan_cache.lookup(constraints, PLAN_PROMPT_VERSION, allow_template=plan_templates)
+    if plan is None:
+        plan = _plan_steps_with_retry(constraints)
+        plan_cache.store(constraints, PLAN_PROMPT_VERSION, plan)
 
-        raw = chat(
-            messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
-            temperature=0.2,
-        )
+    get_client().update_current_span(metadata={"plan_source": source, "prompt_version": PLAN_PROMPT_VERSION})
+    return plan
 
-        try:
-            plan = safe_json_loads(raw)
-            if not isinstance(plan, dict) or "steps" not in plan or not isinstance(plan["steps"], list):
-                raise ValueError("Structure JSON invalide: clé 'steps' attendue.")
 
-            get_client().update_current_span(metadata={"num_steps": len(plan["steps"]), "status": "success"})
-            return plan
+def _fill_step_ids(plan: Any) -> Any:
+    # id manquant -> position dans le plan (réparation locale, sans appel LLM)
+    if isinstance(plan, dict) and isinstance(plan.get("steps"), list):
+        for i, step in enumerate(plan["steps"]):
+            if isinstance(step, dict) and step.get("id") is None:
+                step["id"] = i + 1
+    return plan
+
+
+@observe(name=f"plan")
+def _plan_steps(constraints: str) -> Dict[str, Any]:
+    with propagate_attributes(tags=["Partie_2", GROUP, "plan"]):
+        system = PLAN_SYSTEM
+        user = PLAN_USER.format(constraints=constraints)
 
+        try:
+            (plan, report), model = get_router().run(
+                "plan",
+                lambda model: chat_json(
+                    messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
+                    schema=PLAN_SCHEMA,
+                    name="plan",
+                    temperature=0.2,
+                    fill=_fill_step_ids,
+                    model=model,
+                ),
+            )
         except Exception as e:
-            get_client().update_current_span(level="ERROR", status_message=str(e), metadata={"raw": raw[:800]})
+            get_client().update_current_span(level="ERROR", status_message=str(e), metadata=getattr(e, "report", None))
             raise
 
+        get_client().update_current_span(
+            metadata={"num_steps": len(plan["steps"]), "model": model, "status": "success", **report}
+        )
+        return plan
+
 
 @observe(name=f"plan_retry")
 def _plan_steps_with_retry(constraints: str) -> Dict[str, Any]:
@@ -73,36 +194,159 @@ def _plan_steps_with_retry(constraints: str) -> Dict[str, Any]:
         try:
             return _plan_steps(constraints)
         except Exception:
-            # 1 retry max, consigne plus stricte
-            system = "Tu dois produire UNIQUEMENT un JSON valide. Aucun texte. Aucun backtick."
-            user = f"""
-Contraintes:
-{constraints}
-
-Retourne EXACTEMENT:
-{{
-  "steps": [
-    {{"id": 1, "title": "...", "prompt": "..."}}
-  ]
-}}
-"""
-            raw = chat(
-                messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
-                temperature=0.0,
-            )
+            # 1 régénération complète max (JSON introuvable ou irréparable), consigne plus stricte
+            start = time.perf_counter()
+            system = PLAN_RETRY_SYSTEM
+            user = PLAN_RETRY_USER.format(constraints=constraints)
 
             try:
-                plan = safe_json_loads(raw)
-                if not isinstance(plan, dict) or "steps" not in plan or not isinstance(plan["steps"], list):
-                    raise ValueError("JSON toujours invalide après retry.")
-
-                get_client().update_current_span(metadata={"retry_used": True, "num_steps": len(plan["steps"])})
-                return plan
-
+                (plan, report), model = get_router().run(
+                    "plan",
+                    lambda model: chat_json(
+                        messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
+                        schema=PLAN_SCHEMA,
+                        name="plan",
+                        temperature=0.0,
+                        fill=_fill_step_ids,
+                        model=model,
+                    ),
+                )
             except Exception as e:
-                get_client().update_current_span(level="ERROR", status_message=str(e), metadata={"raw_retry": raw[:800]})
+                get_client().update_current_span(
+                    level="ERROR",
+                    status_message=str(e),
+                    metadata={"retry_count": 1, "retry_latency_s": round(time.perf_counter() - start, 3), **getattr(e, "report", {})},
+                )
                 raise
 
+            get_client().update_current_span(
+                metadata={
+                    "retry_used": True,
+                    "retry_count": 1,
+                    "retry_latency_s": round(time.perf_counter() - start, 3),
+                    "num_steps": len(plan["steps"]),
+                    "model": model,
+                    **report,
+                }
+            )
+            return plan
+
+
+def _step_key(step: Dict[str, Any], index: int) -> str:
+    return f"{step.get('id', index + 1)}_{step.get('title', 'step')}"
+
+
+def _dependency_graph(steps: List[Dict[str, Any]]) -> Optional[Dict[int, Set[int]]]:
+    """
+    index de l'étape -> index des étapes dont elle dépend.
+    None si aucune étape ne déclare depends_on, ou si le graphe a un cycle
+    (on retombe alors sur l'exécution séquentielle).
+    """
+    if not any(step.get("depends_on") is not None for step in steps):
+        return None
+
+    index_by_id = {str(step.get("id", i + 1)): i for i, step in enumerate(steps)}
+    graph: Dict[int, Set[int]] = {}
+    for i, step in enumerate(steps):
+        deps = step.get("depends_on") or []
+        if not isinstance(deps, list):
+            deps = [deps]
+        # dépendances inconnues ignorées
+        graph[i] = {index_by_id[str(d)] for d in deps if str(d) in index_by_id and index_by_id[str(d)] != i}
+
+    # Détection de cycle (Kahn)
+    remaining = {i: set(deps) for i, deps in graph.items()}
+    ready = [i for i, deps in remaining.items() if not deps]
+    seen = 0
+    while ready:
+        done = ready.pop()
+        seen += 1
+        for i, deps in remaining.items():
+            if done in deps:
+                deps.discard(done)
+                if not deps:
+                    ready.append(i)
+    return graph if seen == len(steps) else None
+
+
+def _ancestors(graph: Dict[int, Set[int]], index: int) -> Set[int]:
+    out: Set[int] = set()
+    todo = list(graph[index])
+    while todo:
+        i = todo.pop()
+        if i not in out:
+            out.add(i)
+            todo.extend(graph[i])
+    return out
+
+
+def _critical_path_len(graph: Dict[int, Set[int]]) -> int:
+    depth: Dict[int, int] = {}
+
+    def _depth(i: int) -> int:
+        if i not in depth:
+            depth[i] = 1 + max((_depth(d) for d in graph[i]), default=0)
+        return depth[i]
+
+    return max((_depth(i) for i in graph), default=0)
+
+
+def _run_steps(steps: List[Dict[str, Any]], constraints: str) -> Dict[str, str]:
+    keys = [_step_key(step, i) for i, step in enumerate(steps)]
+    graph = _dependency_graph(steps)
+    context_manager = StepContextManager(constraints)
+
+    if graph is None:
+        # Séquentiel: l'étape précédente en entier, les plus anciennes résumées
+        step_outputs: Dict[str, str] = {}
+        for i, (key, step) in enumerate(zip(keys, steps)):
+            previous = keys[:i]
+            context = context_manager.build(
+                direct={k: step_outputs[k] for k in previous[-1:]},
+                older={k: step_outputs[k] for k in previous[:-1]},
+            )
+            step_outputs[key] = _execute_step(step, context)
+
+        get_client().update_current_span(metadata={"execution": "sequential", **context_manager.stats()})
+        return step_outputs
+
+    # DAG: une étape part dès que toutes ses dépendances sont terminées
+    outputs: Dict[int, str] = {}
+    pending = set(range(len(steps)))
+    running = {}
+
+    def _run_one(i: int) -> str:
+        # Dépendances directes verbatim, ancêtres plus lointains résumés
+        older = _ancestors(graph, i) - graph[i]
+        context = context_manager.build(
+            direct={keys[d]: outputs[d] for d in sorted(graph[i])},
+            older={keys[a]: outputs[a] for a in sorted(older)},
+        )
+        return _execute_step(steps[i], context)
+
+    with ThreadPoolExecutor(max_workers=max(1, MAX_PARALLEL_STEPS)) as pool:
+        while pending or running:
+            for i in sorted(pending):
+                if graph[i] <= outputs.keys():
+                    # copy_context: garde le span Langfuse parent dans le thread
+                    future = pool.submit(copy_context().run, _run_one, i)
+                    running[future] = i
+                    pending.discard(i)
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                outputs[running.pop(future)] = future.result()
+
+    get_client().update_current_span(
+        metadata={
+            "execution": "dag",
+            "max_parallel_steps": MAX_PARALLEL_STEPS,
+            "critical_path_len": _critical_path_len(graph),
+            **context_manager.stats(),
+        }
+    )
+    return {keys[i]: outputs[i] for i in range(len(steps))}
+
 
 @observe(name=f"execute_step")
 def _execute_step(step: Dict[str, Any], context: Dict[str, Any]) -> str:
@@ -124,12 +368,19 @@ Consigne:
 {step_prompt}
 """
 
-        out = chat(
-            messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
-            temperature=0.3,
+        # Petit modèle d'abord, gros modèle seulement si la sortie est inutilisable
+        out, model = get_router().run(
+            "execute_step",
+            lambda model: chat(
+                messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
+                temperature=0.3,
+                model=model,
+                accept=step_output_ok,
+            ),
+            accept=step_output_ok,
         )
 
-        get_client().update_current_span(metadata={"step_id": step.get("id"), "step_title": step_title})
+        get_client().update_current_span(metadata={"step_id": step.get("id"), "step_title": step_title, "model": model})
         return out
 
 
@@ -158,16 +409,20 @@ Retourne:
 }}
 """
 
-        raw = chat(
-            messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
-            temperature=0.2,
-        )
-
         try:
-            menu = safe_json_loads(raw)
-            if not isinstance(menu, dict) or "weekly_menu" not in menu:
-                raise ValueError("JSON final invalide: clé 'weekly_menu' manquante.")
-            return menu
+            (menu, report), model = get_router().run(
+                "synthesis",
+                lambda model: chat_json(
+                    messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
+                    schema=WEEKLY_MENU_SCHEMA,
+                    name="weekly_menu",
+                    temperature=0.2,
+                    model=model,
+                ),
+            )
         except Exception as e:
-            get_client().update_current_span(level="ERROR", status_message=str(e), metadata={"raw": raw[:800]})
+            get_client().update_current_span(level="ERROR", status_message=str(e), metadata=getattr(e, "report", None))
             raise
+
+        get_client().update_current_span(metadata={"model": model, **report})
+        return menu
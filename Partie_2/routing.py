@@ -0,0 +1,142 @@
+"""
+Routage des modèles par étape du pipeline de planification.
+
+Chaque étape (plan, execute_step, summarize, synthesis) a un modèle par défaut;
+si la sortie ne passe pas la validation, l'appel est refait une seule fois avec
+le modèle de repli (le plus gros). Latence, tokens et coût estimé sont cumulés
+par étape et par modèle pour pouvoir ajuster la politique.
+
+Surcharge possible par variable d'environnement, ex.:
+    CHEFBOT_ROUTE_EXECUTE_STEP=openai/gpt-oss-120b
+    CHEFBOT_ROUTING=0   (tout sur MODEL_ID, comme avant)
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from llm_utils import MODEL_ID, SchemaValidationError, metrics_labels, record_usage
+
+from common.pricing import cost_usd
+
+T = TypeVar("T")
+
+SMALL_MODEL = "openai/gpt-oss-20b"
+LARGE_MODEL = MODEL_ID
+
+# Sortie d'étape plus courte que ça = considérée comme ratée -> modèle de repli
+MIN_STEP_OUTPUT_CHARS = 20
+
+
+@dataclass(frozen=True)
+class StageRoute:
+    model: str
+    escalate_to: Optional[str] = None
+
+
+DEFAULT_ROUTES: Dict[str, StageRoute] = {
+    "plan": StageRoute(LARGE_MODEL),
+    "execute_step": StageRoute(SMALL_MODEL, escalate_to=LARGE_MODEL),
+    "summarize": StageRoute(SMALL_MODEL, escalate_to=LARGE_MODEL),
+    "synthesis": StageRoute(LARGE_MODEL),
+}
+
+
+def routes_from_env() -> Dict[str, StageRoute]:
+    if os.getenv("CHEFBOT_ROUTING", "1") == "0":
+        return {stage: StageRoute(MODEL_ID) for stage in DEFAULT_ROUTES}
+
+    routes = dict(DEFAULT_ROUTES)
+    for stage, route in DEFAULT_ROUTES.items():
+        model = os.getenv(f"CHEFBOT_ROUTE_{stage.upper()}")
+        if model:
+            escalate_to = route.escalate_to if route.escalate_to != model else None
+            routes[stage] = StageRoute(model, escalate_to)
+    return routes
+
+
+def step_output_ok(output: str) -> bool:
+    return len(output.strip()) >= MIN_STEP_OUTPUT_CHARS
+
+
+class ModelRouter:
+    def __init__(self, routes: Optional[Dict[str, StageRoute]] = None):
+        self.routes = routes or routes_from_env()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def model_for(self, stage: str) -> str:
+        return self.routes[stage].model
+
+    def run(
+        self,
+        stage: str,
+        call: Callable[[str], T],
+        accept: Callable[[T], bool] = lambda _: True,
+    ) -> Tuple[T, str]:
+        """
+        Appelle `call(model)` avec le modèle de l'étape. Repli sur le gros modèle
+        si `accept` refuse la sortie ou si le JSON ne respecte pas le schéma.
+        Retourne (résultat, modèle utilisé).
+        """
+        route = self.routes[stage]
+        models = [route.model] + ([route.escalate_to] if route.escalate_to else [])
+
+        for n, model in enumerate(models):
+            last = n == len(models) - 1
+            start = time.perf_counter()
+            with record_usage() as usage, metrics_labels(stage=stage):
+                try:
+                    result = call(model)
+                except SchemaValidationError:
+                    self._record(stage, model, time.perf_counter() - start, usage, escalated=n > 0, failed=True)
+                    if last:
+                        raise
+                    continue
+            ok = accept(result)
+            self._record(stage, model, time.perf_counter() - start, usage, escalated=n > 0, failed=not ok)
+            if ok or last:
+                return result, model
+        raise AssertionError("unreachable")
+
+    def _record(self, stage: str, model: str, latency_s: float, usage: list, escalated: bool, failed: bool) -> None:
+        prompt_tokens = sum(u["prompt_tokens"] for u in usage)
+        completion_tokens = sum(u["completion_tokens"] for u in usage)
+        with self._lock:
+            by_model = self._stats.setdefault(stage, {}).setdefault(
+                model,
+                {"calls": 0, "escalations": 0, "failed": 0, "latency_s": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0},
+            )
+            by_model["calls"] += 1
+            by_model["escalations"] += int(escalated)
+            by_model["failed"] += int(failed)
+            by_model["latency_s"] += latency_s
+            by_model["prompt_tokens"] += prompt_tokens
+            by_model["completion_tokens"] += completion_tokens
+            by_model["cost_usd"] += cost_usd(model, prompt_tokens, completion_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {}
+            for stage, by_model in self._stats.items():
+                out[stage] = {
+                    model: {
+                        **s,
+                        "latency_s": round(s["latency_s"], 3),
+                        "avg_latency_s": round(s["latency_s"] / s["calls"], 3),
+                        "cost_usd": round(s["cost_usd"], 6),
+                    }
+                    for model, s in by_model.items()
+                }
+            return out
+
+
+_router: Optional[ModelRouter] = None
+
+
+def get_router() -> ModelRouter:
+    global _router
+    if _router is None:
+        _router = ModelRouter()
+    return _router
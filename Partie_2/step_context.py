@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from llm_utils import chat, observe, record_usage
+from routing import get_router, step_output_ok
+
+# Budget de tokens (estimé) pour le contexte envoyé à chaque étape
+STEP_TOKEN_BUDGET = int(os.getenv("CHEFBOT_STEP_TOKEN_BUDGET", "1500"))
+# Au-delà de cette taille, la sortie d'une ancienne étape est résumée
+SUMMARY_TOKENS = 200
+# En dessous de cette part du budget par sortie, les anciennes étapes ne sont pas envoyées
+MIN_SUMMARY_SHARE = 20
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 caractères par token: suffisant pour piloter un budget
+    return max(1, len(text) // 4)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[: max(0, max_chars - 1)] + "…"
+
+
+@observe(name="summarize_step")
+def _summarize_output(title: str, output: str) -> str:
+    system = (
+        "Tu résumes le résultat d'une étape de planification de menu. "
+        "Garde uniquement les décisions utiles pour la suite (plats, ingrédients, contraintes), en 5 puces max."
+    )
+    summary, _ = get_router().run(
+        "summarize",
+        lambda model: chat(
+            messages=[{"role": "system", "content": system}, {"role": "user", "content": f"Étape: {title}\n\n{output}"}],
+            temperature=0.0,
+            model=model,
+            accept=step_output_ok,
+        ),
+        accept=step_output_ok,
+    )
+    return summary
+
+
+class StepContextManager:
+    """
+    Construit le contexte de chaque étape du planner sous un budget de tokens:
+    - sorties des étapes dont elle dépend: verbatim
+    - sorties plus anciennes: résumées (un résumé par sortie, mis en cache)
+    Compte aussi les tokens économisés par rapport au contexte complet, nets
+    des tokens dépensés par les appels de résumé.
+    """
+
+    def __init__(self, constraints: str, token_budget: int = STEP_TOKEN_BUDGET):
+        self.constraints = constraints
+        self.token_budget = token_budget
+        self._summaries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.full_tokens = 0
+        self.sent_tokens = 0
+        self.summary_tokens = 0
+
+    def summary(self, key: str, output: str) -> str:
+        if estimate_tokens(output) <= SUMMARY_TOKENS:
+            return output
+        digest = hashlib.sha256(output.encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = self._summaries.get(digest)
+        if cached is not None:
+            return cached
+        with record_usage() as usage:
+            try:
+                summary = _summarize_output(key, output)
+            except Exception:
+                summary = _truncate(output, SUMMARY_TOKENS)
+        # Un résumé lu dans le cache LLM ne coûte rien
+        spent = sum(u["prompt_tokens"] + u["completion_tokens"] for u in usage if not u["cached"])
+        with self._lock:
+            self._summaries[digest] = summary
+            self.summary_tokens += spent
+        return summary
+
+    def build(self, direct: Dict[str, str], older: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        older = older or {}
+        available = self.token_budget - estimate_tokens(self.constraints)
+
+        verbatim = dict(direct)
+        if verbatim and sum(estimate_tokens(v) for v in verbatim.values()) > available:
+            share = max(1, available // len(verbatim))
+            verbatim = {k: _truncate(v, share) for k, v in verbatim.items()}
+            older = {}
+        left = available - sum(estimate_tokens(v) for v in verbatim.values())
+
+        # Budget vérifié avant les appels de résumé: on ne paie pas un résumé jeté ensuite
+        share = left // len(older) if older else 0
+        summaries = {k: self.summary(k, v) for k, v in older.items()} if share >= MIN_SUMMARY_SHARE else {}
+        if summaries and sum(estimate_tokens(v) for v in summaries.values()) > left:
+            summaries = {k: _truncate(v, share) for k, v in summaries.items()}
+
+        context: Dict[str, Any] = {"constraints": self.constraints, "step_outputs": verbatim}
+        if summaries:
+            context["earlier_steps_summary"] = summaries
+
+        # Référence: ce que l'on envoyait avant (toutes les sorties verbatim)
+        full = {"constraints": self.constraints, "step_outputs": {**older, **direct}}
+        with self._lock:
+            self.full_tokens += estimate_tokens(json.dumps(full, ensure_ascii=False))
+            self.sent_tokens += estimate_tokens(json.dumps(context, ensure_ascii=False))
+        return context
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "context_tokens_full": self.full_tokens,
+            "context_tokens_sent": self.sent_tokens,
+            "summary_tokens": self.summary_tokens,
+            "context_tokens_saved": self.full_tokens - self.sent_tokens - self.summary_tokens,
+            "summaries_cached": len(self._summaries),
+        }
@@ -1,140 +1,158 @@
 from __future__ import annotations
 
+import hashlib
 import json
-import re
+import math
+import os
 from datetime import datetime
-from typing import Any, Dict, List
-from llm_utils import chat, safe_json_loads, langfuse
+from typing import Any, Dict, List, Optional
+from ab_test import ABResult, SequentialTest, run_ab
+from cell_store import get_cell_store
+from dataset_sync import is_archived, sync_dataset
+from experiment import DEFAULT_CONCURRENCY, ExperimentResult, ExperimentRunner
+from judge_cache import get_judge_cache, is_complete, judge_key
+from llm_utils import MODEL_ID, chat, metrics_labels, observe, safe_json_loads
+from matcher import RULES_VERSION, compile_spec
+from results_store import get_results_store
+from validators import VALIDATORS_VERSION, check_limits, limits_score, prefilter
 
-from langfuse import Evaluation, get_client, observe
+from langfuse import Evaluation, get_client
 
 
 # =============================================================================
 # 3.1 - CREATE DATASET
 # =============================================================================
 
+DATASET_NAME = "chefbot-menu-eval"
+
+TEST_CASES = [
+    {
+        "input": {"constraints": "Repas pour diabétique, dîner léger. Éviter sucre, soda, pâtes blanches. Inclure légumes verts et protéines maigres. Max 600 kcal/repas."},
+        "expected_output": {
+            "must_avoid": ["sucre", "soda", "pâtes blanches"],
+            "must_include": ["légumes verts", "protéines maigres"],
+            "max_calories_per_meal": 600,
+        },
+        "metadata": {"category": "health_diabetic_light"},
+    },
+    {
+        "input": {"constraints": "Allergie sévère aux arachides + régime vegan. Budget 5€ par personne. Inclure légumineuses. Éviter arachide, beurre de cacahuète, miel, œuf, lait."},
+        "expected_output": {
+            "must_avoid": ["arachide", "cacahuète", "beurre de cacahuète", "miel", "œuf", "lait"],
+            "must_include": ["légumineuses"],
+            "budget_per_person_eur_max": 5,
+        },
+        "metadata": {"category": "allergy_peanut_vegan_budget"},
+    },
+    {
+        "input": {"constraints": "Menu pour 6 convives style méditerranéen. Inclure huile d'olive, tomates, herbes (basilic/origan). Éviter porc. Option sans gluten si possible (éviter blé, farine de blé)."},
+        "expected_output": {
+            "must_avoid": ["porc", "blé", "farine de blé"],
+            "must_include": ["huile d'olive", "tomates", "basilic", "origan"],
+            "servings": 6,
+        },
+        "metadata": {"category": "cultural_mediterranean_group"},
+    },
+    {
+        "input": {"constraints": "Régime pauvre en sel (hypertension). Éviter sel, sauce soja, charcuterie. Inclure épices/aromates (citron, ail) et légumes. Recette simple en 20 minutes."},
+        "expected_output": {
+            "must_avoid": ["sel", "sauce soja", "charcuterie"],
+            "must_include": ["citron", "ail", "légumes"],
+            "max_minutes": 20,
+        },
+        "metadata": {"category": "low_sodium_quick"},
+    },
+    {
+        "input": {"constraints": "Préférences: cuisine japonaise maison. Inclure riz, gingembre. Éviter poisson cru (grossesse). Idée bento. Éviter alcool (mirin/saké)."},
+        "expected_output": {
+            "must_avoid": ["poisson cru", "mirin", "saké", "alcool"],
+            "must_include": ["riz", "gingembre"],
+            "style": "japonais",
+        },
+        "metadata": {"category": "cultural_japanese_pregnancy"},
+    },
+]
+
+
 @observe(name="creation_database")
-def create_chefbot_dataset() -> None:
+def create_chefbot_dataset() -> Dict[str, int]:
     """
-    Create Langfuse dataset: chefbot-menu-eval
+    Create / sync Langfuse dataset: chefbot-menu-eval
     Each item:
       - input: {"constraints": "..."} (string that describes constraints)
       - expected_output: {"must_avoid": [...], "must_include": [...]} (+ optional criteria)
+
+    Idempotent: each case has a stable id, so re-running only sends new or
+    changed cases and archives duplicates left by older runs (see dataset_sync.py).
+    Returns the counts of created / updated / archived / unchanged items.
     """
     client = get_client()
 
-    # Create dataset (if already exists, we just reuse it)
     try:
+        remote_items = client.get_dataset(DATASET_NAME).items
+    except Exception:
+        remote_items = None
+
+    if remote_items is None:
         client.create_dataset(
-            name="chefbot-menu-eval-GROUPE_SZUREK_KUSNIEREK_GOSSELIN",
+            name=DATASET_NAME,
             description="Evaluation dataset for ChefBot menu planning (constraints-based)",
             metadata={
                 "created_by": "chefbot_eval_script",
                 "domain": "meal_planning",
                 "version": "1.0",
+                "group": "GROUPE_SZUREK_KUSNIEREK_GOSSELIN",
             },
         )
-        print("✓ Dataset created: chefbot-menu-eval")
-    except Exception as e:
-        # Langfuse may throw if dataset exists (depending on version/config)
-        print(f"ℹ Dataset may already exist. Continuing. ({e})")
-
-    test_cases = [
-        {
-            "input": {"constraints": "Repas pour diabétique, dîner léger. Éviter sucre, soda, pâtes blanches. Inclure légumes verts et protéines maigres. Max 600 kcal/repas."},
-            "expected_output": {
-                "must_avoid": ["sucre", "soda", "pâtes blanches"],
-                "must_include": ["légumes verts", "protéines maigres"],
-                "max_calories_per_meal": 600,
-            },
-            "metadata": {"category": "health_diabetic_light"},
-        },
-        {
-            "input": {"constraints": "Allergie sévère aux arachides + régime vegan. Budget 5€ par personne. Inclure légumineuses. Éviter arachide, beurre de cacahuète, miel, œuf, lait."},
-            "expected_output": {
-                "must_avoid": ["arachide", "cacahuète", "beurre de cacahuète", "miel", "œuf", "lait"],
-                "must_include": ["légumineuses"],
-                "budget_per_person_eur_max": 5,
-            },
-            "metadata": {"category": "allergy_peanut_vegan_budget"},
-        },
-        {
-            "input": {"constraints": "Menu pour 6 convives style méditerranéen. Inclure huile d'olive, tomates, herbes (basilic/origan). Éviter porc. Option sans gluten si possible (éviter blé, farine de blé)."},
-            "expected_output": {
-                "must_avoid": ["porc", "blé", "farine de blé"],
-                "must_include": ["huile d'olive", "tomates", "basilic", "origan"],
-                "servings": 6,
-            },
-            "metadata": {"category": "cultural_mediterranean_group"},
-        },
-        {
-            "input": {"constraints": "Régime pauvre en sel (hypertension). Éviter sel, sauce soja, charcuterie. Inclure épices/aromates (citron, ail) et légumes. Recette simple en 20 minutes."},
-            "expected_output": {
-                "must_avoid": ["sel", "sauce soja", "charcuterie"],
-                "must_include": ["citron", "ail", "légumes"],
-                "max_minutes": 20,
-            },
-            "metadata": {"category": "low_sodium_quick"},
-        },
-        {
-            "input": {"constraints": "Préférences: cuisine japonaise maison. Inclure riz, gingembre. Éviter poisson cru (grossesse). Idée bento. Éviter alcool (mirin/saké)."},
-            "expected_output": {
-                "must_avoid": ["poisson cru", "mirin", "saké", "alcool"],
-                "must_include": ["riz", "gingembre"],
-                "style": "japonais",
-            },
-            "metadata": {"category": "cultural_japanese_pregnancy"},
-        },
-    ]
+        print(f"✓ Dataset created: {DATASET_NAME}")
 
-    # Add dataset items
-    for case in test_cases:
-        client.create_dataset_item(
-            dataset_name="chefbot-menu-eval",
-            input=case["input"],
-            expected_output=case["expected_output"],
-            metadata=case["metadata"],
-        )
-
-    print(f"✓ Added {len(test_cases)} items to chefbot-menu-eval")
+    report = sync_dataset(client, DATASET_NAME, TEST_CASES, remote_items=remote_items or [])
+    client.update_current_span(metadata={"dataset_sync": report})
+    print(f"✓ {DATASET_NAME} synced: {report}")
+    return report
 
 
 # =============================================================================
 # THE TASK (your planner)
 # =============================================================================
 
+PLANNER_SYSTEM = (
+    "Tu es ChefBot. Propose un menu/recette en français qui respecte STRICTEMENT les contraintes.\n"
+    "Réponds en texte clair, avec: titre(s), ingrédients, étapes courtes. "
+    "Évite de mentionner des ingrédients interdits."
+)
+PLANNER_TEMPERATURE = 0.4
+
+
 @observe(name="planner")
-def chefbot_planner(constraints: str) -> str:
+def chefbot_planner(
+    constraints: str,
+    system: str = PLANNER_SYSTEM,
+    temperature: float = PLANNER_TEMPERATURE,
+    model: str = MODEL_ID,
+    use_cache: bool = True,
+) -> str:
     """
     The function under test: returns a menu / recipe text (string).
-    Replace the prompt/model as needed to match your ChefBot.
+    Replace the prompt/model as needed to match your ChefBot
+    (or pass system / temperature / model, e.g. for run_ab_experiment).
     """
-    system = (
-        "Tu es ChefBot. Propose un menu/recette en français qui respecte STRICTEMENT les contraintes.\n"
-        "Réponds en texte clair, avec: titre(s), ingrédients, étapes courtes. "
-        "Évite de mentionner des ingrédients interdits."
-    )
-
-    raw = chat(
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": constraints},
-        ],
-        temperature=0.4,
-    )
+    with metrics_labels(stage="planner"):
+        raw = chat(
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": constraints},
+            ],
+            temperature=temperature,
+            use_cache=use_cache,
+            model=model,
+        )
     return raw
 
 
 # =============================================================================
 # 3.2 - PROGRAMMATIC EVALUATOR
 # =============================================================================
-@observe(name="normalisation",as_type="tool")
-def _normalize(text: str) -> str:
-    # simple normalization for matching
-    t = text.lower()
-    t = re.sub(r"\s+", " ", t).strip()
-    return t
-    
 @observe(name="evaluateur")
 def rule_evaluator(output: str, expected: dict) -> dict:
     """
@@ -142,29 +160,11 @@ def rule_evaluator(output: str, expected: dict) -> dict:
       - must_avoid not mentioned -> 0 or 1
       - must_include mentioned -> proportional score
     Returns a dict of scores.
-    """
-    out = _normalize(output or "")
-    must_avoid = [str(x).lower() for x in expected.get("must_avoid", [])]
-    must_include = [str(x).lower() for x in expected.get("must_include", [])]
-
-    # must_avoid: fail if ANY forbidden ingredient appears
-    forbidden_hits = [x for x in must_avoid if x and x in out]
-    avoid_score = 1.0 if len(forbidden_hits) == 0 else 0.0
 
-    # must_include: proportional
-    include_hits = [x for x in must_include if x and x in out]
-    include_score = 1.0 if len(must_include) == 0 else (len(include_hits) / len(must_include))
-
-    # Optional: overall
-    overall = (avoid_score + include_score) / 2.0
-
-    return {
-        "must_avoid_ok": avoid_score,
-        "must_include_coverage": include_score,
-        "overall_rules": overall,
-        "debug_forbidden_hits": forbidden_hits,
-        "debug_include_hits": include_hits,
-    }
+    Matching is word-based and accent-insensitive (see matcher.py); to score a
+    whole dump without one span per output, use matcher.score_outputs.
+    """
+    return compile_spec(expected).score(output or "")
 
 
 # =============================================================================
@@ -193,84 +193,276 @@ Réponds UNIQUEMENT en JSON strict:
 Aucun texte hors JSON.
 """
 
+JUDGE_TEMPERATURE = 0.1
+# Change dès que le prompt du juge change: les jugements stockés ne sont plus réutilisés
+JUDGE_PROMPT_VERSION = hashlib.sha256(JUDGE_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+
+def _judgment_ok(raw: str) -> bool:
+    try:
+        return is_complete(safe_json_loads(raw))
+    except ValueError:
+        return False
+
+
 @observe(name="llm-judge", as_type="generation")
-def llm_judge(question: str, output: str, expected: dict) -> dict:
+def llm_judge(question: str, output: str, expected: dict, use_cache: bool = True) -> dict:
+    """
+    Scores one output with the judge prompt. A judgment already stored for the
+    same (prompt version, model, temperature, question, output, expected) is
+    returned without calling the LLM (see judge_cache.py).
+    """
+    store = get_judge_cache()
+    key = judge_key(JUDGE_PROMPT_VERSION, MODEL_ID, JUDGE_TEMPERATURE, question, output, expected)
+    if use_cache:
+        cached = store.get(key)
+        if cached is not None:
+            get_client().update_current_span(metadata={"judge_cache": "hit", "prompt_version": JUDGE_PROMPT_VERSION})
+            return cached
+
     user_message = (
         f"question:\n{question}\n\n"
         f"output:\n{output}\n\n"
         f"expected:\n{json.dumps(expected, ensure_ascii=False)}"
     )
 
-    raw = chat(
-        messages=[
-            {"role": "system", "content": JUDGE_PROMPT},
-            {"role": "user", "content": user_message},
-        ],
-        temperature=0.1,
-    )
-    return safe_json_loads(raw)
+    with metrics_labels(stage="judge"):
+        raw = chat(
+            messages=[
+                {"role": "system", "content": JUDGE_PROMPT},
+                {"role": "user", "content": user_message},
+            ],
+            temperature=JUDGE_TEMPERATURE,
+            # Un jugement illisible ou incomplet n'entre pas dans le cache des réponses
+            accept=_judgment_ok,
+        )
+    judgment = safe_json_loads(raw)
+    store.set(key, judgment, JUDGE_PROMPT_VERSION, MODEL_ID)
+    return judgment
 
 
 # =============================================================================
 # 3.4 - RUN EXPERIMENT (Langfuse)
 # =============================================================================
-@observe(name="experiment")
-def run_experiment() -> Any:
-    client = get_client()
-    dataset = client.get_dataset("chefbot-menu-eval")
 
-    # Task wrapper for run_experiment API
-    def task(*, item) -> str:
-        return chefbot_planner(item.input["constraints"])
+# Task wrapper for the experiment runner
+def task(*, item) -> str:
+    return chefbot_planner(item.input["constraints"])
 
-    # Evaluator 1: rule-based -> list[Evaluation]
-    def rules_eval(**kwargs) -> List[Evaluation]:
-        output = kwargs.get("output")              # string
-        expected_output = kwargs.get("expected_output")  # dict
-        scores = rule_evaluator(output=output, expected=expected_output)
 
-        # Don't log debug fields as scores; keep only numeric ones.
-        return [
-            Evaluation(name="must_avoid_ok", value=float(scores["must_avoid_ok"]),
-                       comment=f"forbidden_hits={scores['debug_forbidden_hits']}"),
-            Evaluation(name="must_include_coverage", value=float(scores["must_include_coverage"]),
-                       comment=f"include_hits={scores['debug_include_hits']}"),
-            Evaluation(name="overall_rules", value=float(scores["overall_rules"])),
-        ]
+# Evaluator 1: rule-based -> list[Evaluation]
+def rules_eval(**kwargs) -> List[Evaluation]:
+    output = kwargs.get("output")              # string
+    expected_output = kwargs.get("expected_output")  # dict
+    scores = rule_evaluator(output=output, expected=expected_output)
 
-    # Evaluator 2: LLM judge -> list[Evaluation]
-    def llm_eval(**kwargs) -> List[Evaluation]:
-        output = kwargs.get("output")
-        expected_output = kwargs.get("expected_output")
-        input_data = kwargs.get("input")
+    # Don't log debug fields as scores; keep only numeric ones.
+    evaluations = [
+        Evaluation(name="must_avoid_ok", value=float(scores["must_avoid_ok"]),
+                   comment=f"forbidden_hits={scores['debug_forbidden_hits']}"),
+        Evaluation(name="must_include_coverage", value=float(scores["must_include_coverage"]),
+                   comment=f"include_hits={scores['debug_include_hits']}"),
+        Evaluation(name="overall_rules", value=float(scores["overall_rules"])),
+    ]
 
-        judge = llm_judge(
-            question=input_data["constraints"],
-            output=output,
-            expected=expected_output,
-        )
+    # Numeric limits (kcal, budget, minutes, servings): only scored when the output states them
+    limits_ok, comment = limits_score(check_limits(output, expected_output))
+    if limits_ok is not None:
+        evaluations.append(Evaluation(name="numeric_limits_ok", value=limits_ok, comment=comment))
+    return evaluations
+
+
+# Evaluator 2: LLM judge -> list[Evaluation]
+# The judge is skipped when validators.prefilter already flags the output; the
+# flag is its own score (prefilter_fail) and the judge criteria stay unset, so
+# heuristic verdicts never enter the pertinence averages, intervals or A/B tests.
+# judge_skipped says which items were really judged (CHEFBOT_JUDGE_PREFILTER=0: always judge).
+JUDGE_PREFILTER = os.getenv("CHEFBOT_JUDGE_PREFILTER", "1") != "0"
 
+
+def llm_eval(**kwargs) -> List[Evaluation]:
+    output = kwargs.get("output")
+    expected_output = kwargs.get("expected_output")
+    input_data = kwargs.get("input")
+
+    check = prefilter(output, expected_output) if JUDGE_PREFILTER else None
+    if check is not None and check.skip_judge:
+        reason = "; ".join(check.reasons)
         return [
-            Evaluation(name="pertinence", value=float(judge["pertinence"]), comment=judge.get("explanation")),
-            Evaluation(name="creativite", value=float(judge["creativite"])),
-            Evaluation(name="praticite", value=float(judge["praticite"])),
+            Evaluation(name="judge_skipped", value=1.0, comment=f"prefilter {check.status}: {reason}"),
+            Evaluation(name="prefilter_fail", value=1.0, comment=reason),
         ]
 
+    judge = llm_judge(
+        question=input_data["constraints"],
+        output=output,
+        expected=expected_output,
+    )
+
+    evaluations = [] if check is None else [Evaluation(name="prefilter_fail", value=0.0)]
+    return evaluations + [
+        Evaluation(name="judge_skipped", value=0.0),
+        Evaluation(name="pertinence", value=float(judge["pertinence"]), comment=judge.get("explanation")),
+        Evaluation(name="creativite", value=float(judge["creativite"])),
+        Evaluation(name="praticite", value=float(judge["praticite"])),
+    ]
+
+
+# Empreintes du mode incrémental: changer un de ces champs ré-exécute les cellules concernées
+TASK_CONFIG = {"system": PLANNER_SYSTEM, "model": MODEL_ID, "temperature": PLANNER_TEMPERATURE}
+EVALUATOR_CONFIGS = {
+    "rules_eval": {"rules_version": RULES_VERSION, "validators_version": VALIDATORS_VERSION},
+    "llm_eval": {
+        "prompt_version": JUDGE_PROMPT_VERSION,
+        "model": MODEL_ID,
+        "temperature": JUDGE_TEMPERATURE,
+        # on_skip: scores écrits pour un item non jugé (les anciennes cellules avec pertinence=0 sont rejouées)
+        "prefilter": {"rules_version": RULES_VERSION, "validators_version": VALIDATORS_VERSION, "on_skip": "prefilter_fail"}
+        if JUDGE_PREFILTER
+        else None,
+    },
+}
+
+
+@observe(name="experiment")
+def run_experiment(concurrency: Optional[int] = None, incremental: Optional[bool] = None) -> ExperimentResult:
+    """
+    Runs the planner on every dataset item and scores it with rules_eval and
+    llm_eval. `concurrency` items run at once (CHEFBOT_EXPERIMENT_CONCURRENCY,
+    default 4); scores are sent to Langfuse as soon as each evaluator finishes.
+
+    incremental (CHEFBOT_EXPERIMENT_INCREMENTAL=1): outputs and scores whose
+    fingerprint (item, TASK_CONFIG, EVALUATOR_CONFIGS) did not change are taken
+    from the latest run instead of being recomputed; the new run is still complete.
+    """
+    if incremental is None:
+        incremental = os.getenv("CHEFBOT_EXPERIMENT_INCREMENTAL", "0") == "1"
+    client = get_client()
+    dataset = client.get_dataset(DATASET_NAME)
+    items = [item for item in dataset.items if not is_archived(item)]
+
     exp_name = f"chefbot-menu-eval-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
-    results = client.run_experiment(
+    runner = ExperimentRunner(
         name=exp_name,
-        data=dataset.items,
         task=task,
         evaluators=[rules_eval, llm_eval],
+        concurrency=concurrency or DEFAULT_CONCURRENCY,
         description="ChefBot menu planning evaluated by rules + LLM judge",
         metadata={
             "planner_model": "openai/gpt-oss-120b",
             "judge_model": "openai/gpt-oss-120b",
+            "judge_prompt_version": JUDGE_PROMPT_VERSION,
             "temperature": 0.4,
+            "concurrency": concurrency or DEFAULT_CONCURRENCY,
+            "incremental": incremental,
         },
+        store=get_cell_store() if incremental else None,
+        task_config=TASK_CONFIG,
+        evaluator_configs=EVALUATOR_CONFIGS,
     )
+    results = runner.run(items)
+    # Copie locale du run pour les comparaisons entre configs (results_store.py)
+    config_id = get_results_store().record_run(results, config={"task": TASK_CONFIG, "evaluators": EVALUATOR_CONFIGS})
 
+    summary = {**results.summary(), "config_id": config_id}
+    client.update_current_span(metadata={**summary, "judge_cache": get_judge_cache().stats()})
     print("\n✓ Experiment complete! Check Langfuse UI:")
     print("  Datasets > chefbot-menu-eval > Runs (ou Experiments selon ton UI)")
+    print(f"  {summary['items']} items en {summary['wall_s']}s, erreurs: {summary['errors']}")
+    print("  Jugements réutilisés:", get_judge_cache().stats())
     return results
 
+
+# =============================================================================
+# 3.5 - A/B COMPARISON WITH EARLY STOP
+# =============================================================================
+@observe(name="experiment-ab")
+def run_ab_experiment(
+    config_a: Dict[str, Any],
+    config_b: Dict[str, Any],
+    metric: str = "pertinence",
+    max_rounds: Optional[int] = None,
+    alpha: float = 0.05,
+    delta: float = 0.05,
+    concurrency: Optional[int] = None,
+) -> ABResult:
+    """
+    Compares two planner configurations (overrides of TASK_CONFIG, e.g.
+    {"temperature": 0.8} or {"model": "openai/gpt-oss-120b"}) on the same
+    items, pair by pair, and stops as soon as the sequential test on `metric`
+    says B is better, worse, or within +/- delta of A (see ab_test.py).
+    At most max_rounds passes over the dataset: by default one pass if it is
+    enough for the test to decide at all, otherwise the fewest passes that are
+    (the 5 cases of TEST_CASES need 4 passes: 16 pairs at best, see ab_test.py).
+    Raises ValueError if no decision is possible within max_rounds passes.
+    Each config is published as its own Langfuse run and stored in the local
+    results store.
+    """
+    client = get_client()
+    dataset = client.get_dataset(DATASET_NAME)
+    items = [item for item in dataset.items if not is_archived(item)]
+    if not items:
+        raise ValueError(f"Dataset {DATASET_NAME} vide: rien à comparer.")
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+
+    # Paires minimales pour décider (différence constante, cas le plus favorable)
+    test = SequentialTest(alpha=alpha, delta=delta)
+    needed = {gap: test.pairs_needed(gap) for gap in (1.0, 0.5, 0.3, 0.0)}
+    if max_rounds is None:
+        max_rounds = max(1, math.ceil((needed[1.0] or 0) / len(items)))
+    max_pairs = max_rounds * len(items)
+    if needed[1.0] is None or needed[1.0] > max_pairs:
+        raise ValueError(
+            f"A/B: {max_pairs} paires au plus, il en faut au moins {needed[1.0]} pour conclure "
+            f"(alpha={alpha}, delta={delta}): augmenter max_rounds ou le dataset."
+        )
+    print(
+        f"A/B: {max_pairs} paires au plus ({max_rounds} passe(s) de {len(items)} items), "
+        f"une passe sans arrêt anticipé = {len(items)} paires"
+    )
+    for gap, n in needed.items():
+        label = "équivalence" if gap == 0.0 else f"écart {gap}"
+        if n is None or n > max_pairs:
+            print(f"  ⚠ {label}: au moins {n or '>10000'} paires, hors de portée de ce run")
+        else:
+            print(f"  {label}: au moins {n} paires")
+
+    def make_runner(label: str, overrides: Dict[str, Any]) -> ExperimentRunner:
+        config = {**TASK_CONFIG, **overrides}
+
+        # Les items reviennent à chaque tour: pas de cache de réponses pour la tâche
+        def ab_task(*, item) -> str:
+            return chefbot_planner(item.input["constraints"], use_cache=False, **config)
+
+        return ExperimentRunner(
+            name=f"chefbot-menu-eval-ab-{stamp}-{label}",
+            task=ab_task,
+            evaluators=[rules_eval, llm_eval],
+            description=f"A/B comparison ({label}) on {metric}",
+            metadata={"ab_side": label, "task_config": config, "judge_prompt_version": JUDGE_PROMPT_VERSION},
+            task_config=config,
+            evaluator_configs=EVALUATOR_CONFIGS,
+        )
+
+    runner_a, runner_b = make_runner("A", config_a), make_runner("B", config_b)
+    result = run_ab(
+        runner_a,
+        runner_b,
+        items,
+        metric=metric,
+        test=test,
+        max_pairs=max_pairs,
+        concurrency=concurrency or max(1, DEFAULT_CONCURRENCY // 2),
+    )
+
+    store = get_results_store()
+    store.record_run(result.a, config={"task": runner_a.task_config, "evaluators": EVALUATOR_CONFIGS})
+    store.record_run(result.b, config={"task": runner_b.task_config, "evaluators": EVALUATOR_CONFIGS})
+
+    summary = result.summary()
+    client.update_current_span(metadata={k: v for k, v in summary.items() if k not in ("a", "b")})
+    print(f"\n✓ A/B sur {metric}: {summary['decision']} après {summary['pairs']}/{summary['max_pairs']} paires")
+    print(f"  différence B-A = {summary['mean_diff_b_minus_a']} (IC 95% {summary['ci95']})")
+    print(f"  appels LLM: {summary['llm_calls']}, économisés par rapport à une passe A+B: {summary['llm_calls_saved']}")
+    return result
+
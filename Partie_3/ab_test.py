@@ -0,0 +1,229 @@
+"""
+Comparaison A/B de deux configurations avec arrêt anticipé (test séquentiel).
+
+Les items du dataset sont joués par paires (même item sous A et sous B), en
+cycle sur le dataset jusqu'à `max_pairs`. Après chaque paire notée, la
+différence d = score_B - score_A met à jour une suite de confiance à 95%
+sur la différence moyenne, valide à tout instant : on peut la regarder après
+chaque paire sans gonfler le risque d'erreur. C'est la suite empirique de
+Bernstein à plug-in prévisible (Waudby-Smith et Ramdas 2023) : elle ne
+suppose que des scores dans [0, 1] (donc d dans [-1, 1]) et s'adapte à la
+variance observée sans l'utiliser comme si elle était connue. On s'arrête
+dès que :
+- 0 est hors de l'intervalle -> "a_better" / "b_better"
+- l'intervalle tient dans [-delta, +delta] -> "equivalent" (écart négligeable)
+
+Avec alpha=0.05 et delta=0.05, même dans le cas le plus favorable (la même
+différence à chaque paire), il faut au moins 16 paires pour un écart de 1.0,
+30 pour 0.5, 50 pour 0.3, 148 pour 0.1 et 296 pour conclure à l'équivalence ;
+des scores bruités en demandent davantage. `SequentialTest.pairs_needed()`
+donne ce minimum pour d'autres réglages.
+
+Le rapport donne le nombre de paires jouées et les appels LLM économisés par
+rapport à une passe complète du dataset sous A et sous B (ce que faisait la
+comparaison sans arrêt anticipé), appels par paire mesurés sur les paires
+jouées. La valeur est négative quand le test a joué plus d'une passe.
+"""
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from experiment import ExperimentResult, ExperimentRunner, ItemResult
+from llm_utils import current_labels
+
+# Plafond des poids λ (1/2 dans l'article): borne l'influence d'une seule paire
+LAMBDA_MAX = 0.5
+
+
+class SequentialTest:
+    """
+    Anytime-valid confidence sequence on the mean of paired differences in [-1, 1]
+    (predictable plug-in empirical Bernstein, on x = (d + 1) / 2 in [0, 1]).
+    """
+
+    def __init__(self, alpha: float = 0.05, delta: float = 0.05, min_pairs: int = 5):
+        self.alpha = alpha
+        self.delta = delta
+        self.min_pairs = min_pairs
+        self.n = 0
+        self.total = 0.0
+        # Estimations prévisibles (avant l'observation courante), départ à 1/2 et 1/4
+        self._mean_hat = 0.5
+        self._sq_dev = 0.25
+        # Sommes de la suite: Σλ, Σλx, Σ (x - μ̂)² (-log(1 - λ) - λ)
+        self._sum_lambda = 0.0
+        self._sum_lambda_x = 0.0
+        self._sum_penalty = 0.0
+
+    def update(self, diff: float) -> Optional[str]:
+        diff = min(1.0, max(-1.0, diff))
+        x = (diff + 1.0) / 2.0
+        self.n += 1
+        self.total += diff
+
+        log_term = math.log(2.0 / self.alpha)
+        var_hat = self._sq_dev / self.n  # σ̂² de l'étape précédente
+        lam = min(LAMBDA_MAX, math.sqrt(2.0 * log_term / (var_hat * self.n * math.log(1.0 + self.n))))
+        self._sum_lambda += lam
+        self._sum_lambda_x += lam * x
+        self._sum_penalty += (x - self._mean_hat) ** 2 * (-math.log(1.0 - lam) - lam)
+
+        # μ̂ et σ̂² incluant x, utilisés à l'étape suivante
+        self._mean_hat = (0.5 + (self.total + self.n) / 2.0) / (self.n + 1)
+        self._sq_dev += (x - self._mean_hat) ** 2
+        return self.decision()
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.n if self.n else 0.0
+
+    def interval(self) -> Tuple[float, float]:
+        if self.n == 0:
+            return -math.inf, math.inf
+        center = self._sum_lambda_x / self._sum_lambda
+        half = (math.log(2.0 / self.alpha) + self._sum_penalty) / self._sum_lambda
+        # Retour à l'échelle de d = 2x - 1, borné à [-1, 1]
+        return max(-1.0, 2.0 * (center - half) - 1.0), min(1.0, 2.0 * (center + half) - 1.0)
+
+    def pairs_needed(self, diff: float, limit: int = 10_000) -> Optional[int]:
+        """
+        Smallest number of pairs after which a constant difference `diff` reaches a
+        decision with these settings (best case: noisy differences need more).
+        None if it takes more than `limit` pairs.
+        """
+        probe = SequentialTest(alpha=self.alpha, delta=self.delta, min_pairs=self.min_pairs)
+        for n in range(1, limit + 1):
+            if probe.update(diff) is not None:
+                return n
+        return None
+
+    def decision(self) -> Optional[str]:
+        if self.n < self.min_pairs:
+            return None
+        low, high = self.interval()
+        if low > 0:
+            return "b_better"
+        if high < 0:
+            return "a_better"
+        if -self.delta <= low and high <= self.delta:
+            return "equivalent"
+        return None
+
+
+@dataclass
+class ABResult:
+    metric: str
+    decision: str
+    pairs: int
+    max_pairs: int
+    mean_diff: float
+    interval: Tuple[float, float]
+    llm_calls: int
+    llm_calls_saved: int
+    wall_s: float
+    a: ExperimentResult
+    b: ExperimentResult
+    skipped_pairs: int = 0
+    diffs: List[float] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "metric": self.metric,
+            "decision": self.decision,
+            "pairs": self.pairs,
+            "max_pairs": self.max_pairs,
+            "skipped_pairs": self.skipped_pairs,
+            "mean_diff_b_minus_a": round(self.mean_diff, 4),
+            "ci95": [round(x, 4) if math.isfinite(x) else None for x in self.interval],
+            "llm_calls": self.llm_calls,
+            "llm_calls_saved": self.llm_calls_saved,
+            "wall_s": round(self.wall_s, 3),
+            "a": self.a.summary(),
+            "b": self.b.summary(),
+        }
+
+
+def _calls(result: ItemResult) -> int:
+    return int(sum(cell.get("calls", 0) for cell in result.cells.values()))
+
+
+def run_ab(
+    runner_a: ExperimentRunner,
+    runner_b: ExperimentRunner,
+    items: Sequence[Any],
+    metric: str,
+    test: SequentialTest,
+    max_pairs: int,
+    concurrency: int = 2,
+) -> ABResult:
+    """Plays (item, A) / (item, B) pairs in dataset order, cycling, until `test` decides or max_pairs."""
+    labels = current_labels()
+    start = time.perf_counter()
+    results_a: List[ItemResult] = []
+    results_b: List[ItemResult] = []
+    diffs: List[float] = []
+    skipped = 0
+    calls = 0
+    decision: Optional[str] = None
+
+    n_evaluators = max(len(runner_a.evaluators), len(runner_b.evaluators), 1)
+    with ThreadPoolExecutor(2 * concurrency, thread_name_prefix="ab-item") as item_pool, ThreadPoolExecutor(
+        2 * concurrency * n_evaluators, thread_name_prefix="ab-eval"
+    ) as eval_pool:
+        in_flight: Dict[Any, Tuple[int, str]] = {}
+        pending: Dict[int, Dict[str, ItemResult]] = {}
+        started = 0
+
+        while True:
+            # Jamais plus de `concurrency` paires en cours: au moment de l'arrêt, peu d'appels sont perdus
+            while decision is None and started < max_pairs and len(pending) < concurrency and items:
+                item = items[started % len(items)]
+                pending[started] = {}
+                for side, runner in (("a", runner_a), ("b", runner_b)):
+                    in_flight[item_pool.submit(runner.run_item, item, eval_pool, labels)] = (started, side)
+                started += 1
+            if not in_flight:
+                break
+
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                pair, side = in_flight.pop(future)
+                result = future.result()
+                calls += _calls(result)
+                pending[pair][side] = result
+                if len(pending[pair]) < 2:
+                    continue
+                sides = pending.pop(pair)
+                results_a.append(sides["a"])
+                results_b.append(sides["b"])
+                # Paires terminées après la décision: déjà payées, gardées dans les runs mais hors test
+                if decision is not None:
+                    continue
+                score_a, score_b = sides["a"].scores.get(metric), sides["b"].scores.get(metric)
+                if score_a is None or score_b is None:
+                    skipped += 1
+                    continue
+                diffs.append(score_b - score_a)
+                decision = test.update(score_b - score_a)
+
+    wall_s = time.perf_counter() - start
+    per_pair = calls / len(results_a) if results_a else 0.0
+    # Référence: une passe complète sous A et sous B, sans arrêt anticipé (négatif si dépassée)
+    baseline_calls = per_pair * len(items)
+    return ABResult(
+        metric=metric,
+        decision=decision or "inconclusive",
+        pairs=len(results_a),
+        max_pairs=max_pairs,
+        mean_diff=test.mean,
+        interval=test.interval(),
+        llm_calls=calls,
+        llm_calls_saved=round(baseline_calls - calls),
+        wall_s=wall_s,
+        a=ExperimentResult(runner_a.name, results_a, wall_s),
+        b=ExperimentResult(runner_b.name, results_b, wall_s),
+        skipped_pairs=skipped,
+        diffs=diffs,
+    )
@@ -0,0 +1,113 @@
+"""
+Cellules d'expérience réutilisables pour le mode incrémental de run_experiment.
+
+Une cellule = le résultat d'une tâche ou d'un évaluateur pour un item :
+- tâche : clé = empreinte(item, config de la tâche) -> sortie
+- évaluateur : clé = empreinte(item, sortie, nom + config de l'évaluateur)
+  -> liste de scores {name, value, comment}
+
+Seule la dernière valeur de chaque clé est gardée (= dernier run compatible).
+Changer un item, le prompt du planificateur ou celui du juge change les clés
+concernées, et seules ces cellules sont ré-exécutées.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.cache import DEFAULT_CACHE_PATH
+
+_MISSING = object()
+
+
+def fingerprint(*parts: Any) -> str:
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CellStore:
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._memory: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.executed = 0
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS experiment_cells ("
+                " key TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL,"
+                " run_name TEXT, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Any:
+        """Stored value, or _MISSING (a stored None is a valid task output)."""
+        with self._lock:
+            value = self._memory.get(key, _MISSING)
+            db = self._db()
+            if value is _MISSING and db is not None:
+                row = db.execute("SELECT value FROM experiment_cells WHERE key = ?", (key,)).fetchone()
+                if row:
+                    value = self._memory[key] = json.loads(row[0])
+            if value is _MISSING:
+                self.executed += 1
+            else:
+                self.reused += 1
+            return value
+
+    def set(self, key: str, kind: str, value: Any, run_name: Optional[str] = None) -> None:
+        with self._lock:
+            self._memory[key] = value
+            db = self._db()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO experiment_cells (key, kind, value, run_name, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, kind, json.dumps(value, ensure_ascii=False, default=str), run_name, time.time()),
+                )
+                db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            db = self._db()
+            if db is not None:
+                db.execute("DELETE FROM experiment_cells")
+                db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.reused + self.executed
+        return {
+            "cells_reused": self.reused,
+            "cells_executed": self.executed,
+            "reuse_rate": round(self.reused / total, 3) if total else None,
+        }
+
+
+def is_missing(value: Any) -> bool:
+    return value is _MISSING
+
+
+_cell_store: Optional[CellStore] = None
+
+
+def get_cell_store() -> CellStore:
+    global _cell_store
+    if _cell_store is None:
+        _cell_store = CellStore()
+    return _cell_store
@@ -0,0 +1,130 @@
+"""
+Synchronisation idempotente du dataset Langfuse avec TEST_CASES.
+
+Chaque cas a un id stable (hash du nom du dataset + input) et une empreinte
+de son contenu (input, expected_output, metadata). Une synchronisation :
+- lit les items existants une seule fois (get_dataset)
+- crée les cas absents, met à jour (même id) ceux dont le contenu a changé
+- archive les doublons laissés par les anciens runs (même input, autre id)
+  et les items à id stable dont le cas a été modifié ou retiré de TEST_CASES
+- n'envoie rien pour les cas inchangés
+
+Langfuse n'a pas d'endpoint d'insertion en lot pour les items de dataset :
+les upserts restants partent en parallèle, en une passe.
+"""
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+SYNC_WORKERS = 8
+STABLE_ID_PREFIX = "chefbot-"
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def stable_item_id(dataset_name: str, item_input: Any) -> str:
+    return STABLE_ID_PREFIX + hashlib.sha256(f"{dataset_name}\x1f{_canonical(item_input)}".encode("utf-8")).hexdigest()[:24]
+
+
+def content_hash(item_input: Any, expected_output: Any, metadata: Any) -> str:
+    return hashlib.sha256(_canonical([item_input, expected_output, metadata]).encode("utf-8")).hexdigest()
+
+
+def is_archived(item: Any) -> bool:
+    status = getattr(item, "status", None)
+    return str(getattr(status, "value", status) or "").upper().endswith("ARCHIVED")
+
+
+@dataclass
+class SyncPlan:
+    create: List[Dict[str, Any]] = field(default_factory=list)
+    update: List[Dict[str, Any]] = field(default_factory=list)
+    archive: List[Any] = field(default_factory=list)
+    unchanged: int = 0
+
+    def report(self) -> Dict[str, int]:
+        return {
+            "created": len(self.create),
+            "updated": len(self.update),
+            "archived": len(self.archive),
+            "unchanged": self.unchanged,
+        }
+
+
+def plan_sync(dataset_name: str, cases: Sequence[Dict[str, Any]], remote_items: Sequence[Any]) -> SyncPlan:
+    plan = SyncPlan()
+    active = [item for item in remote_items if not is_archived(item)]
+    by_id = {item.id: item for item in active}
+
+    wanted: Dict[str, Dict[str, Any]] = {}
+    for case in cases:
+        # Deux cas au même input -> un seul item (le dernier l'emporte)
+        wanted[stable_item_id(dataset_name, case["input"])] = case
+
+    for item_id, case in wanted.items():
+        row = {**case, "id": item_id}
+        remote = by_id.get(item_id)
+        if remote is None:
+            plan.create.append(row)
+        elif content_hash(remote.input, remote.expected_output, remote.metadata) != content_hash(
+            case["input"], case.get("expected_output"), case.get("metadata")
+        ):
+            plan.update.append(row)
+        else:
+            plan.unchanged += 1
+
+    # Items créés avant les id stables (ou en double): même input qu'un cas connu, autre id.
+    # Items à id stable hors des cas voulus: input modifié ou cas retiré, ils ne doivent plus être joués
+    wanted_inputs = {_canonical(case["input"]) for case in wanted.values()}
+    plan.archive = [
+        item
+        for item in active
+        if item.id not in wanted
+        and (str(item.id).startswith(STABLE_ID_PREFIX) or _canonical(item.input) in wanted_inputs)
+    ]
+    return plan
+
+
+def sync_dataset(
+    client: Any,
+    dataset_name: str,
+    cases: Sequence[Dict[str, Any]],
+    remote_items: Optional[Sequence[Any]] = None,
+    workers: int = SYNC_WORKERS,
+) -> Dict[str, int]:
+    """Upsert only new / changed cases of `dataset_name`; returns what changed."""
+    if remote_items is None:
+        try:
+            remote_items = client.get_dataset(dataset_name).items
+        except Exception:
+            remote_items = []
+    plan = plan_sync(dataset_name, cases, remote_items)
+
+    def upsert(row: Dict[str, Any]) -> None:
+        client.create_dataset_item(
+            dataset_name=dataset_name,
+            id=row["id"],
+            input=row["input"],
+            expected_output=row.get("expected_output"),
+            metadata=row.get("metadata"),
+        )
+
+    def archive(item: Any) -> None:
+        client.create_dataset_item(
+            dataset_name=dataset_name,
+            id=item.id,
+            input=item.input,
+            expected_output=item.expected_output,
+            metadata=item.metadata,
+            status="ARCHIVED",
+        )
+
+    calls = [(upsert, row) for row in plan.create + plan.update] + [(archive, item) for item in plan.archive]
+    if calls:
+        with ThreadPoolExecutor(min(workers, len(calls)), thread_name_prefix="dataset-sync") as pool:
+            list(pool.map(lambda call: call[0](call[1]), calls))
+    return plan.report()
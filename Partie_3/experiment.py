@@ -0,0 +1,219 @@
+"""
+Exécuteur d'expériences Langfuse avec concurrence réglable.
+
+Remplace client.run_experiment (un item après l'autre) :
+- la tâche tourne pour `concurrency` items à la fois
+- les évaluateurs d'un item tournent en parallèle dès que sa sortie est prête
+- chaque score est envoyé à Langfuse (score_trace sur la trace de l'item,
+  liée au dataset run) dès que son évaluateur a fini
+
+Le temps total suit donc ~ len(items) / concurrency x (tâche + évaluateur le
+plus lent) au lieu de la somme sur tous les items. Les appels LLM restent
+soumis au limiteur de débit commun.
+
+Un item sans méthode .run() (ex: un dict de TEST_CASES dans un benchmark) est
+traité pareil, sans trace Langfuse.
+
+Mode incrémental (store=CellStore) : la sortie de la tâche et les scores de
+chaque évaluateur sont repris du dernier run dont l'empreinte (contenu de
+l'item, config de la tâche / de l'évaluateur, sortie évaluée) est identique ;
+seules les cellules invalidées sont exécutées. Le run publié reste complet :
+chaque item a sa trace, sa sortie et tous ses scores.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from contextvars import copy_context
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from cell_store import CellStore, fingerprint, is_missing
+from dataset_sync import content_hash
+from llm_utils import current_labels, metrics_labels, record_usage
+
+DEFAULT_CONCURRENCY = int(os.getenv("CHEFBOT_EXPERIMENT_CONCURRENCY", "4"))
+
+Evaluator = Callable[..., List[Any]]
+
+
+@dataclass
+class ItemResult:
+    item_id: Optional[str]
+    category: Optional[str] = None
+    output: Any = None
+    scores: Dict[str, float] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+    reused: List[str] = field(default_factory=list)
+    # score -> empreinte de la cellule qui l'a produit (item, sortie évaluée, évaluateur et sa config):
+    # un score repris du CellStore ou du cache du juge garde la clé de son premier calcul
+    sample_keys: Dict[str, str] = field(default_factory=dict)
+    # cellule exécutée ("task", nom d'évaluateur) -> latency_s / calls / prompt_tokens / completion_tokens
+    cells: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    latency_s: float = 0.0
+
+
+@dataclass
+class ExperimentResult:
+    name: str
+    items: List[ItemResult]
+    wall_s: float
+
+    def averages(self) -> Dict[str, float]:
+        values: Dict[str, List[float]] = {}
+        for item in self.items:
+            for name, value in item.scores.items():
+                values.setdefault(name, []).append(value)
+        return {name: round(sum(v) / len(v), 3) for name, v in sorted(values.items())}
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "items": len(self.items),
+            "errors": sum(1 for item in self.items if item.errors),
+            "cells_reused": sum(len(item.reused) for item in self.items),
+            "wall_s": round(self.wall_s, 3),
+            "scores": self.averages(),
+        }
+
+
+def _field(item: Any, name: str) -> Any:
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def _evaluator_name(evaluator: Evaluator) -> str:
+    return getattr(evaluator, "__name__", "evaluator")
+
+
+def _measured(fn: Callable[..., Any], **kwargs: Any) -> Tuple[Any, Dict[str, float]]:
+    """fn(**kwargs) with its wall time, and the count and tokens of the (non-cached) LLM calls it made."""
+    start = time.perf_counter()
+    with record_usage() as usage:
+        value = fn(**kwargs)
+    calls = [u for u in usage if not u["cached"]]
+    return value, {
+        "latency_s": time.perf_counter() - start,
+        "calls": len(calls),
+        "prompt_tokens": sum(u["prompt_tokens"] for u in calls),
+        "completion_tokens": sum(u["completion_tokens"] for u in calls),
+    }
+
+
+def _as_scores(evaluations: List[Any]) -> List[Dict[str, Any]]:
+    return [{"name": e.name, "value": float(e.value), "comment": getattr(e, "comment", None)} for e in evaluations]
+
+
+class ExperimentRunner:
+    def __init__(
+        self,
+        name: str,
+        task: Callable[..., Any],
+        evaluators: Sequence[Evaluator],
+        concurrency: int = DEFAULT_CONCURRENCY,
+        description: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        store: Optional[CellStore] = None,
+        task_config: Optional[Dict[str, Any]] = None,
+        evaluator_configs: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
+        self.name = name
+        self.task = task
+        self.evaluators = list(evaluators)
+        self.concurrency = max(1, concurrency)
+        self.description = description
+        self.metadata = metadata
+        # Mode incrémental: cellules reprises du store quand leur empreinte n'a pas changé
+        self.store = store
+        self.task_config = task_config or {}
+        self.evaluator_configs = evaluator_configs or {}
+
+    def run(self, items: Sequence[Any]) -> ExperimentResult:
+        labels = current_labels()
+        start = time.perf_counter()
+        # Deux pools: un item qui attend ses évaluateurs n'occupe jamais une place d'évaluateur
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="experiment-item") as item_pool, ThreadPoolExecutor(
+            self.concurrency * max(1, len(self.evaluators)), thread_name_prefix="experiment-eval"
+        ) as eval_pool:
+            # Contexte neuf par item (pas copy_context): chaque item est sa propre trace Langfuse
+            futures = [item_pool.submit(self.run_item, item, eval_pool, labels) for item in items]
+            results = [f.result() for f in futures]
+        return ExperimentResult(self.name, results, time.perf_counter() - start)
+
+    def run_item(self, item: Any, eval_pool: ThreadPoolExecutor, labels: Dict[str, str]) -> ItemResult:
+        """One item: task (or reused output), then its evaluators on `eval_pool`; used by run() and ab_test."""
+        item_metadata = _field(item, "metadata")
+        category = item_metadata.get("category") if isinstance(item_metadata, dict) else None
+        result = ItemResult(item_id=_field(item, "id"), category=category)
+        start = time.perf_counter()
+        run = getattr(item, "run", None)
+        span_cm = (
+            run(run_name=self.name, run_description=self.description, run_metadata=self.metadata)
+            if callable(run)
+            else nullcontext(None)
+        )
+        with metrics_labels(**labels), span_cm as span:
+            item_input = _field(item, "input")
+            expected_output = _field(item, "expected_output")
+            item_key = content_hash(item_input, expected_output, item_metadata)
+
+            task_key = fingerprint("task", item_key, self.task_config)
+            cached = self.store.get(task_key) if self.store is not None else None
+            if self.store is not None and not is_missing(cached):
+                result.output = cached
+                result.reused.append("task")
+            else:
+                try:
+                    result.output, result.cells["task"] = _measured(self.task, item=item)
+                except Exception as e:
+                    result.errors.append(f"task: {type(e).__name__}: {e}")
+                    if span is not None:
+                        span.update(level="ERROR", status_message=str(e))
+                    result.latency_s = time.perf_counter() - start
+                    return result
+                if self.store is not None:
+                    self.store.set(task_key, "task", result.output, self.name)
+            if span is not None:
+                span.update_trace(input=item_input, output=result.output)
+
+            kwargs = {
+                "input": item_input,
+                "output": result.output,
+                "expected_output": expected_output,
+                "metadata": item_metadata,
+            }
+            pending = {}
+            for evaluator in self.evaluators:
+                name = _evaluator_name(evaluator)
+                eval_key = fingerprint("eval", item_key, result.output, name, self.evaluator_configs.get(name, {}))
+                cached = self.store.get(eval_key) if self.store is not None else None
+                if self.store is not None and not is_missing(cached):
+                    result.reused.append(name)
+                    self._publish(result, span, cached, eval_key)
+                    continue
+                # copy_context: les spans des évaluateurs restent dans la trace de l'item
+                pending[eval_pool.submit(copy_context().run, _measured, evaluator, **kwargs)] = (name, eval_key)
+
+            for future in as_completed(pending):
+                name, eval_key = pending[future]
+                try:
+                    evaluations, result.cells[name] = future.result()
+                    scores = _as_scores(evaluations)
+                except Exception as e:
+                    result.errors.append(f"{name}: {type(e).__name__}: {e}")
+                    continue
+                if self.store is not None:
+                    self.store.set(eval_key, "eval", scores, self.name)
+                self._publish(result, span, scores, eval_key)
+
+            if span is not None and result.reused:
+                span.update(metadata={"reused_cells": result.reused})
+        result.latency_s = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def _publish(result: ItemResult, span: Any, scores: List[Dict[str, Any]], sample_key: str) -> None:
+        for score in scores:
+            result.scores[score["name"]] = score["value"]
+            result.sample_keys[score["name"]] = sample_key
+            if span is not None:
+                span.score_trace(name=score["name"], value=score["value"], comment=score.get("comment"))
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.cache import DEFAULT_CACHE_PATH
+
+JUDGE_FIELDS = ("pertinence", "creativite", "praticite")
+
+
+def judge_key(prompt_version: str, model: str, temperature: float, question: str, output: str, expected: Dict[str, Any]) -> str:
+    payload = {
+        "prompt_version": prompt_version,
+        "model": model,
+        "temperature": temperature,
+        "question": question,
+        "output": output,
+        "expected": expected,
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_complete(judgment: Any) -> bool:
+    """Only well-formed judgments are stored (a broken answer must be judged again next run)."""
+    if not isinstance(judgment, dict):
+        return False
+    try:
+        return all(0.0 <= float(judgment[field]) <= 1.0 for field in JUDGE_FIELDS)
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+class JudgeCache:
+    """
+    Jugements de llm_judge déjà rendus, clé = hash(version du prompt, modèle,
+    température, question, sortie, attendu). Sans expiration: un jugement ne
+    change que si l'un de ces éléments change, et la clé change avec lui.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self._conn: Optional[sqlite3.Connection] = None
+        self._memory: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS judgments ("
+                " key TEXT PRIMARY KEY, prompt_version TEXT NOT NULL, model TEXT NOT NULL,"
+                " judgment TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            judgment = self._memory.get(key)
+            db = self._db()
+            if judgment is None and db is not None:
+                row = db.execute("SELECT judgment FROM judgments WHERE key = ?", (key,)).fetchone()
+                if row:
+                    judgment = self._memory[key] = json.loads(row[0])
+            if judgment is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(judgment)
+
+    def set(self, key: str, judgment: Dict[str, Any], prompt_version: str, model: str) -> None:
+        if not self.enabled or not is_complete(judgment):
+            return
+        with self._lock:
+            self._memory[key] = dict(judgment)
+            db = self._db()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO judgments (key, prompt_version, model, judgment, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, prompt_version, model, json.dumps(judgment, ensure_ascii=False), time.time()),
+                )
+                db.commit()
+
+    def invalidate(self, keep_version: Optional[str] = None) -> int:
+        """Supprime les jugements (tous, ou ceux d'une autre version de prompt que keep_version)."""
+        with self._lock:
+            self._memory.clear()
+            db = self._db()
+            if db is None:
+                return 0
+            if keep_version is None:
+                cur = db.execute("DELETE FROM judgments")
+            else:
+                cur = db.execute("DELETE FROM judgments WHERE prompt_version != ?", (keep_version,))
+            db.commit()
+            return cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else None}
+
+
+_judge_cache: Optional[JudgeCache] = None
+
+
+def get_judge_cache() -> JudgeCache:
+    """Process-wide store (CHEFBOT_JUDGE_CACHE=0 disables it)."""
+    global _judge_cache
+    if _judge_cache is None:
+        _judge_cache = JudgeCache(enabled=os.getenv("CHEFBOT_JUDGE_CACHE", "1") != "0")
+    return _judge_cache
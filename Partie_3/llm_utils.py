@@ -1,41 +1,36 @@
-import json
-from typing import Any, Dict, List
+import os
+import sys
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
 
 from dotenv import load_dotenv
-from groq import Groq
-from langfuse import get_client
 
-load_dotenv()
+# Permet d'importer le dossier common/ quand on lance main.py depuis ce dossier
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
 
-groq_client = Groq()
-langfuse = get_client()
+from common import llm
+from common.llm import record_usage, response_cache, safe_json_loads
+from common.metrics import current_labels, metrics, metrics_labels
+from common.tracing import observe
 
-MODEL_ID = "openai/gpt-oss-20b"
+load_dotenv()
 
+MODEL_ID = "openai/gpt-oss-20b"
 
-def chat(messages: List[Dict[str, str]], temperature: float = 0.2) -> str:
-    resp = groq_client.chat.completions.create(
-        model=MODEL_ID,
-        messages=messages,
-        temperature=temperature,
-    )
-    return (resp.choices[0].message.content or "").strip()
 
+def chat(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.2,
+    use_cache: bool = True,
+    model: str = MODEL_ID,
+    accept: Optional[Callable[[str], bool]] = None,
+) -> str:
+    return llm.chat(messages, temperature=temperature, use_cache=use_cache, model=model, accept=accept)
 
-def safe_json_loads(raw: str) -> Any:
-    raw = raw.strip()
-    try:
-        return json.loads(raw)
-    except Exception:
-        pass
 
-    # extraction JSON si le modèle ajoute du texte
-    a, b = raw.find("{"), raw.rfind("}")
-    if a != -1 and b != -1 and b > a:
-        return json.loads(raw[a : b + 1])
+def chat_stream(messages: List[Dict[str, str]], temperature: float = 0.2) -> Iterator[str]:
+    return llm.chat_stream(messages, temperature=temperature, model=MODEL_ID)
 
-    a, b = raw.find("["), raw.rfind("]")
-    if a != -1 and b != -1 and b > a:
-        return json.loads(raw[a : b + 1])
 
-    raise ValueError("JSON introuvable dans la réponse.")
+def achat_stream(messages: List[Dict[str, str]], temperature: float = 0.2) -> AsyncIterator[str]:
+    return llm.achat_stream(messages, temperature=temperature, model=MODEL_ID)
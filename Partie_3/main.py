@@ -1,13 +1,13 @@
 from LLM_judge import create_chefbot_dataset,run_experiment
-from langfuse import get_client,observe,propagate_attributes
-from llm_utils import langfuse
+from langfuse import get_client,propagate_attributes
+from llm_utils import metrics, metrics_labels, observe, response_cache
 GROUP = "Groupe_SZUREK_KUSNIEREK_GOSSELIN"
 
 @observe(name=f"{GROUP}_Partie_3",as_type="chain")
 def main():
     get_client().update_current_span(metadata={"partie": "3", "status": "start"})
     
-    with propagate_attributes(tags=["Partie_3", GROUP]):
+    with propagate_attributes(tags=["Partie_3", GROUP]), metrics_labels(part="3"):
         print("=" * 60)
         print("CHEFBOT - DATASET + EVALUATION + EXPERIMENT")
         print("=" * 60)
@@ -15,9 +15,12 @@ def main():
         create_chefbot_dataset()
         run_experiment()
 
-        get_client().update_current_span(metadata={"status": "success"})
-        langfuse.flush()
+        get_client().update_current_span(
+            metadata={"status": "success", "cache": response_cache.stats(), "metrics": metrics.span_metadata()}
+        )
+        get_client().flush()
         print("✓ Flushed to Langfuse")
+        print("Cache LLM:", response_cache.stats())
 
 
 if __name__ == "__main__":
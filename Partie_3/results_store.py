@@ -0,0 +1,229 @@
+"""
+Résultats d'expériences stockés en local, pour comparer des runs sans passer par Langfuse.
+
+Une table étroite (un run, un item, une métrique, une valeur) indexée par
+(config, métrique) : chaque score d'évaluateur, et pour chaque cellule
+exécutée sa latence et ses tokens ("task.latency_s", "llm_eval.prompt_tokens"...).
+Les agrégats sont calculés en SQL (COUNT / AVG / somme des carrés) : moyenne,
+écart-type et intervalle de confiance à 95% par config, par catégorie, sur des
+milliers de runs en quelques millisecondes.
+
+Chaque score porte la clé de la cellule qui l'a calculé (item, sortie évaluée,
+évaluateur et sa config). Un score repris du CellStore (mode incrémental) ou du
+cache du juge revient avec la même clé à chaque run : il ne compte qu'une fois
+dans n, la moyenne et l'intervalle, qui restent ceux des jugements distincts.
+
+    store = get_results_store()
+    store.record_run(result, config={...})
+    store.summary(metric="pertinence")              # une ligne par (config, métrique)
+    store.by_category(metric="overall_rules")       # une ligne par (config, catégorie, métrique)
+
+    python results_store.py [--metric pertinence] [--by-category]
+"""
+import argparse
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from cell_store import fingerprint
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_RESULTS_PATH = os.getenv("CHEFBOT_RESULTS_PATH", os.path.join(ROOT, ".cache", "experiments.sqlite3"))
+
+# t de Student bilatéral à 95% pour ddl 1..30 (au-delà: loi normale)
+_T95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+
+
+def t95(df: int) -> float:
+    return _T95[df - 1] if 1 <= df <= len(_T95) else 1.96
+
+
+def config_id(config: Dict[str, Any]) -> str:
+    return fingerprint(config)[:12]
+
+
+def mean_ci(n: int, total: float, total_sq: float) -> Dict[str, Optional[float]]:
+    """Mean, sample std and 95% CI from count / sum / sum of squares."""
+    if n == 0:
+        return {"n": 0, "mean": None, "std": None, "ci_low": None, "ci_high": None}
+    mean = total / n
+    if n == 1:
+        return {"n": 1, "mean": mean, "std": None, "ci_low": None, "ci_high": None}
+    std = math.sqrt(max(0.0, (total_sq - n * mean * mean) / (n - 1)))
+    half = t95(n - 1) * std / math.sqrt(n)
+    return {"n": n, "mean": mean, "std": std, "ci_low": mean - half, "ci_high": mean + half}
+
+
+class ResultStore:
+    def __init__(self, path: str = DEFAULT_RESULTS_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " run_name TEXT PRIMARY KEY, config_id TEXT NOT NULL, config TEXT NOT NULL,"
+                " created_at REAL NOT NULL, wall_s REAL, items INTEGER, errors INTEGER);"
+                "CREATE TABLE IF NOT EXISTS values_ ("
+                " run_name TEXT NOT NULL, config_id TEXT NOT NULL, item_id TEXT, category TEXT,"
+                " metric TEXT NOT NULL, value REAL NOT NULL, sample_key TEXT);"
+                "CREATE INDEX IF NOT EXISTS values_run ON values_(run_name);"
+            )
+            # Bases créées avant sample_key: leurs lignes restent des échantillons distincts
+            if "sample_key" not in {row[1] for row in self._conn.execute("PRAGMA table_info(values_)")}:
+                self._conn.execute("ALTER TABLE values_ ADD COLUMN sample_key TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS values_sample ON values_(config_id, metric, category, sample_key, value)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    # ------------------------------------------------------------------ write
+    def record_run(self, result: Any, config: Dict[str, Any]) -> str:
+        """
+        Store an ExperimentResult (scores + latency / tokens of executed cells); returns its config id.
+        Scores keep the key of the cell that computed them (see module docstring); latency / tokens
+        are measured on every executed cell and are always new samples.
+        """
+        cid = config_id(config)
+        rows: List[Tuple[str, str, Optional[str], Optional[str], str, float, Optional[str]]] = []
+        for item in result.items:
+            sample_keys = getattr(item, "sample_keys", {})
+            rows += [
+                (result.name, cid, item.item_id, item.category, metric, float(v), sample_keys.get(metric))
+                for metric, v in item.scores.items()
+            ]
+            for cell, stats in item.cells.items():
+                rows += [
+                    (result.name, cid, item.item_id, item.category, f"{cell}.{key}", float(v), None)
+                    for key, v in stats.items()
+                ]
+
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM values_ WHERE run_name = ?", (result.name,))
+            db.execute(
+                "INSERT OR REPLACE INTO runs (run_name, config_id, config, created_at, wall_s, items, errors)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    result.name,
+                    cid,
+                    json.dumps(config, ensure_ascii=False, sort_keys=True, default=str),
+                    time.time(),
+                    result.wall_s,
+                    len(result.items),
+                    sum(1 for item in result.items if item.errors),
+                ),
+            )
+            db.executemany(
+                "INSERT INTO values_ (run_name, config_id, item_id, category, metric, value, sample_key)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            db.commit()
+        return cid
+
+    # ------------------------------------------------------------------ read
+    def _aggregate(
+        self, group_by: Iterable[str], metric: Optional[str], config_ids: Optional[Iterable[str]]
+    ) -> List[Dict[str, Any]]:
+        columns = list(group_by)
+        where, params = [], []
+        if metric is not None:
+            where.append("metric = ?")
+            params.append(metric)
+        if config_ids is not None:
+            ids = list(config_ids)
+            where.append(f"config_id IN ({','.join('?' * len(ids))})")
+            params += ids
+        # Un échantillon par clé de cellule (moyenne si elle a été recalculée), une ligne sinon
+        samples = (
+            "SELECT config_id, metric, category, value FROM values_ WHERE sample_key IS NULL"
+            + "".join(f" AND {clause}" for clause in where)
+            + " UNION ALL SELECT config_id, metric, category, AVG(value) FROM values_ WHERE sample_key IS NOT NULL"
+            + "".join(f" AND {clause}" for clause in where)
+            + " GROUP BY config_id, metric, category, sample_key"
+        )
+        sql = (
+            f"SELECT {', '.join(columns)}, COUNT(*), SUM(value), SUM(value * value) FROM ({samples})"
+            + f" GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}"
+        )
+        params = params * 2
+        with self._lock:
+            rows = self._db().execute(sql, params).fetchall()
+        out = []
+        for row in rows:
+            keys = dict(zip(columns, row[: len(columns)]))
+            out.append({**keys, **mean_ci(*row[len(columns):])})
+        return out
+
+    def summary(self, metric: Optional[str] = None, config_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Per (config, metric): n, mean, std, 95% CI over every stored run of that config."""
+        return self._aggregate(("config_id", "metric"), metric, config_ids)
+
+    def by_category(self, metric: Optional[str] = None, config_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Same as summary(), split by dataset item category."""
+        return self._aggregate(("config_id", "metric", "category"), metric, config_ids)
+
+    def values(self, config: str, metric: str) -> List[float]:
+        """Values of one metric for one config, one per distinct sample (oldest run first)."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT AVG(v.value) FROM values_ v JOIN runs r ON r.run_name = v.run_name"
+                " WHERE v.config_id = ? AND v.metric = ?"
+                " GROUP BY COALESCE(v.sample_key, 'row:' || v.rowid) ORDER BY MIN(r.created_at), MIN(v.rowid)",
+                (config, metric),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def configs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT config_id, config, COUNT(*), MAX(created_at) FROM runs GROUP BY config_id ORDER BY MAX(created_at)"
+            ).fetchall()
+        return [{"config_id": cid, "config": json.loads(config), "runs": n, "last_run": last} for cid, config, n, last in rows]
+
+
+_results_store: Optional[ResultStore] = None
+
+
+def get_results_store() -> ResultStore:
+    global _results_store
+    if _results_store is None:
+        _results_store = ResultStore()
+    return _results_store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Aggregate the locally stored experiment runs")
+    parser.add_argument("--metric", default=None)
+    parser.add_argument("--config", action="append", default=None, help="config id (repeatable)")
+    parser.add_argument("--by-category", action="store_true")
+    parser.add_argument("--path", default=DEFAULT_RESULTS_PATH)
+    args = parser.parse_args()
+
+    store = ResultStore(args.path)
+    start = time.perf_counter()
+    rows = (store.by_category if args.by_category else store.summary)(metric=args.metric, config_ids=args.config)
+    elapsed_ms = (time.perf_counter() - start) * 1e3
+    for row in rows:
+        print(json.dumps({k: round(v, 4) if isinstance(v, float) else v for k, v in row.items()}, ensure_ascii=False))
+    print(f"{len(rows)} lignes en {elapsed_ms:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
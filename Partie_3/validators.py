@@ -0,0 +1,138 @@
+"""
+Validateurs déterministes des limites chiffrées de expected_output, et pré-filtre du juge LLM.
+
+Chaque validateur lit dans la sortie les valeurs annoncées et renvoie
+"pass", "fail" ou "unknown" (rien d'exploitable dans le texte) :
+- max_calories_per_meal      : "450 kcal", "520 calories"
+- budget_per_person_eur_max  : "4,50 € par personne", "3€/pers"
+- max_minutes                : "temps total : 25 min", "prêt en 1h15" ; sans
+                               total annoncé -> "unknown" (une étape longue
+                               peut être un repos ou une marinade)
+- servings                   : "pour 6 personnes", "6 portions", "6 convives"
+
+prefilter() décide si le juge doit être appelé :
+- "fail"    : ingrédient interdit (rule_evaluator) ou limite chiffrée dépassée
+- "trivial" : sortie vide / quasi vide
+- "judge"   : le reste, seul cas où le LLM est appelé
+Les sorties non jugées sont marquées (judge_skipped=1 + raison) pour que la
+couverture du juge reste lisible dans les scores.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from matcher import compile_spec, fold
+
+# À changer avec les règles ci-dessous (invalide les cellules réutilisées)
+VALIDATORS_VERSION = "limits-2"
+# En dessous, une sortie n'a rien à juger
+MIN_OUTPUT_CHARS = 40
+
+_NUMBER = r"(\d+(?:[.,]\d+)?)"
+# Les totaux journaliers ("1800 kcal par jour") ne sont pas des valeurs par repas
+_KCAL = re.compile(_NUMBER + r"\s*(?:kcal|kilocalories?|calories?|cal)\b(?!\s*(?:/|par)\s*(?:jour|journee)\b)")
+_EUR_PER_PERSON = re.compile(_NUMBER + r"\s*eur(?:os?)?\s*(?:/|par)\s*(?:personne|pers|portion|tete)\b")
+_MINUTES = re.compile(_NUMBER + r"\s*(?:min(?:utes?)?|mn)\b")
+_HOURS = re.compile(r"(\d+)\s*h(?:eures?)?\s*(\d+)?\b")
+# Heures d'horloge ("servir à 12h", "prêt pour 19h30") : ce ne sont pas des durées
+_CLOCK = re.compile(r"\b(?:a|vers|pour|des|jusqu'?a)\s+\d{1,2}\s*h(?:\s*\d{2})?\b")
+_TOTAL = r"(?:temps total|duree totale|total|pret en|en tout)[^\d\n]{0,20}"
+_TOTAL_TIME = re.compile(_TOTAL + _NUMBER + r"\s*(?:min(?:utes?)?|mn)\b")
+_TOTAL_HOURS = re.compile(_TOTAL + r"(\d+)\s*h(?:eures?)?\s*(\d+)?\b")
+_SERVINGS = re.compile(r"(?:pour\s+)?(\d+)\s*(?:personnes|convives|portions|parts|couverts)\b")
+
+
+def _num(raw: str) -> float:
+    return float(raw.replace(",", "."))
+
+
+@dataclass
+class Check:
+    name: str
+    status: str  # "pass" / "fail" / "unknown"
+    limit: Any = None
+    found: List[float] = field(default_factory=list)
+
+    def describe(self) -> str:
+        return f"{self.name}={self.status} (limite {self.limit}, lu {self.found})"
+
+
+def check_calories(text: str, limit: float) -> Check:
+    found = [_num(m.group(1)) for m in _KCAL.finditer(text)]
+    if not found:
+        return Check("max_calories_per_meal", "unknown", limit)
+    return Check("max_calories_per_meal", "fail" if max(found) > limit else "pass", limit, found)
+
+
+def check_budget(text: str, limit: float) -> Check:
+    found = [_num(m.group(1)) for m in _EUR_PER_PERSON.finditer(text)]
+    if not found:
+        return Check("budget_per_person_eur_max", "unknown", limit)
+    return Check("budget_per_person_eur_max", "fail" if max(found) > limit else "pass", limit, found)
+
+
+def check_minutes(text: str, limit: float) -> Check:
+    text = _CLOCK.sub(" ", text)
+    totals = [_num(m.group(1)) for m in _TOTAL_TIME.finditer(text)]
+    totals += [int(h) * 60 + int(m or 0) for h, m in _TOTAL_HOURS.findall(text)]
+    if totals:
+        return Check("max_minutes", "fail" if max(totals) > limit else "pass", limit, totals)
+    # Sans total, les durées d'étapes ne tranchent pas: repos, marinade ou frigo ne sont pas
+    # du temps actif, et des étapes peuvent se faire en parallèle
+    durations = [_num(m.group(1)) for m in _MINUTES.finditer(text)]
+    durations += [int(h) * 60 + int(m or 0) for h, m in _HOURS.findall(text)]
+    return Check("max_minutes", "unknown", limit, durations)
+
+
+def check_servings(text: str, expected: int) -> Check:
+    found = [float(m.group(1)) for m in _SERVINGS.finditer(text)]
+    if not found:
+        return Check("servings", "unknown", expected)
+    return Check("servings", "pass" if float(expected) in found else "fail", expected, found)
+
+
+VALIDATORS: Dict[str, Callable[[str, Any], Check]] = {
+    "max_calories_per_meal": check_calories,
+    "budget_per_person_eur_max": check_budget,
+    "max_minutes": check_minutes,
+    "servings": check_servings,
+}
+
+
+def check_limits(output: str, expected: Dict[str, Any]) -> List[Check]:
+    """One Check per numeric limit present in `expected`."""
+    # fold() remplace les symboles non ASCII: "€" est réécrit avant
+    text = fold((output or "").replace("€", " eur "))
+    return [validate(text, expected[key]) for key, validate in VALIDATORS.items() if expected.get(key) is not None]
+
+
+@dataclass
+class Prefilter:
+    status: str  # "fail" / "trivial" / "judge"
+    reasons: List[str] = field(default_factory=list)
+    checks: List[Check] = field(default_factory=list)
+
+    @property
+    def skip_judge(self) -> bool:
+        return self.status != "judge"
+
+
+def prefilter(output: str, expected: Dict[str, Any]) -> Prefilter:
+    checks = check_limits(output, expected)
+    if len((output or "").strip()) < MIN_OUTPUT_CHARS:
+        return Prefilter("trivial", ["sortie vide ou quasi vide"], checks)
+
+    reasons = [check.describe() for check in checks if check.status == "fail"]
+    forbidden, _ = compile_spec(expected).hits(output)
+    if forbidden:
+        reasons.insert(0, f"ingrédients interdits: {forbidden}")
+    return Prefilter("fail" if reasons else "judge", reasons, checks)
+
+
+def limits_score(checks: List[Check]) -> Tuple[Optional[float], str]:
+    """(share of checkable limits that pass, comment); None when nothing could be checked."""
+    known = [check for check in checks if check.status != "unknown"]
+    comment = "; ".join(check.describe() for check in checks)
+    if not known:
+        return None, comment
+    return sum(check.status == "pass" for check in known) / len(known), comment
@@ -1,23 +1,24 @@
 import os
+import sys
+from typing import Any
+
 from dotenv import load_dotenv
-from smolagents import LiteLLMModel
 
-load_dotenv()
+# Permet d'importer le dossier common/ quand on lance main.py depuis ce dossier
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
 
-GROQ_OPENAI_BASE = "https://api.groq.com/openai/v1"
+from common.clients import get_litellm_model
+from common.llm import complete
+from common.metrics import metrics, metrics_labels
+from common.tracing import observe
+
+load_dotenv()
 
 
 def get_groq_litellm_model(
     model_id: str = "groq/llama-3.3-70b-versatile",
     temperature: float = 0.2,
-) -> LiteLLMModel:
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
-        raise RuntimeError("GROQ_API_KEY manquant dans .env / env vars.")
-
-    return LiteLLMModel(
-        model_id=model_id,
-        api_base=GROQ_OPENAI_BASE,
-        api_key=api_key,
-        temperature=temperature,
-    )
+) -> Any:
+    # LiteLLMModel construit au premier appel puis partagé (cf. common/clients.py)
+    return get_litellm_model(model_id=model_id, temperature=temperature)
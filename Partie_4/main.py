@@ -4,13 +4,11 @@ import json
 from typing import Dict, Any, List
 
 from dotenv import load_dotenv
-from groq import Groq
-from langfuse import observe, get_client
+from langfuse import get_client
 from smolagents import tool, ToolCallingAgent
-from llm_utils import get_groq_litellm_model
+from llm_utils import complete, get_groq_litellm_model, metrics, metrics_labels, observe
 
 load_dotenv()
-groq_client = Groq()
 
 # =============================================================================
 # 4.1 - DEFINE 3 TOOLS (schemas for the LLM)
@@ -65,7 +63,7 @@ tools = [
 # 4.1 - TOOL IMPLEMENTATIONS (simulated data)
 # =============================================================================
 
-@observe()
+@observe(leaf=True)
 def check_fridge() -> str:
     data = {
         "available": [
@@ -89,7 +87,7 @@ def check_fridge() -> str:
     return json.dumps(data, ensure_ascii=False)
 
 
-@observe()
+@observe(leaf=True)
 def get_recipe(dish_name: str) -> str:
     recipes = {
         "shakshuka": {
@@ -139,7 +137,7 @@ def get_recipe(dish_name: str) -> str:
     return json.dumps(recipe, ensure_ascii=False)
 
 
-@observe()
+@observe(leaf=True)
 def check_dietary_info(ingredient: str) -> str:
     db = {
         "arachide": {"allergens": ["arachide"], "vegan": True, "notes": "Allergène majeur."},
@@ -196,14 +194,15 @@ def manual_tool_calling_agent(user_message: str) -> str:
         print(f"\n[Iteration {iteration + 1}]")
 
         try:
-            response = groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=messages,
-                tools=tools,
-                tool_choice="auto",
-                parallel_tool_calls=False,
-                temperature=0.2,
-            )
+            with metrics_labels(part="4", stage="manual_tools"):
+                response = complete(
+                    "llama-3.3-70b-versatile",
+                    messages,
+                    tools=tools,
+                    tool_choice="auto",
+                    parallel_tool_calls=False,
+                    temperature=0.2,
+                )
         except Exception as e:
             get_client().update_current_span(level="ERROR", status_message=str(e))
             raise
@@ -212,6 +211,7 @@ def manual_tool_calling_agent(user_message: str) -> str:
 
         # ✅ Final answer
         if not getattr(msg, "tool_calls", None):
+            get_client().update_current_span(metadata={"iterations": iteration + 1, "metrics": metrics.span_metadata()})
             return (msg.content or "").strip()
 
         # Add assistant tool-call message
@@ -374,7 +374,8 @@ def run_smolagents_same_question() -> str:
         "puis propose 2 options et donne une recette détaillée pour celle que tu recommandes."
     )
 
-    result = agent.run(question)
+    with metrics_labels(part="4", stage="smolagents"):
+        result = agent.run(question)
     print(result)
     return str(result)
 
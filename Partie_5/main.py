@@ -6,14 +6,15 @@ from typing import List, Optional
 from datetime import datetime
 
 from dotenv import load_dotenv
-from smolagents import Tool, CodeAgent, LiteLLMModel, tool
+from smolagents import Tool, CodeAgent, tool
+from llm_utils import get_litellm_model, metrics, metrics_labels
 
 load_dotenv()
 
 # -----------------------------------------------------------------------------
-# MODEL (adapte si besoin)
+# MODEL (adapte si besoin) — construit au premier build_agent(), pas à l'import
 # -----------------------------------------------------------------------------
-model = LiteLLMModel(model_id="groq/llama-3.3-70b-versatile")
+MODEL_ID = "groq/llama-3.3-70b-versatile"
 
 # -----------------------------------------------------------------------------
 # SIMPLE TXT TRACING
@@ -250,7 +251,7 @@ def build_agent() -> CodeAgent:
 
     return CodeAgent(
         tools=[menu_tool, calculate],
-        model=model,
+        model=get_litellm_model(MODEL_ID),
         planning_interval=2,
         max_steps=5,
         instructions=(
@@ -275,7 +276,8 @@ def test_planning_agent() -> None:
     trace("\n--- 5.2 TEST (planning agent) ---")
     trace("USER: " + question)
 
-    result = agent.run(question)
+    with metrics_labels(part="5", stage="planning_agent"):
+        result = agent.run(question)
     trace("AGENT: " + str(result))
 
     print(result)
@@ -293,21 +295,24 @@ def test_conversation() -> None:
     # Turn 1
     q1 = "Bonsoir ! On est 3 (1 végétarien, 1 sans gluten, 1 sans contrainte). Tu nous suggères quoi ?"
     trace("USER(1): " + q1)
-    r1 = agent.run(q1)
+    with metrics_labels(part="5", stage="conversation"):
+        r1 = agent.run(q1)
     trace("AGENT(1): " + str(r1))
     print("\nTour 1:\n", r1)
 
     # Turn 2
     q2 = "Finalement le végétarien ne veut pas de risotto. Tu remplaces son plat par autre chose."
     trace("USER(2): " + q2)
-    r2 = agent.run(q2, reset=False)
+    with metrics_labels(part="5", stage="conversation"):
+        r2 = agent.run(q2, reset=False)
     trace("AGENT(2): " + str(r2))
     print("\nTour 2:\n", r2)
 
     # Turn 3
     q3 = "Ok, maintenant fais l'addition détaillée finale pour les 3."
     trace("USER(3): " + q3)
-    r3 = agent.run(q3, reset=False)
+    with metrics_labels(part="5", stage="conversation"):
+        r3 = agent.run(q3, reset=False)
     trace("AGENT(3): " + str(r3))
     print("\nTour 3:\n", r3)
 
@@ -326,4 +331,6 @@ if __name__ == "__main__":
     test_planning_agent()
     test_conversation()
 
+    trace("\nMETRICS: " + json.dumps(metrics.span_metadata(), ensure_ascii=False))
     print("\nTrace saved in:", TRACE_FILE)
+    print("Metrics saved in:", metrics.write_snapshot())
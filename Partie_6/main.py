@@ -1,13 +1,21 @@
 from __future__ import annotations
 
 import os
+import sys
 import json
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Any, List, Optional
 from datetime import datetime
 
 from dotenv import load_dotenv
-from smolagents import Tool, CodeAgent, LiteLLMModel, tool
+from smolagents import Tool, CodeAgent, tool
+
+# Permet d'importer le dossier common/ quand on lance Partie_6/main.py
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.clients import get_litellm_model
+from common.metrics import metrics, metrics_labels
 
 load_dotenv()
 
@@ -15,20 +23,15 @@ load_dotenv()
 # CONFIG
 # =============================================================================
 
-import litellm
-litellm._turn_on_debug()
-
-if not os.getenv("GROQ_API_KEY"):
-    raise RuntimeError("GROQ_API_KEY manquant. Mets-le dans .env puis relance.")
+# Logs de debug LiteLLM: CHEFBOT_LITELLM_DEBUG=1 (activés à la création du modèle)
 
 # Important: force provider + api_base => évite l’erreur "LLM Provider NOT provided"
 MODEL_ID = "llama-3.3-70b-versatile"
-model = LiteLLMModel(
-    model_id=MODEL_ID,
-    custom_llm_provider="groq",
-    api_key=os.getenv("GROQ_API_KEY"),
-    api_base="https://api.groq.com/openai/v1",
-)
+
+
+def get_model() -> Any:
+    # Construit au premier appel (vérifie GROQ_API_KEY à ce moment-là)
+    return get_litellm_model(model_id=MODEL_ID, custom_llm_provider="groq")
 
 TRACE_FILE = f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
 def trace(line: str) -> None:
@@ -240,6 +243,7 @@ class MenuDatabaseTool(Tool):
 
 def build_agents():
     menu_tool = MenuDatabaseTool()
+    model = get_model()
 
     nutritionist = CodeAgent(
         tools=[check_dietary_info],
@@ -304,7 +308,8 @@ def manager_run(user_request: str) -> str:
         "Donne 2 idées par service (apéro, entrée, plat, dessert) compatibles avec toutes les contraintes.\n"
         "Réponds en JSON strict: {aperitif:[...], entree:[...], plat:[...], dessert:[...]}."
     )
-    chef_out = chef_agent.run(chef_prompt)
+    with metrics_labels(part="6", stage="chef_agent"):
+        chef_out = chef_agent.run(chef_prompt)
     trace("\n[chef_agent]\n" + str(chef_out))
 
     # 2) Budget
@@ -317,7 +322,8 @@ def manager_run(user_request: str) -> str:
         "Calcule total = somme(prix_plat * 8) pour chaque service.\n"
         "Réponds en JSON strict: {menu:{aperitif:..., entree:..., plat:..., dessert:...}, breakdown:{...}, total_eur:..., margin_eur:...}."
     )
-    budget_out = budget_agent.run(budget_prompt)
+    with metrics_labels(part="6", stage="budget_agent"):
+        budget_out = budget_agent.run(budget_prompt)
     trace("\n[budget_agent]\n" + str(budget_out))
 
     # 3) Nutritionist
@@ -329,7 +335,8 @@ def manager_run(user_request: str) -> str:
         "Tout doit convenir aux végétariens (donc pas de viande/poisson).\n"
         "Réponds en JSON strict: {ok: true/false, issues:[...], fixes:[...], notes:[...]}."
     )
-    nutri_out = nutritionist.run(nutrition_prompt)
+    with metrics_labels(part="6", stage="nutritionist"):
+        nutri_out = nutritionist.run(nutrition_prompt)
     trace("\n[nutritionist]\n" + str(nutri_out))
 
     # 4) Manager final (no tools)
@@ -345,8 +352,10 @@ def manager_run(user_request: str) -> str:
         "3) Budget (total + marge)\n"
         "4) Option(s) faciles si besoin\n"
     )
-    final = manager.run(manager_prompt)
+    with metrics_labels(part="6", stage="manager"):
+        final = manager.run(manager_prompt)
     trace("\n[manager_final]\n" + str(final))
+    trace("\n[metrics]\n" + json.dumps(metrics.span_metadata(), ensure_ascii=False))
 
     return str(final)
 
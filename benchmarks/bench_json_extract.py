@@ -0,0 +1,145 @@
+"""
+Micro-benchmark + fuzz run for common/json_extract.py.
+
+    python benchmarks/bench_json_extract.py [--fuzz 2000] [--repeat 200]
+
+1) Corpus (benchmarks/data/json_corpus.jsonl): model answers seen from the
+   planner / judge prompts (fences, prose, truncation...). Compares the old
+   find/rfind safe_json_loads with extract_json: accuracy and time per call.
+2) Fuzz: seeded mutations of the corpus (extra prose with braces, fences,
+   random truncation, concatenation). extract_json may only raise ValueError.
+Exit code 1 if the fuzz run finds a crash or the corpus accuracy regresses.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+from typing import Any, Callable, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from common.json_extract import JSONExtractor, extract_json
+
+CORPUS = os.path.join(ROOT, "benchmarks", "data", "json_corpus.jsonl")
+
+PROSE = [
+    "Voici ma proposition :",
+    "Remarque : {option} possible.",
+    "J'ai suivi le format [steps].",
+    'Le chef précise "fait maison".',
+    "Bon appétit !",
+]
+
+
+def legacy_safe_json_loads(raw: str) -> Any:
+    # Ancienne version (3 json.loads sur des tranches find/rfind)
+    raw = raw.strip()
+    try:
+        return json.loads(raw)
+    except Exception:
+        pass
+    a, b = raw.find("{"), raw.rfind("}")
+    if a != -1 and b != -1 and b > a:
+        return json.loads(raw[a : b + 1])
+    a, b = raw.find("["), raw.rfind("]")
+    if a != -1 and b != -1 and b > a:
+        return json.loads(raw[a : b + 1])
+    raise ValueError("JSON introuvable dans la réponse.")
+
+
+def load_corpus() -> List[dict]:
+    with open(CORPUS, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def accuracy(parse: Callable[[str], Any], corpus: List[dict]) -> int:
+    ok = 0
+    for case in corpus:
+        try:
+            ok += parse(case["raw"]) == case["expected"]
+        except Exception:
+            ok += case["expected"] is None
+    return ok
+
+
+def mutate(raw: str, rng: random.Random) -> str:
+    kind = rng.randrange(5)
+    if kind == 0:
+        return f"{rng.choice(PROSE)}\n{raw}\n{rng.choice(PROSE)}"
+    if kind == 1:
+        return f"```json\n{raw}\n```"
+    if kind == 2:
+        return raw[: rng.randrange(len(raw) + 1)]
+    if kind == 3:
+        return raw + "\n" + raw
+    # bruit: on insère un caractère structurant au hasard
+    pos = rng.randrange(len(raw) + 1)
+    return raw[:pos] + rng.choice('{}[]",:\\') + raw[pos:]
+
+
+def fuzz(corpus: List[dict], n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    crashes = []
+    for _ in range(n):
+        raw = mutate(rng.choice(corpus)["raw"], rng)
+        try:
+            extract_json(raw)
+        except ValueError:
+            pass
+        except Exception as e:  # tout autre type d'erreur est un bug
+            crashes.append(f"{type(e).__name__}: {e} <- {raw[:120]!r}")
+        # le mode incrémental doit donner le même résultat que le mode direct
+        extractor = JSONExtractor(prefer=dict)
+        for i in range(0, len(raw), 7):
+            extractor.feed(raw[i : i + 7])
+        try:
+            streamed = extractor.finish()
+        except ValueError:
+            streamed = None
+        try:
+            direct = extract_json(raw)
+        except ValueError:
+            direct = None
+        if streamed != direct:
+            crashes.append(f"stream/direct mismatch <- {raw[:120]!r}")
+    return crashes
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fuzz", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    report = {"corpus_size": len(corpus)}
+    for name, parse in (("legacy", legacy_safe_json_loads), ("extract_json", extract_json)):
+
+        def _run() -> None:
+            for case in corpus:
+                try:
+                    parse(case["raw"])
+                except Exception:
+                    pass
+
+        seconds = min(timeit.repeat(_run, number=args.repeat, repeat=3))
+        report[name] = {
+            "correct": accuracy(parse, corpus),
+            "us_per_call": round(seconds / (args.repeat * len(corpus)) * 1e6, 2),
+        }
+
+    crashes = fuzz(corpus, args.fuzz)
+    report["fuzz"] = {"cases": args.fuzz, "failures": len(crashes), "examples": crashes[:5]}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    regressed = report["extract_json"]["correct"] < report["legacy"]["correct"]
+    return 1 if crashes or regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Micro-benchmark for Partie_3/matcher.py (rule_evaluator matching).
+
+    python benchmarks/bench_matcher.py [--outputs 5000] [--seed 0]
+
+1) Labelled cases: word boundaries ("sel" / "selle"), accents, ligatures,
+   plurals, apostrophes. Compares the old substring rule_evaluator with the
+   compiled matcher.
+2) Throughput: a synthetic dump of --outputs menus (mixed expected-specs from
+   the Partie 3 dataset) scored by the old per-term `in` loop and by
+   score_outputs; time per output and total.
+Exit code 1 if the matcher gets a labelled case wrong.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "Partie_3"))
+
+from matcher import compile_spec, score_outputs
+
+# Mêmes expected_output que TEST_CASES (LLM_judge.py importe langfuse)
+SPECS = [
+    {"must_avoid": ["sucre", "soda", "pâtes blanches"], "must_include": ["légumes verts", "protéines maigres"]},
+    {"must_avoid": ["arachide", "cacahuète", "beurre de cacahuète", "miel", "œuf", "lait"], "must_include": ["légumineuses"]},
+    {"must_avoid": ["porc", "blé", "farine de blé"], "must_include": ["huile d'olive", "tomates", "basilic", "origan"]},
+    {"must_avoid": ["sel", "sauce soja", "charcuterie"], "must_include": ["citron", "ail", "légumes"]},
+    {"must_avoid": ["poisson cru", "mirin", "saké", "alcool"], "must_include": ["riz", "gingembre"]},
+]
+
+# (sortie, spec, forbidden_hits attendus, include_hits attendus)
+LABELLED: List[Tuple[str, Dict[str, Any], List[str], List[str]]] = [
+    ("Selle d'agneau rôtie, citron et ail, légumes grillés.", SPECS[3], [], ["citron", "ail", "légumes"]),
+    ("Une pincée de SEL, un filet de citron.", SPECS[3], ["sel"], ["citron"]),
+    ("Salade d'ailes de poulet, légume vert.", SPECS[3], [], ["légumes"]),
+    ("Omelette aux oeufs et au lait d’amande.", SPECS[1], ["œuf", "lait"], []),
+    ("Curry de légumineuses, sans arachides.", SPECS[1], ["arachide"], ["légumineuses"]),
+    ("Tomate, huile d’olive, basilic ; farine de blé évitée.", SPECS[2], ["blé", "farine de blé"], ["huile d'olive", "tomates", "basilic"]),
+    ("Bento: riz, gingembre mariné, pas de sake ni de mirin.", SPECS[4], ["mirin", "saké"], ["riz", "gingembre"]),
+    ("Dessert au sucre-glace, soda light.", SPECS[0], ["sucre", "soda"], []),
+    ("Poisson cuit vapeur, crudités, porcelaine de table.", SPECS[2], [], []),
+]
+
+WORDS = (
+    "velouté de courgettes au citron, poulet grillé, quinoa, salade de lentilles, tomates rôties, "
+    "basilic frais, huile d'olive, gingembre, riz complet, légumes verts vapeur, protéines maigres, "
+    "selle d'agneau, porcelaine, saké, miel, sel, sauce soja, yaourt, pommes, épinards, cacahuètes"
+).split(", ")
+
+
+def legacy_rule_evaluator(output: str, expected: dict) -> dict:
+    # Ancienne version (sous-chaînes, un `in` par terme)
+    out = re.sub(r"\s+", " ", (output or "").lower()).strip()
+    must_avoid = [str(x).lower() for x in expected.get("must_avoid", [])]
+    must_include = [str(x).lower() for x in expected.get("must_include", [])]
+    forbidden_hits = [x for x in must_avoid if x and x in out]
+    include_hits = [x for x in must_include if x and x in out]
+    avoid_score = 1.0 if not forbidden_hits else 0.0
+    include_score = 1.0 if not must_include else len(include_hits) / len(must_include)
+    return {
+        "must_avoid_ok": avoid_score,
+        "must_include_coverage": include_score,
+        "overall_rules": (avoid_score + include_score) / 2.0,
+        "debug_forbidden_hits": forbidden_hits,
+        "debug_include_hits": include_hits,
+    }
+
+
+def synthetic_dump(n: int, seed: int) -> List[Tuple[str, Dict[str, Any]]]:
+    rng = random.Random(seed)
+    dump = []
+    for _ in range(n):
+        lines = [f"- {', '.join(rng.sample(WORDS, 4))}." for _ in range(rng.randint(8, 20))]
+        dump.append(("Menu proposé :\n" + "\n".join(lines), rng.choice(SPECS)))
+    return dump
+
+
+def labelled_report(name: str, evaluate: Any) -> Dict[str, Any]:
+    wrong = []
+    for output, spec, forbidden, include in LABELLED:
+        scores = evaluate(output, spec)
+        if sorted(scores["debug_forbidden_hits"]) != sorted(forbidden) or sorted(scores["debug_include_hits"]) != sorted(include):
+            wrong.append({"output": output, "forbidden": scores["debug_forbidden_hits"], "include": scores["debug_include_hits"]})
+    return {"correct": len(LABELLED) - len(wrong), "of": len(LABELLED), "wrong": wrong if name == "matcher" else len(wrong)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--outputs", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report: Dict[str, Any] = {
+        "labelled": {
+            "legacy": labelled_report("legacy", legacy_rule_evaluator),
+            "matcher": labelled_report("matcher", lambda o, e: compile_spec(e).score(o)),
+        }
+    }
+
+    dump = synthetic_dump(args.outputs, args.seed)
+    timings = {}
+    for name, run in (
+        ("legacy", lambda: [legacy_rule_evaluator(o, e) for o, e in dump]),
+        ("matcher", lambda: score_outputs(dump)),
+    ):
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+        timings[name] = {"total_ms": round(seconds * 1e3, 1), "us_per_output": round(seconds / len(dump) * 1e6, 2)}
+    report["dump"] = {"outputs": len(dump), "avg_chars": sum(len(o) for o, _ in dump) // len(dump), **timings}
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if not report["labelled"]["matcher"]["wrong"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Per-call overhead of @observe, with and without the tracing policy (common/tracing.py).
+
+    python benchmarks/bench_tracing.py [--traces 200] [--leaves 10]
+
+Each trace is a root function calling --leaves times a tiny leaf function
+(same shape as a Partie 4 tool). Spans are really exported: the Langfuse
+client points at a local HTTP sink that accepts everything and counts bytes.
+
+Scenarios:
+- bare: no decorator
+- langfuse: langfuse.observe on root and leaves (what the parts used before)
+- policy_default: common.tracing.observe, leaves as counters, every trace kept
+- policy_leaf_spans: policy with CHEFBOT_TRACE_LEAVES=spans (policy cost alone)
+- policy_sampled_10pct: leaves as counters, 10% of the traces kept
+
+Reports wall / CPU time per leaf call (minus "bare") and bytes sent to the sink per trace.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+
+class _Sink:
+    def __init__(self) -> None:
+        self.bytes = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with sink._lock:
+                    sink.bytes += len(body)
+                    sink.requests += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def take(self) -> int:
+        with self._lock:
+            sent, self.bytes = self.bytes, 0
+        return sent
+
+
+def leaf_impl(x: int) -> str:
+    return json.dumps({"available": ["tomates", "riz", "citron"], "i": x})
+
+
+def build(decorate: Callable[..., Any], leaf_kwargs: Dict[str, Any], leaves: int) -> Callable[[], None]:
+    leaf = decorate(name="bench_leaf", **leaf_kwargs)(leaf_impl)
+
+    @decorate(name="bench_root")
+    def root() -> None:
+        for i in range(leaves):
+            leaf(i)
+
+    return root
+
+
+def measure(root: Callable[[], None], traces: int, flush: Callable[[], None]) -> Dict[str, float]:
+    flush()
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(traces):
+        root()
+    flush()
+    return {"wall_s": time.perf_counter() - wall, "cpu_s": time.process_time() - cpu}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--traces", type=int, default=200)
+    parser.add_argument("--leaves", type=int, default=10)
+    args = parser.parse_args()
+
+    sink = _Sink()
+    os.environ.update(
+        {
+            "LANGFUSE_PUBLIC_KEY": "pk-lf-bench",
+            "LANGFUSE_SECRET_KEY": "sk-lf-bench",
+            "LANGFUSE_HOST": sink.url,
+            "LANGFUSE_BASE_URL": sink.url,
+            "LANGFUSE_TRACING_ENABLED": "true",
+        }
+    )
+    from langfuse import get_client, observe as langfuse_observe
+
+    from common import tracing
+    from common.tracing import TracingPolicy, set_tracing_policy
+
+    client = get_client()
+
+    def bare(name: str = "", **kwargs: Any) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        return lambda f: f
+
+    def lf(name: str, **kwargs: Any) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        return langfuse_observe(name=name)
+
+    scenarios = [
+        ("bare", bare, {}, TracingPolicy()),
+        ("langfuse", lf, {}, TracingPolicy()),
+        ("policy_default", tracing.observe, {"leaf": True}, TracingPolicy()),
+        ("policy_leaf_spans", tracing.observe, {"leaf": True}, TracingPolicy(leaves_as_counters=False)),
+        ("policy_sampled_10pct", tracing.observe, {"leaf": True}, TracingPolicy(rates={"*": 0.1}, seed=0)),
+    ]
+
+    calls = args.traces * args.leaves
+    report: Dict[str, Any] = {"traces": args.traces, "leaves_per_trace": args.leaves, "scenarios": {}}
+    baseline = None
+    for name, decorate, leaf_kwargs, policy in scenarios:
+        set_tracing_policy(policy)
+        root = build(decorate, leaf_kwargs, args.leaves)
+        root()  # chauffe (client, exporteur)
+        client.flush()
+        sink.take()
+        timing = measure(root, args.traces, client.flush)
+        sent = sink.take()
+        if baseline is None:
+            baseline = timing
+        report["scenarios"][name] = {
+            "us_per_leaf_call": round((timing["wall_s"] - baseline["wall_s"]) / calls * 1e6, 2),
+            "cpu_us_per_leaf_call": round((timing["cpu_s"] - baseline["cpu_s"]) / calls * 1e6, 2),
+            "bytes_per_trace": round(sent / args.traces),
+        }
+    report["span_counters"] = tracing.span_counters.snapshot()
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
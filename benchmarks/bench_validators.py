@@ -0,0 +1,90 @@
+"""
+Labelled cases for Partie_3/validators.py (numeric limits and judge pre-filter).
+
+    python benchmarks/bench_validators.py
+
+Each case is an output, the expected_output limits and the status expected
+from every validator it triggers. Covers clock times ("servir à 12h",
+"prêt pour 19h30") and long single steps (repos, marinade) that must not be
+read as a total time, next to explicit totals, budgets, calories and servings.
+Exit code 1 if a case is wrong.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sys
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "Partie_3"))
+
+from validators import check_limits, prefilter
+
+# (sortie, limites attendues, statut attendu par validateur, statut attendu du pré-filtre)
+LABELLED: List[Tuple[str, Dict[str, Any], Dict[str, str], str]] = [
+    (
+        "Velouté de courgettes, temps total : 25 min. À servir à 12h pour 4 personnes.",
+        {"max_minutes": 30, "servings": 4},
+        {"max_minutes": "pass", "servings": "pass"},
+        "judge",
+    ),
+    (
+        "Poulet rôti aux herbes, prêt pour 19h30. Cuisson 20 min, repos 5 min.",
+        {"max_minutes": 30},
+        {"max_minutes": "unknown"},
+        "judge",
+    ),
+    (
+        "Brochettes marinées : laisser mariner 2 heures au frais, puis griller 10 min.",
+        {"max_minutes": 30},
+        {"max_minutes": "unknown"},
+        "judge",
+    ),
+    (
+        "Pâte à tarte : repos 60 min au réfrigérateur, cuisson 25 min. Servir vers 20h.",
+        {"max_minutes": 45},
+        {"max_minutes": "unknown"},
+        "judge",
+    ),
+    (
+        "Bœuf bourguignon mijoté, temps total : 3h15, à déguster dès 19h.",
+        {"max_minutes": 60},
+        {"max_minutes": "fail"},
+        "fail",
+    ),
+    (
+        "Curry de lentilles prêt en 1h05, environ 450 kcal par portion.",
+        {"max_minutes": 60, "max_calories_per_meal": 500},
+        {"max_minutes": "fail", "max_calories_per_meal": "pass"},
+        "fail",
+    ),
+    (
+        "Salade de quinoa, 380 kcal, 3,50 € par personne, pour 2 personnes.",
+        {"max_calories_per_meal": 400, "budget_per_person_eur_max": 4, "servings": 2},
+        {"max_calories_per_meal": "pass", "budget_per_person_eur_max": "pass", "servings": "pass"},
+        "judge",
+    ),
+    (
+        "Lasagnes gratinées, 720 calories, 6€/pers, pour 6 personnes. Total 1800 kcal par jour.",
+        {"max_calories_per_meal": 600, "budget_per_person_eur_max": 5, "servings": 6},
+        {"max_calories_per_meal": "fail", "budget_per_person_eur_max": "fail", "servings": "pass"},
+        "fail",
+    ),
+]
+
+
+def main() -> int:
+    wrong = []
+    for output, limits, statuses, expected_prefilter in LABELLED:
+        got = {check.name: check.status for check in check_limits(output, limits)}
+        got_prefilter = prefilter(output, limits).status
+        if got != statuses or got_prefilter != expected_prefilter:
+            wrong.append({"output": output, "checks": got, "prefilter": got_prefilter})
+
+    print(json.dumps({"correct": len(LABELLED) - len(wrong), "of": len(LABELLED), "wrong": wrong}, indent=2, ensure_ascii=False))
+    return 0 if not wrong else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
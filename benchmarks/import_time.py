@@ -0,0 +1,94 @@
+"""
+Import-time budget for the ChefBot modules.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for each
+entry point (from the folder the script is normally launched from), reads the
+cumulative time of the top-level import and fails when a module goes over its
+budget or pulls in a module it should only load lazily.
+
+    python benchmarks/import_time.py            # exit code 1 if over budget
+    python benchmarks/import_time.py --json     # machine-readable report
+
+CHEFBOT_IMPORT_BUDGET_SCALE=1.5 loosens every budget (slow CI machines).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (folder, module, budget en ms, modules qui ne doivent PAS être importés)
+TARGETS: List[Tuple[str, str, float, List[str]]] = [
+    (".", "Partie_1.chefbot", 600, ["groq"]),
+    ("Partie_2", "llm_utils", 600, ["groq"]),
+    ("Partie_2", "main", 700, ["groq", "Partie_1.chefbot"]),
+    ("Partie_3", "LLM_judge", 700, ["groq"]),
+    ("Partie_4", "tools", 2500, ["groq", "litellm"]),
+    ("Partie_5", "main", 2500, ["litellm"]),
+    ("Partie_6", "main", 2500, ["litellm"]),
+]
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def measure(folder: str, module: str) -> Tuple[float, Dict[str, float]]:
+    """Return (cumulative ms of `module`, {imported module: cumulative ms})."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.join(ROOT, folder),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    imported: Dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            imported[m.group(4)] = int(m.group(2)) / 1000.0
+    return imported.get(module, 0.0), imported
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    scale = float(os.getenv("CHEFBOT_IMPORT_BUDGET_SCALE", "1"))
+    report = []
+    for folder, module, budget_ms, forbidden in TARGETS:
+        total_ms, imported = measure(folder, module)
+        leaked = [name for name in forbidden if name in imported]
+        report.append(
+            {
+                "folder": folder,
+                "module": module,
+                "import_ms": round(total_ms, 1),
+                "budget_ms": budget_ms * scale,
+                "leaked_imports": leaked,
+                "ok": total_ms <= budget_ms * scale and not leaked,
+            }
+        )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for r in report:
+            status = "OK  " if r["ok"] else "FAIL"
+            extra = f"  eager: {', '.join(r['leaked_imports'])}" if r["leaked_imports"] else ""
+            print(f"{status} {r['folder']:<9} {r['module']:<18} {r['import_ms']:>8.1f} ms / {r['budget_ms']:.0f} ms{extra}")
+
+    return 0 if all(r["ok"] for r in report) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
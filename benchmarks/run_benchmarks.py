@@ -0,0 +1,295 @@
+"""
+End-to-end benchmarks of every ChefBot pipeline against the local stub server.
+
+    python benchmarks/run_benchmarks.py                          # all pipelines, 3 runs each
+    python benchmarks/run_benchmarks.py --pipelines plan_weekly_menu --repeat 5
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/results/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/baseline.json --fail-on-regression
+
+benchmarks/stub_server.py is started in-process; every run of a pipeline is a
+fresh child process pointed at it (GROQ_BASE_URL), with Langfuse export, the
+response / plan caches and the RPM/TPM limits turned off. Imports happen before
+the clock starts (see import_time.py for those).
+
+Per pipeline (median of the runs): wall time, CPU time of the child, LLM-wait
+fraction (share of the wall time during which at least one request was in
+flight on the stub), number of LLM requests, peak Python memory (tracemalloc)
+and max RSS. Results are written as JSON; with --baseline, regressions beyond
+--threshold on wall / CPU time are reported (exit 1 with --fail-on-regression).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+
+from stub_server import add_stub_arguments, config_from_args, start_stub_server
+
+RESULT_MARKER = "BENCH_RESULT "
+DEFAULT_OUT = os.path.join(ROOT, "benchmarks", "results", "latest.json")
+
+QUESTION = (
+    "Je veux un dîner pour 2 personnes, rapide (<= 25 min), sans arachides, et idéalement riche en protéines. "
+    "Regarde d'abord ce qu'il y a dans le frigo, puis propose 2 options."
+)
+CONSTRAINTS = "Menu pour 2 personnes, budget moyen, cuisine de saison, sans porc, 2 repas végétariens, rapide en semaine."
+PARTY = (
+    "Je reçois 8 personnes samedi soir. Parmi eux : 2 vegetariens, 1 intolerant au gluten, "
+    "1 allergique aux fruits a coque. Budget total : 120 euros."
+)
+
+
+# =============================================================================
+# PIPELINES (côté processus enfant)
+# =============================================================================
+
+def _import(folder: str, module: str) -> Any:
+    # Chaque partie se lance depuis son dossier (imports frères: llm_utils, tools...)
+    sys.path.insert(0, os.path.join(ROOT, folder))
+    sys.path.append(ROOT)
+    return __import__(module)
+
+
+def _ask_chef_sweep() -> Callable[[], Any]:
+    chefbot = _import("Partie_1", "chefbot")
+    return lambda: asyncio.run(chefbot.ask_chef_many("Que proposez-vous ce midi ?", [0.1, 0.4, 0.7, 1.0, 1.3]))
+
+
+def _plan_weekly_menu() -> Callable[[], Any]:
+    planner = _import("Partie_2", "planner")
+    return lambda: planner.plan_weekly_menu(CONSTRAINTS, use_plan_cache=False, flush=False)
+
+
+def _experiment() -> Callable[[], Any]:
+    # Même exécuteur que run_experiment (tâche + 2 évaluateurs par item), sans le serveur Langfuse
+    judge = _import("Partie_3", "LLM_judge")
+    experiment = _import("Partie_3", "experiment")
+    items = [SimpleNamespace(id=str(i), **case) for i, case in enumerate(judge.TEST_CASES)]
+    runner = experiment.ExperimentRunner("bench", judge.task, [judge.rules_eval, judge.llm_eval])
+    return lambda: runner.run(items)
+
+
+def _manual_tool_loop() -> Callable[[], Any]:
+    tools = _import("Partie_4", "tools")
+    return lambda: tools.manual_tool_calling_agent(QUESTION)
+
+
+def _smolagents_tools() -> Callable[[], Any]:
+    tools = _import("Partie_4", "tools")
+    return tools.run_smolagents_same_question
+
+
+def _smolagents_planning() -> Callable[[], Any]:
+    part5 = _import("Partie_5", "main")
+    return part5.test_planning_agent
+
+
+def _multi_agent_manager() -> Callable[[], Any]:
+    part6 = _import("Partie_6", "main")
+    return lambda: part6.manager_run(PARTY)
+
+
+PIPELINES: Dict[str, Callable[[], Callable[[], Any]]] = {
+    "ask_chef_sweep": _ask_chef_sweep,
+    "plan_weekly_menu": _plan_weekly_menu,
+    "experiment": _experiment,
+    "manual_tool_loop": _manual_tool_loop,
+    "smolagents_tools": _smolagents_tools,
+    "smolagents_planning": _smolagents_planning,
+    "multi_agent_manager": _multi_agent_manager,
+}
+
+
+def run_child(name: str) -> None:
+    import resource
+
+    pipeline = PIPELINES[name]()
+    tracemalloc.start()
+    cpu_start, wall_start, t0 = time.process_time(), time.perf_counter(), time.time()
+    pipeline()
+    wall_s, cpu_s, t1 = time.perf_counter() - wall_start, time.process_time() - cpu_start, time.time()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        "wall_s": wall_s,
+        "cpu_s": cpu_s,
+        "peak_mem_mb": peak / 2**20,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "window": [t0, t1],
+    }
+    print(RESULT_MARKER + json.dumps(result), flush=True)
+
+
+# =============================================================================
+# ORCHESTRATION (processus parent)
+# =============================================================================
+
+def busy_time(intervals: List[Tuple[float, float]], window: Tuple[float, float]) -> float:
+    """Length of the union of `intervals`, clipped to `window`."""
+    total, current_start, current_end = 0.0, None, None
+    for start, end in sorted((max(s, window[0]), min(e, window[1])) for s, e in intervals):
+        if end <= start:
+            continue
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def _stub_call(base_url: str, path: str, method: str = "GET") -> Dict[str, Any]:
+    request = urllib.request.Request(base_url + path, data=b"{}" if method == "POST" else None, method=method)
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def child_env(base_url: str, workdir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        {
+            "GROQ_BASE_URL": base_url,
+            "GROQ_API_KEY": "stub",
+            "LANGFUSE_TRACING_ENABLED": "false",
+            "CHEFBOT_LLM_MODE": "live",
+            "CHEFBOT_CACHE": "0",
+            "CHEFBOT_JUDGE_CACHE": "0",
+            "CHEFBOT_CACHE_PATH": os.path.join(workdir, "cache.sqlite3"),
+            "CHEFBOT_METRICS_DIR": os.path.join(workdir, "metrics"),
+            "CHEFBOT_RPM": "0",
+            "CHEFBOT_TPM": "0",
+            "CHEFBOT_HTTP2": "0",
+        }
+    )
+    return env
+
+
+def run_once(name: str, base_url: str) -> Dict[str, Any]:
+    _stub_call(base_url, "/reset", "POST")
+    with tempfile.TemporaryDirectory(prefix=f"chefbot-bench-{name}-") as workdir:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", name],
+            cwd=workdir,
+            env=child_env(base_url, workdir),
+            capture_output=True,
+            text=True,
+        )
+    lines = [l for l in proc.stdout.splitlines() if l.startswith(RESULT_MARKER)]
+    if proc.returncode != 0 or not lines:
+        tail = (proc.stderr or proc.stdout).strip().splitlines()[-8:]
+        return {"error": "\n".join(tail) or f"exit code {proc.returncode}"}
+
+    result = json.loads(lines[-1][len(RESULT_MARKER):])
+    stats = _stub_call(base_url, "/stats")
+    llm_wait_s = busy_time([tuple(i) for i in stats["intervals"]], tuple(result.pop("window")))
+    result["llm_requests"] = stats["requests"]
+    result["llm_wait_s"] = llm_wait_s
+    result["llm_wait_fraction"] = llm_wait_s / result["wall_s"] if result["wall_s"] > 0 else None
+    return result
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [r for r in runs if "error" not in r]
+    if not ok:
+        return {"error": runs[-1]["error"]}
+    keys = ["wall_s", "cpu_s", "llm_wait_s", "llm_wait_fraction", "llm_requests", "peak_mem_mb", "max_rss_mb"]
+    return {k: round(statistics.median(r[k] for r in ok), 4) for k in keys} | {"runs_ok": len(ok)}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+    print(f"\n{'pipeline':<22}{'metric':<10}{'baseline':>10}{'now':>10}{'delta':>9}")
+    for name, now in results["pipelines"].items():
+        before = baseline.get("pipelines", {}).get(name, {}).get("median")
+        if not before or "error" in before or "error" in now["median"]:
+            continue
+        for metric in ("wall_s", "cpu_s", "peak_mem_mb"):
+            old, new = before[metric], now["median"][metric]
+            delta = (new - old) / old if old else 0.0
+            flag = " <-- regression" if delta > threshold and metric != "peak_mem_mb" else ""
+            print(f"{name:<22}{metric:<10}{old:>10.3f}{new:>10.3f}{delta:>+8.1%}{flag}")
+            if flag:
+                regressions.append(f"{name}.{metric} {delta:+.1%}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--pipelines", default=",".join(PIPELINES), help="comma-separated subset")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--save-baseline", help="also write the results to this path")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return 0
+
+    names = [n.strip() for n in args.pipelines.split(",") if n.strip()]
+    unknown = [n for n in names if n not in PIPELINES]
+    if unknown:
+        parser.error(f"unknown pipelines: {unknown} (choices: {list(PIPELINES)})")
+
+    config = config_from_args(args)
+    server, _ = start_stub_server(config)
+    host, port = server.server_address[:2]
+    base_url = f"http://{host}:{port}"
+
+    results: Dict[str, Any] = {
+        "config": {**vars(config), "repeat": args.repeat, "python": platform.python_version(), "machine": platform.machine()},
+        "pipelines": {},
+    }
+    print(f"{'pipeline':<22}{'wall_s':>8}{'cpu_s':>8}{'llm_wait':>10}{'calls':>7}{'peak_mb':>9}")
+    for name in names:
+        runs = [run_once(name, base_url) for _ in range(args.repeat)]
+        median = summarize(runs)
+        results["pipelines"][name] = {"median": median, "runs": runs}
+        if "error" in median:
+            print(f"{name:<22} FAILED\n    " + median["error"].replace("\n", "\n    "))
+        else:
+            print(
+                f"{name:<22}{median['wall_s']:>8.2f}{median['cpu_s']:>8.2f}"
+                f"{median['llm_wait_fraction']:>10.1%}{median['llm_requests']:>7.0f}{median['peak_mem_mb']:>9.1f}"
+            )
+    server.shutdown()
+
+    for path in filter(None, [args.out, args.save_baseline]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions and args.fail_on_regression:
+            print("Regressions: " + ", ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
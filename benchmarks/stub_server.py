@@ -0,0 +1,272 @@
+"""
+Local OpenAI-compatible stub of the Groq API, for benchmarks.
+
+    python benchmarks/stub_server.py --port 8765 --ttft-median-ms 300 --tokens-per-s 400
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=stub python Partie_2/main.py
+
+Serves POST .../chat/completions (plain and stream=True / SSE). Latency of a
+call = time-to-first-token drawn from a log-normal distribution (median,
+sigma) + completion_tokens / tokens_per_s. Answers are canned but shaped for
+each ChefBot prompt so every pipeline runs to completion:
+- planner plan / weekly menu / field repair JSON, judge JSON
+- tool calling: a first call to the first tool, then a final answer
+  (smolagents ToolCallingAgent: a call to final_answer)
+- smolagents CodeAgent: a code block calling final_answer()
+
+The server keeps the (start, end) of every request so a benchmark can compute
+the fraction of its wall time spent waiting on the "LLM" (GET /stats, POST /reset).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class StubConfig:
+    ttft_median_ms: float = 300.0
+    ttft_sigma: float = 0.5
+    tokens_per_s: float = 400.0
+    completion_tokens: int = 150
+    seed: int = 0
+
+
+PLAN = {
+    "steps": [
+        {"id": 1, "title": "Inventaire des contraintes", "prompt": "Liste les contraintes.", "depends_on": []},
+        {"id": 2, "title": "Idées de plats", "prompt": "Propose des plats de saison.", "depends_on": [1]},
+        {"id": 3, "title": "Budget", "prompt": "Estime le budget.", "depends_on": [1]},
+        {"id": 4, "title": "Répartition", "prompt": "Répartis les repas sur la semaine.", "depends_on": [2, 3]},
+    ]
+}
+DAYS = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
+WEEKLY_MENU = {
+    "weekly_menu": [
+        {"day": d, "lunch": "Soupe de potimarron", "dinner": "Gratin de poireaux", "notes": "Végétarien"} for d in DAYS
+    ]
+}
+JUDGE = {"pertinence": 0.8, "creativite": 0.7, "praticite": 0.9, "explanation": "Réponse du serveur de test."}
+TEXT = (
+    "Menu proposé : velouté de légumes verts au citron et à l'ail, riz aux légumineuses et gingembre, "
+    "tomates rôties à l'huile d'olive, basilic et origan. Ingrédients accessibles, 20 minutes de préparation."
+)
+
+
+def _text_of(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, list):
+            content = " ".join(str(c.get("text", "")) for c in content if isinstance(c, dict))
+        parts.append(str(content or ""))
+    return "\n".join(parts)
+
+
+def _tool_name(tool: Dict[str, Any]) -> str:
+    return tool.get("function", {}).get("name", "")
+
+
+def canned_reply(body: Dict[str, Any]) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+    """(content, tool_calls) for one request."""
+    messages = body.get("messages") or []
+    text = _text_of(messages)
+    last = str(messages[-1].get("content") or "") if messages else ""
+    tools = body.get("tools") or []
+
+    if tools:
+        names = [_tool_name(t) for t in tools]
+        if "final_answer" in names:
+            return None, [_tool_call("final_answer", {"answer": TEXT})]
+        if not any(m.get("role") == "tool" for m in messages):
+            return None, [_tool_call(names[0], {})]
+        return TEXT, None
+
+    schema_name = ((body.get("response_format") or {}).get("json_schema") or {}).get("name")
+    if "final_answer" in text and "Thought" in text:
+        return f'Thought: je conclus.\n<code>\nfinal_answer("""{TEXT}""")\n</code>', None
+    if '"fixes"' in last:
+        return json.dumps({"fixes": []}), None
+    if schema_name == "weekly_menu" or ("weekly_menu" in last and "Résultats" in last):
+        return json.dumps(WEEKLY_MENU, ensure_ascii=False), None
+    if schema_name == "plan" or '"steps"' in last:
+        return json.dumps(PLAN, ensure_ascii=False), None
+    if "pertinence" in text and "creativite" in text:
+        return json.dumps(JUDGE, ensure_ascii=False), None
+    if "aperitif" in last or "JSON strict" in last:
+        return json.dumps({"ok": True, "issues": [], "fixes": [], "notes": [TEXT]}, ensure_ascii=False), None
+    return TEXT, None
+
+
+def _tool_call(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": f"call_{uuid.uuid4().hex[:12]}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)},
+    }
+
+
+class StubState:
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.intervals: List[Tuple[float, float]] = []
+        self.lock = threading.Lock()
+
+    def draw_ttft_s(self) -> float:
+        with self.lock:
+            z = self.random.gauss(0.0, 1.0)
+        return self.config.ttft_median_ms / 1000.0 * math.exp(self.config.ttft_sigma * z)
+
+    def record(self, start: float, end: float) -> None:
+        with self.lock:
+            self.intervals.append((start, end))
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"requests": len(self.intervals), "intervals": list(self.intervals)}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.intervals.clear()
+
+
+def make_handler(state: StubState) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def _json(self, payload: Dict[str, Any], status: int = 200) -> None:
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path.rstrip("/").endswith("/stats"):
+                self._json(state.stats())
+            else:
+                self._json({"error": "not found"}, 404)
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if self.path.rstrip("/").endswith("/reset"):
+                state.reset()
+                self._json({"ok": True})
+                return
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._json({"error": {"message": f"unknown path {self.path}"}}, 404)
+                return
+
+            start = time.time()
+            content, tool_calls = canned_reply(body)
+            prompt_tokens = max(1, len(json.dumps(body.get("messages", []), ensure_ascii=False)) // 4)
+            completion_tokens = state.config.completion_tokens
+            ttft = state.draw_ttft_s()
+            generation_s = completion_tokens / state.config.tokens_per_s if state.config.tokens_per_s > 0 else 0.0
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+            base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(start), "model": body.get("model", "stub")}
+
+            if body.get("stream"):
+                self._stream(base, content, tool_calls, usage, ttft, generation_s)
+            else:
+                time.sleep(ttft + generation_s)
+                message = {"role": "assistant", "content": content}
+                if tool_calls:
+                    message["tool_calls"] = tool_calls
+                finish = "tool_calls" if tool_calls else "stop"
+                self._json({**base, "object": "chat.completion", "choices": [{"index": 0, "message": message, "finish_reason": finish}], "usage": usage})
+            state.record(start, time.time())
+
+        def _stream(self, base: Dict[str, Any], content: Optional[str], tool_calls: Any, usage: Dict[str, int], ttft: float, generation_s: float) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            pieces = [w + " " for w in (content or "").split(" ")] or [""]
+            time.sleep(ttft)
+            for i, piece in enumerate(pieces):
+                if i:
+                    time.sleep(generation_s / len(pieces))
+                delta: Dict[str, Any] = {"content": piece}
+                if i == 0:
+                    delta["role"] = "assistant"
+                    if tool_calls:
+                        delta["tool_calls"] = [{"index": n, **c} for n, c in enumerate(tool_calls)]
+                self._event({**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            self._event({**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage, "x_groq": {"usage": usage}})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def _event(self, payload: Dict[str, Any]) -> None:
+            self.wfile.write(b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_stub_server(config: StubConfig, host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, StubState]:
+    """Start the server in a daemon thread; port=0 picks a free port (server.server_address)."""
+    state = StubState(config)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = StubConfig()
+    parser.add_argument("--ttft-median-ms", type=float, default=defaults.ttft_median_ms)
+    parser.add_argument("--ttft-sigma", type=float, default=defaults.ttft_sigma, help="log-normal sigma (0 = constant)")
+    parser.add_argument("--tokens-per-s", type=float, default=defaults.tokens_per_s)
+    parser.add_argument("--completion-tokens", type=int, default=defaults.completion_tokens)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        ttft_median_ms=args.ttft_median_ms,
+        ttft_sigma=args.ttft_sigma,
+        tokens_per_s=args.tokens_per_s,
+        completion_tokens=args.completion_tokens,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server, _ = start_stub_server(config_from_args(args), args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Stub Groq API on http://{host}:{port} (GROQ_BASE_URL=http://{host}:{port})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Content-addressed cache for LLM responses.
+
+Two tiers: an in-process LRU (OrderedDict) in front of a SQLite file shared
+between runs. Entries expire after `ttl_s`; the disk tier is bounded to
+`max_disk_entries` (checked every 50 inserts) and evicts the least recently
+used rows.
+
+By default only low-temperature calls are cached (a high-temperature call is
+expected to be different every time).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from common.cassette import apply_offline_defaults
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_CACHE_PATH = os.getenv("CHEFBOT_CACHE_PATH", os.path.join(ROOT, ".cache", "chefbot_llm.sqlite3"))
+DEFAULT_TTL_S = float(os.getenv("CHEFBOT_CACHE_TTL_S", 7 * 24 * 3600))
+DEFAULT_MAX_TEMPERATURE = 0.2
+
+
+def cache_key(model: str, messages: Any, temperature: float, **extra: Any) -> str:
+    payload = {"model": model, "messages": messages, "temperature": temperature, **extra}
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        memory_size: int = 256,
+        max_disk_entries: int = 5000,
+        ttl_s: float = DEFAULT_TTL_S,
+        max_temperature: float = DEFAULT_MAX_TEMPERATURE,
+        enabled: bool = True,
+    ):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_disk_entries = max_disk_entries
+        self.ttl_s = ttl_s
+        self.max_temperature = max_temperature
+        self.enabled = enabled
+
+        # key -> (value, created_at, latency_s, tokens)
+        self._memory: "OrderedDict[str, Tuple[str, float, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._inserts = 0
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.saved_latency_s = 0.0
+        self.saved_tokens = 0
+
+    # ------------------------------------------------------------------ disk
+    def _db(self) -> Optional[sqlite3.Connection]:
+        # Ouverture paresseuse: rien n'est touché sur disque tant qu'on ne s'en sert pas
+        if self.path is None:
+            return None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL, latency_s REAL, tokens INTEGER)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+            self._conn.commit()
+        return self._conn
+
+    def _evict_disk(self, db: sqlite3.Connection) -> None:
+        (count,) = db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_disk_entries:
+            db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
+
+    # ------------------------------------------------------------------ API
+    def cacheable(self, temperature: float) -> bool:
+        return self.enabled and temperature <= self.max_temperature
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl_s:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                self._count_saving(entry)
+                return entry[0]
+            if entry is not None:
+                del self._memory[key]
+
+            db = self._db()
+            if db is not None:
+                row = db.execute(
+                    "SELECT value, created_at, latency_s, tokens FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl_s:
+                    db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                    db.commit()
+                    entry = (row[0], row[1], row[2] or 0.0, row[3] or 0)
+                    self._remember(key, entry)
+                    self.hits_disk += 1
+                    self._count_saving(entry)
+                    return entry[0]
+                if row is not None:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str, latency_s: float = 0.0, tokens: int = 0) -> None:
+        now = time.time()
+        entry = (value, now, latency_s, tokens)
+        with self._lock:
+            self._remember(key, entry)
+            db = self._db()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at, last_access, latency_s, tokens)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, value, now, now, latency_s, tokens),
+                )
+                self._inserts += 1
+                if self._inserts % 50 == 0:
+                    self._evict_disk(db)
+                db.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+            db = self._db()
+            if db is not None:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            db = self._db()
+            if db is not None:
+                db.execute("DELETE FROM responses")
+                db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.hits_memory + self.hits_disk
+        total = hits + self.misses
+        return {
+            "hits": hits,
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 3) if total else None,
+            "saved_latency_s": round(self.saved_latency_s, 3),
+            "saved_tokens": self.saved_tokens,
+        }
+
+    # ------------------------------------------------------------------ utils
+    def _remember(self, key: str, entry: Tuple[str, float, float, int]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _count_saving(self, entry: Tuple[str, float, float, int]) -> None:
+        self.saved_latency_s += entry[2]
+        self.saved_tokens += entry[3]
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache instance (CHEFBOT_CACHE=0 disables it; off by default in record mode)."""
+    global _response_cache
+    if _response_cache is None:
+        apply_offline_defaults()
+        _response_cache = ResponseCache(enabled=os.getenv("CHEFBOT_CACHE", "1") != "0")
+    return _response_cache
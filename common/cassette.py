@@ -0,0 +1,334 @@
+"""
+Record / replay backend for LLM calls (offline, deterministic runs).
+
+CHEFBOT_LLM_MODE:
+- live   (default) real Groq / LiteLLM calls, nothing written
+- record real calls, every response saved to a cassette file
+- replay no network: responses come from the cassettes, with synthetic latency
+
+A cassette is one JSON file per request hash (model, messages, temperature,
+tools, response_format, ...; never the API key) in CHEFBOT_CASSETTE_DIR. The
+same request made several times in one run is stored as several takes and
+replayed in the same order.
+
+Record mode turns the response, judge and plan caches off: every call reaches
+the network and gets its cassette, so a replay with cold caches finds them all.
+
+Replay latency: CHEFBOT_REPLAY_LATENCY=recorded (default) sleeps as long as
+the recorded call took (streams keep their chunk timing), a number sleeps that
+many seconds per call; CHEFBOT_REPLAY_SPEED divides the delay (e.g. 10).
+
+Both paths are covered: the Groq clients of common/clients.py are wrapped by
+CassetteClient (`.chat.completions.create`, sync/async, streamed or not) and the
+LiteLLM models get a CassetteLiteLLM in place of the `litellm` module.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CASSETTE_DIR = os.getenv("CHEFBOT_CASSETTE_DIR", os.path.join(ROOT, ".cache", "cassettes"))
+
+# Champs de la requête qui entrent dans la clé (et dans le fichier): jamais api_key / api_base
+KEY_FIELDS = (
+    "model",
+    "messages",
+    "temperature",
+    "top_p",
+    "max_tokens",
+    "max_completion_tokens",
+    "stop",
+    "tools",
+    "tool_choice",
+    "parallel_tool_calls",
+    "response_format",
+    "seed",
+    "stream",
+)
+
+MODES = ("live", "record", "replay")
+
+
+def llm_mode() -> str:
+    mode = os.getenv("CHEFBOT_LLM_MODE", "live").lower()
+    if mode not in MODES:
+        raise ValueError(f"CHEFBOT_LLM_MODE={mode!r}: attendu live, record ou replay")
+    return mode
+
+
+class CassetteMiss(KeyError):
+    pass
+
+
+# =============================================================================
+# (DÉ)SÉRIALISATION
+# =============================================================================
+
+def plain(obj: Any) -> Any:
+    """SDK objects / namespaces -> JSON-compatible dicts and lists."""
+    if hasattr(obj, "model_dump"):
+        return plain(obj.model_dump())
+    if isinstance(obj, SimpleNamespace):
+        return {k: plain(v) for k, v in vars(obj).items()}
+    if isinstance(obj, dict):
+        return {str(k): plain(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [plain(v) for v in obj]
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    return str(obj)
+
+
+class Replayed(SimpleNamespace):
+    """Attribute access over a recorded response, like the SDK objects it replaces."""
+
+    def model_dump(self, include: Optional[Any] = None, **_: Any) -> Dict[str, Any]:
+        return {k: plain(v) for k, v in vars(self).items() if include is None or k in include}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+
+
+def revive(data: Any) -> Any:
+    if isinstance(data, dict):
+        return Replayed(**{k: revive(v) for k, v in data.items()})
+    if isinstance(data, list):
+        return [revive(v) for v in data]
+    return data
+
+
+def request_of(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: plain(kwargs[k]) for k in KEY_FIELDS if kwargs.get(k) is not None}
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# =============================================================================
+# CASSETTE STORE
+# =============================================================================
+
+class CassetteStore:
+    def __init__(self, directory: str = DEFAULT_CASSETTE_DIR):
+        self.directory = directory
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _take_index(self, key: str) -> int:
+        index = self._seen.get(key, 0)
+        self._seen[key] = index + 1
+        return index
+
+    def load(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        key = request_key(request)
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                takes = json.load(f)["takes"]
+        except FileNotFoundError:
+            raise CassetteMiss(f"pas de cassette pour {request.get('model')} ({key[:12]}) dans {self.directory}") from None
+        with self._lock:
+            return takes[self._take_index(key) % len(takes)]
+
+    def save(self, request: Dict[str, Any], take: Dict[str, Any]) -> None:
+        key = request_key(request)
+        path = self._path(key)
+        with self._lock:
+            first = self._take_index(key) == 0
+            takes: List[Dict[str, Any]] = []
+            if not first and os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    takes = json.load(f)["takes"]
+            # Premier passage de ce run: on remplace les prises d'un enregistrement précédent
+            takes.append(take)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"request": request, "takes": takes}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, path)
+
+
+_store: Optional[CassetteStore] = None
+
+
+def get_cassette_store() -> CassetteStore:
+    global _store
+    if _store is None:
+        _store = CassetteStore()
+    return _store
+
+
+def apply_offline_defaults() -> None:
+    # Enregistrement: les caches de réponses et de jugements sont coupés (sauf si demandés),
+    # sinon un appel servi par le cache n'a pas de cassette et le rejeu à froid échoue
+    if llm_mode() == "record":
+        os.environ.setdefault("CHEFBOT_CACHE", "0")
+        os.environ.setdefault("CHEFBOT_JUDGE_CACHE", "0")
+    # Rejeu hors ligne: pas d'export Langfuse, pas de limite de débit (sauf si demandés)
+    if llm_mode() == "replay":
+        os.environ.setdefault("LANGFUSE_TRACING_ENABLED", "false")
+        os.environ.setdefault("CHEFBOT_RPM", "0")
+        os.environ.setdefault("CHEFBOT_TPM", "0")
+
+
+def _replay_delays(recorded_s: List[float]) -> List[float]:
+    """Sleep before each replayed response / chunk (a fixed latency is paid once, before the first)."""
+    setting = os.getenv("CHEFBOT_REPLAY_LATENCY", "recorded")
+    delays = recorded_s if setting == "recorded" else [float(setting)] + [0.0] * (len(recorded_s) - 1)
+    speed = float(os.getenv("CHEFBOT_REPLAY_SPEED", "1"))
+    return [d / speed if speed > 0 else 0.0 for d in delays]
+
+
+def _chunk_gaps(take: Dict[str, Any]) -> List[float]:
+    times = [entry["t"] for entry in take["chunks"]]
+    return [t - previous for previous, t in zip([0.0] + times, times)]
+
+
+# =============================================================================
+# RECORD / REPLAY D'UN APPEL
+# =============================================================================
+
+def _record_stream(chunks: Iterator[Any], request: Dict[str, Any], start: float) -> Iterator[Any]:
+    recorded: List[Tuple[float, Any]] = []
+    for chunk in chunks:
+        recorded.append((time.perf_counter() - start, plain(chunk)))
+        yield chunk
+    get_cassette_store().save(request, {"chunks": [{"t": round(t, 4), "chunk": c} for t, c in recorded]})
+
+
+def _replay_stream(take: Dict[str, Any]) -> Iterator[Any]:
+    for delay, entry in zip(_replay_delays(_chunk_gaps(take)), take["chunks"]):
+        if delay > 0:
+            time.sleep(delay)
+        yield revive(entry["chunk"])
+
+
+def cassette_call(live: Optional[Callable[..., Any]], kwargs: Dict[str, Any]) -> Any:
+    """One completion call in the current mode (`live` is the real create/completion)."""
+    mode = llm_mode()
+    if mode == "live":
+        return live(**kwargs)
+
+    request = request_of(kwargs)
+    if mode == "replay":
+        take = get_cassette_store().load(request)
+        if "chunks" in take:
+            return _replay_stream(take)
+        delay = _replay_delays([take["latency_s"]])[0]
+        if delay > 0:
+            time.sleep(delay)
+        return revive(take["response"])
+
+    start = time.perf_counter()
+    response = live(**kwargs)
+    if kwargs.get("stream"):
+        return _record_stream(response, request, start)
+    get_cassette_store().save(request, {"latency_s": round(time.perf_counter() - start, 4), "response": plain(response)})
+    return response
+
+
+async def _arecord_stream(chunks: AsyncIterator[Any], request: Dict[str, Any], start: float) -> AsyncIterator[Any]:
+    recorded: List[Tuple[float, Any]] = []
+    async for chunk in chunks:
+        recorded.append((time.perf_counter() - start, plain(chunk)))
+        yield chunk
+    get_cassette_store().save(request, {"chunks": [{"t": round(t, 4), "chunk": c} for t, c in recorded]})
+
+
+async def _areplay_stream(take: Dict[str, Any]) -> AsyncIterator[Any]:
+    for delay, entry in zip(_replay_delays(_chunk_gaps(take)), take["chunks"]):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield revive(entry["chunk"])
+
+
+async def acassette_call(live: Optional[Callable[..., Any]], kwargs: Dict[str, Any]) -> Any:
+    mode = llm_mode()
+    if mode == "live":
+        return await live(**kwargs)
+
+    request = request_of(kwargs)
+    if mode == "replay":
+        take = get_cassette_store().load(request)
+        if "chunks" in take:
+            return _areplay_stream(take)
+        delay = _replay_delays([take["latency_s"]])[0]
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return revive(take["response"])
+
+    start = time.perf_counter()
+    response = await live(**kwargs)
+    if kwargs.get("stream"):
+        return _arecord_stream(response, request, start)
+    get_cassette_store().save(request, {"latency_s": round(time.perf_counter() - start, 4), "response": plain(response)})
+    return response
+
+
+# =============================================================================
+# ADAPTATEURS CLIENTS
+# =============================================================================
+
+class _Completions:
+    def __init__(self, client: "CassetteClient"):
+        self._client = client
+
+    def create(self, **kwargs: Any) -> Any:
+        if self._client.is_async:
+            return acassette_call(self._client.live_create(), kwargs)
+        return cassette_call(self._client.live_create(), kwargs)
+
+
+class CassetteClient:
+    """
+    Stand-in for Groq / AsyncGroq exposing `.chat.completions.create`. The real
+    client is only built when a live call is needed (never in replay mode).
+    """
+
+    def __init__(self, factory: Callable[[], Any], is_async: bool = False):
+        self._factory = factory
+        self._real: Optional[Any] = None
+        self.is_async = is_async
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def live_create(self) -> Optional[Callable[..., Any]]:
+        if llm_mode() == "replay":
+            return None
+        if self._real is None:
+            self._real = self._factory()
+        return self._real.chat.completions.create
+
+
+class CassetteLiteLLM:
+    """Stand-in for the `litellm` module as used by smolagents (`completion`)."""
+
+    def completion(self, **kwargs: Any) -> Any:
+        live = None
+        if llm_mode() != "replay":
+            import litellm
+
+            live = litellm.completion
+        return cassette_call(live, kwargs)
+
+    async def acompletion(self, **kwargs: Any) -> Any:
+        live = None
+        if llm_mode() != "replay":
+            import litellm
+
+            live = litellm.acompletion
+        return await acassette_call(live, kwargs)
@@ -0,0 +1,260 @@
+"""
+Lazy factory for every external client used by ChefBot.
+
+Nothing here is built at import time: the Groq SDK, httpx and LiteLLM are
+imported and their clients constructed on first use, then reused for the whole
+process. (Langfuse's own get_client() is already lazy and process-wide.)
+
+All the Groq clients and the LiteLLM models share one keep-alive HTTP
+connection pool, so TLS connections are reused across every call of a run.
+Async clients are bound to an event loop, so there is one per running loop
+(a second asyncio.run() gets fresh ones). Tune it with configure_http_pool() or the CHEFBOT_HTTP_* environment variables.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import weakref
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+
+from common.cassette import CassetteClient, CassetteLiteLLM, apply_offline_defaults, llm_mode
+
+# GROQ_BASE_URL (lu aussi par le SDK groq) permet de viser un autre serveur, ex. benchmarks/stub_server.py
+GROQ_OPENAI_BASE = os.getenv("GROQ_BASE_URL", "https://api.groq.com").rstrip("/") + "/openai/v1"
+
+apply_offline_defaults()
+
+
+@lru_cache(maxsize=None)
+def _load_env() -> None:
+    load_dotenv()
+
+
+def _groq_api_key() -> str:
+    _load_env()
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise RuntimeError("GROQ_API_KEY manquant dans .env / env vars.")
+    return api_key
+
+
+# =============================================================================
+# HTTP CONNECTION POOL
+# =============================================================================
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    except ImportError:
+        return False
+    return True
+
+
+@dataclass(frozen=True)
+class HttpPoolConfig:
+    max_connections: int = field(default_factory=lambda: int(os.getenv("CHEFBOT_HTTP_MAX_CONNECTIONS", "50")))
+    max_keepalive_connections: int = field(default_factory=lambda: int(os.getenv("CHEFBOT_HTTP_MAX_KEEPALIVE", "20")))
+    keepalive_expiry_s: float = field(default_factory=lambda: float(os.getenv("CHEFBOT_HTTP_KEEPALIVE_EXPIRY_S", "60")))
+    http2: bool = field(default_factory=lambda: os.getenv("CHEFBOT_HTTP2", "1") != "0")
+    timeout_s: float = field(default_factory=lambda: float(os.getenv("CHEFBOT_HTTP_TIMEOUT_S", "120")))
+    connect_timeout_s: float = 10.0
+
+
+_pool_config: Optional[HttpPoolConfig] = None
+
+
+def get_http_pool_config() -> HttpPoolConfig:
+    global _pool_config
+    if _pool_config is None:
+        _pool_config = HttpPoolConfig()
+    return _pool_config
+
+
+def configure_http_pool(**overrides: Any) -> HttpPoolConfig:
+    """
+    Change the pool settings (fields of HttpPoolConfig). Clients already built
+    are dropped so the next call picks the new pool up.
+    """
+    global _pool_config
+    _pool_config = replace(get_http_pool_config(), **overrides)
+    for factory in (get_http_client, get_groq, get_litellm_model):
+        factory.cache_clear()
+    with _per_loop_lock:
+        _async_http_clients.clear()
+        _async_groq_clients.clear()
+    return _pool_config
+
+
+def _httpx_kwargs() -> dict:
+    import httpx
+
+    config = get_http_pool_config()
+    return {
+        "limits": httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry_s,
+        ),
+        "timeout": httpx.Timeout(config.timeout_s, connect=config.connect_timeout_s),
+        "http2": config.http2 and _http2_available(),
+    }
+
+
+@lru_cache(maxsize=None)
+def get_http_client() -> Any:
+    """Shared httpx.Client (keep-alive pool)."""
+    import httpx
+
+    return httpx.Client(**_httpx_kwargs())
+
+
+# Un client async réutilise ses connexions sur la boucle qui l'a créé: un client par boucle,
+# libéré avec elle (sinon un second asyncio.run() échoue sur "Event loop is closed")
+_async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+_async_groq_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+_per_loop_lock = threading.Lock()
+
+
+def _per_loop(clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]", build: Callable[[], Any]) -> Any:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Hors boucle: client non partagé, lié à la boucle qui l'utilisera
+        return build()
+    with _per_loop_lock:
+        client = clients.get(loop)
+    if client is None:
+        # Construit hors du verrou: AsyncGroq demande lui-même le client HTTP de la boucle
+        client = build()
+        with _per_loop_lock:
+            client = clients.setdefault(loop, client)
+    return client
+
+
+def get_async_http_client() -> Any:
+    """httpx.AsyncClient (keep-alive pool) shared by the calls of the running event loop."""
+    def _build() -> Any:
+        import httpx
+
+        return httpx.AsyncClient(**_httpx_kwargs())
+
+    return _per_loop(_async_http_clients, _build)
+
+
+# =============================================================================
+# GROQ
+# =============================================================================
+
+@lru_cache(maxsize=None)
+def get_groq() -> Any:
+    """Shared synchronous Groq client."""
+    def _build() -> Any:
+        from groq import Groq
+
+        _load_env()
+        return Groq(http_client=get_http_client())
+
+    return _build() if llm_mode() == "live" else CassetteClient(_build)
+
+
+def get_async_groq() -> Any:
+    """AsyncGroq client shared by the calls of the running event loop."""
+    def _build() -> Any:
+        from groq import AsyncGroq
+
+        _load_env()
+        return AsyncGroq(http_client=get_async_http_client())
+
+    return _per_loop(
+        _async_groq_clients,
+        lambda: _build() if llm_mode() == "live" else CassetteClient(_build, is_async=True),
+    )
+
+
+# =============================================================================
+# LITELLM / SMOLAGENTS
+# =============================================================================
+
+@lru_cache(maxsize=None)
+def _enable_litellm_debug() -> None:
+    import litellm
+
+    litellm._turn_on_debug()
+
+
+def _share_pool_with_litellm() -> None:
+    # LiteLLM réutilise cette session pour ses appels OpenAI-compatibles (Groq). Pas de
+    # session async partagée: elle resterait liée à une seule boucle d'événements
+    import litellm
+
+    litellm.client_session = get_http_client()
+
+
+@lru_cache(maxsize=None)
+def _rate_limited_litellm_class() -> Any:
+    from smolagents import LiteLLMModel
+
+    from common.rate_limit import estimate_tokens, get_rate_limiter
+    from common.resilience import resilient_call
+
+    class RateLimitedLiteLLMModel(LiteLLMModel):
+        """LiteLLMModel whose calls go through the rate limiter and the retry/hedging wrapper."""
+
+        def create_client(self) -> Any:
+            # record / replay: `litellm` remplacé par le backend cassette
+            return super().create_client() if llm_mode() == "live" else CassetteLiteLLM()
+
+        def _limited_generate(self, messages: Any, *args: Any, **kwargs: Any) -> Any:
+            with get_rate_limiter().slot(estimate_tokens(messages), self.model_id) as slot:
+                message = super().generate(messages, *args, **kwargs)
+                usage = getattr(message, "token_usage", None)
+                if usage is not None:
+                    slot.record_usage(usage.input_tokens, usage.output_tokens)
+                return message
+
+        def generate(self, messages: Any, *args: Any, **kwargs: Any) -> Any:
+            return resilient_call(lambda: self._limited_generate(messages, *args, **kwargs), key=self.model_id)
+
+    return RateLimitedLiteLLMModel
+
+
+@lru_cache(maxsize=None)
+def get_litellm_model(
+    model_id: str = "groq/llama-3.3-70b-versatile",
+    temperature: Optional[float] = None,
+    custom_llm_provider: Optional[str] = None,
+) -> Any:
+    """
+    smolagents LiteLLMModel pointed at Groq's OpenAI-compatible endpoint.
+
+    Models are cached by arguments, so several agents asking for the same model
+    share one instance. Every generate() goes through common/rate_limit.py and
+    common/resilience.py, and CHEFBOT_LLM_MODE=record|replay through
+    common/cassette.py (replay needs no API key).
+    Set CHEFBOT_LITELLM_DEBUG=1 to get LiteLLM's debug logs.
+    """
+    if llm_mode() == "replay":
+        api_key = "replay"
+    else:
+        api_key = _groq_api_key()
+        if os.getenv("CHEFBOT_LITELLM_DEBUG") == "1":
+            _enable_litellm_debug()
+        _share_pool_with_litellm()
+
+    kwargs: dict = {}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if custom_llm_provider is not None:
+        kwargs["custom_llm_provider"] = custom_llm_provider
+
+    return _rate_limited_litellm_class()(
+        model_id=model_id,
+        api_base=GROQ_OPENAI_BASE,
+        api_key=api_key,
+        **kwargs,
+    )
@@ -0,0 +1,210 @@
+"""
+Single-pass extraction of the first top-level JSON value in an LLM answer.
+
+The text is walked once: at each `{`/`[` the C decoder (raw_decode) tries to
+read one complete value and stops at its end; when it cannot (prose between
+braces, value not complete yet), the scanner tracks strings/escapes and the
+bracket stack instead. ```json fences, prose around the JSON (even prose
+containing braces) and several JSON values in one answer are handled without
+re-parsing find/rfind slices.
+A truncated answer (max_tokens hit, stream cut) is repaired by closing the
+open strings/brackets and dropping the last incomplete member.
+
+JSONExtractor works on streamed chunks: feed() returns the value as soon as
+it is complete.
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, List, Optional, Tuple, Type
+
+_CLOSER = {"{": "}", "[": "]"}
+_OPENER = re.compile(r"[{\[]")
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+_IN_STRING = re.compile(r'["\\]')
+_DECODER = json.JSONDecoder()
+_MAX_REPAIR_STEPS = 32
+_MISSING = object()
+
+
+def _open_state(fragment: str) -> Tuple[List[str], bool]:
+    """Closers still expected at the end of `fragment`, and whether it ends inside a string."""
+    stack: List[str] = []
+    in_string = escaped = False
+    for ch in fragment:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in _CLOSER:
+            stack.append(_CLOSER[ch])
+        elif stack and ch == stack[-1]:
+            stack.pop()
+    return stack, in_string
+
+
+def repair_truncated(fragment: str) -> Any:
+    """Best-effort parse of a JSON value cut in the middle."""
+    text = fragment
+    for _ in range(_MAX_REPAIR_STEPS):
+        stack, in_string = _open_state(text)
+        attempt = text[:-1] if in_string and text.endswith("\\") else text
+        attempt = (attempt + '"' if in_string else attempt).rstrip().rstrip(",")
+        try:
+            return json.loads(attempt + "".join(reversed(stack)))
+        except json.JSONDecodeError:
+            pass
+        # On retire le dernier membre incomplet et on réessaie
+        cut = max(text.rfind(","), text.rfind("{"), text.rfind("["))
+        if cut <= 0:
+            break
+        text = text[:cut] if text[cut] == "," else text[: cut + 1]
+    raise ValueError("JSON tronqué irréparable.")
+
+
+class JSONExtractor:
+    """
+    Incremental scanner. `feed()` chunks as they arrive; the first complete
+    top-level object/array is returned (and kept in `.value`).
+
+    `prefer=dict` skips complete arrays until the end of the text and only
+    returns the first array if no object was found (like safe_json_loads did).
+    """
+
+    def __init__(self, prefer: Optional[Type] = None):
+        self.prefer = prefer
+        self.text = ""
+        self.value: Any = _MISSING
+        self.repaired = False
+        self._fallback: Any = _MISSING
+        self._reset(0)
+
+    @property
+    def done(self) -> bool:
+        return self.value is not _MISSING
+
+    def _reset(self, pos: int) -> None:
+        self._pos = pos
+        self._start = -1
+        self._stack: List[str] = []
+        self._in_string = False
+
+    def feed(self, chunk: str) -> Any:
+        """Add text; return the value once complete, else None."""
+        if self.done:
+            return self.value
+        self.text += chunk
+        self._scan()
+        return self.value if self.done else None
+
+    def _scan(self) -> None:
+        # On saute directement d'un caractère structurant au suivant (regex en C)
+        text = self.text
+        i = self._pos
+        while True:
+            if self._start < 0:
+                m = _OPENER.search(text, i)
+                if m is None:
+                    self._pos = len(text)
+                    return
+                # Cas courant: une valeur complète commence ici -> décodeur C, s'arrête à sa fin
+                try:
+                    value, end = _DECODER.raw_decode(text, m.start())
+                except json.JSONDecodeError:
+                    value, end = _MISSING, -1
+                if value is not _MISSING:
+                    if self._keep(value, end):
+                        return
+                    i = end
+                    continue
+                # Sinon (prose, valeur tronquée ou pas encore reçue): suivi des crochets
+                self._start = m.start()
+                self._stack = [_CLOSER[m.group()]]
+                i = m.end()
+                continue
+
+            m = (_IN_STRING if self._in_string else _STRUCTURAL).search(text, i)
+            if m is None:
+                self._pos = len(text)
+                return
+            i = m.end()
+            ch = m.group()
+
+            if self._in_string:
+                if ch == "\\":
+                    if i >= len(text):
+                        # échappement coupé entre deux morceaux: on le relira au prochain feed
+                        self._pos = i - 1
+                        return
+                    i += 1
+                else:
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in _CLOSER:
+                self._stack.append(_CLOSER[ch])
+            elif ch != self._stack[-1]:
+                # crochets incohérents: ce n'était pas du JSON, on repart juste après
+                i = self._start + 1
+                self._reset(i)
+            else:
+                self._stack.pop()
+                if self._stack:
+                    continue
+                try:
+                    value = json.loads(text[self._start : i])
+                except json.JSONDecodeError:
+                    # prose entre accolades: on repart juste après le début du candidat
+                    i = self._start + 1
+                    self._reset(i)
+                    continue
+                self._reset(i)
+                if self._keep(value, i):
+                    return
+
+    def _keep(self, value: Any, end: int) -> bool:
+        """True if `value` is the answer; otherwise keep it as fallback (non-preferred type)."""
+        if self.prefer is None or isinstance(value, self.prefer):
+            self.value = value
+            self._pos = end
+            return True
+        if self._fallback is _MISSING:
+            self._fallback = value
+        return False
+
+    def finish(self, repair: bool = True) -> Any:
+        """End of input: return the value, repairing a truncated one if allowed."""
+        if self.done:
+            return self.value
+        if repair and self._start >= 0:
+            try:
+                value = repair_truncated(self.text[self._start :])
+                if self.prefer is None or isinstance(value, self.prefer) or self._fallback is _MISSING:
+                    self.value, self.repaired = value, True
+                    return value
+            except ValueError:
+                pass
+        # Candidat ouvert irréparable (ex: guillemet isolé dans la prose):
+        # une valeur complète peut se trouver plus loin.
+        while self._start >= 0 and not self.done:
+            self._reset(self._start + 1)
+            self._scan()
+        if self.done:
+            return self.value
+        if self._fallback is not _MISSING:
+            self.value = self._fallback
+            return self.value
+        raise ValueError("JSON introuvable dans la réponse.")
+
+
+def extract_json(text: str, prefer: Optional[Type] = dict, repair: bool = True) -> Any:
+    """First top-level JSON value of `text` (objects preferred over arrays by default)."""
+    extractor = JSONExtractor(prefer=prefer)
+    extractor.feed(text)
+    return extractor.finish(repair=repair)
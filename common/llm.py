@@ -0,0 +1,345 @@
+"""
+Shared LLM call layer for every ChefBot part.
+
+`chat()` / `chat_stream()` / `achat_stream()` go through the pooled Groq clients
+of common/clients.py and the response cache of common/cache.py. `complete()` /
+`acomplete()` are the raw completion behind every non-streamed call (rate
+limiter, then retry / hedging of common/resilience.py). An answer of `chat()`
+is cached only once the caller accepted it (`accept=`, or schema validation
+in `chat_json()`). Each part keeps its own llm_utils.py with its MODEL_ID and
+calls into this module.
+"""
+from __future__ import annotations
+
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from common.cache import cache_key, get_response_cache
+from common.clients import get_async_groq, get_groq
+from common.json_extract import extract_json
+from common.metrics import metrics
+from common.rate_limit import estimate_tokens, get_rate_limiter, run_limited, usage_tokens
+from common.resilience import aresilient_call, resilient_call
+from common.schema import SchemaError, coerce, get_path, response_format_for, subschema, set_path, validate
+from common.streaming import astream_completion, stream_completion
+
+DEFAULT_MODEL_ID = "openai/gpt-oss-120b"
+
+response_cache = get_response_cache()
+
+# Collecteurs d'usage (tokens par appel) actifs dans le contexte courant, cf. record_usage().
+# Ils s'empilent: un bloc imbriqué (ex. le routeur) n'en cache pas les appels au bloc englobant
+_usage_sinks: ContextVar[Tuple[List[Dict[str, Any]], ...]] = ContextVar("chefbot_usage_sinks", default=())
+
+
+@contextmanager
+def record_usage() -> Iterator[List[Dict[str, Any]]]:
+    """Collect the model / token usage of every chat() made inside the block (nested blocks included)."""
+    records: List[Dict[str, Any]] = []
+    token = _usage_sinks.set(_usage_sinks.get() + (records,))
+    try:
+        yield records
+    finally:
+        _usage_sinks.reset(token)
+
+
+def _record(model: str, usage: Any, cached: bool) -> None:
+    sinks = _usage_sinks.get()
+    if sinks:
+        record = {
+            "model": model,
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "cached": cached,
+        }
+        for sink in sinks:
+            sink.append(dict(record))
+
+
+def complete(model: str, messages: List[Dict[str, Any]], **kwargs: Any) -> Any:
+    """
+    One raw chat.completions.create (tools, response_format... in kwargs) through
+    the rate limiter (which records its metrics) and the retry / hedging policy.
+    """
+    return resilient_call(
+        lambda: run_limited(
+            lambda: get_groq().chat.completions.create(model=model, messages=messages, **kwargs),
+            messages,
+            model,
+        ),
+        key=model,
+    )
+
+
+async def acomplete(
+    model: str,
+    messages: List[Dict[str, Any]],
+    queue_waits: Optional[List[float]] = None,
+    **kwargs: Any,
+) -> Any:
+    """Async complete(); each attempt's wait for a limiter slot is appended to `queue_waits`."""
+    async def _call() -> Any:
+        async with get_rate_limiter().aslot(estimate_tokens(messages), model) as slot:
+            if queue_waits is not None:
+                queue_waits.append(slot.queue_wait_s)
+            response = await get_async_groq().chat.completions.create(model=model, messages=messages, **kwargs)
+            slot.record_usage(*usage_tokens(response))
+            return response
+
+    return await aresilient_call(_call, key=model)
+
+
+def _chat(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    use_cache: bool,
+    model: str,
+    response_format: Optional[Dict[str, Any]],
+) -> Tuple[str, Optional[str], Optional[Callable[[], None]]]:
+    """(answer, cache key or None, write-back for a fresh answer or None): nothing is stored here."""
+    # Cache uniquement pour les températures basses (réponse quasi déterministe)
+    key = None
+    if use_cache and response_cache.cacheable(temperature):
+        key = cache_key(model, messages, temperature, response_format=response_format)
+        cached = response_cache.get(key)
+        if cached is not None:
+            _record(model, None, cached=True)
+            metrics.record_cache_hit(model)
+            return cached, key, None
+
+    extra: Dict[str, Any] = {}
+    if response_format is not None:
+        extra["response_format"] = response_format
+
+    start = time.perf_counter()
+    resp = complete(model, messages, temperature=temperature, **extra)
+    out = (resp.choices[0].message.content or "").strip()
+    usage = getattr(resp, "usage", None)
+    _record(model, usage, cached=False)
+
+    if key is None:
+        return out, None, None
+    latency_s = time.perf_counter() - start
+    tokens = getattr(usage, "total_tokens", 0) or 0
+    return out, key, lambda: response_cache.set(key, out, latency_s=latency_s, tokens=tokens)
+
+
+def chat(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.2,
+    use_cache: bool = True,
+    model: str = DEFAULT_MODEL_ID,
+    response_format: Optional[Dict[str, Any]] = None,
+    accept: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """
+    One completion. With `accept`, the answer is cached only if accept(answer)
+    is true, and a cached answer it rejects is dropped and asked again: a
+    malformed or truncated reply is never replayed from the cache.
+    """
+    out, key, store = _chat(messages, temperature, use_cache, model, response_format)
+    if key is not None and store is None and accept is not None and not accept(out):
+        response_cache.delete(key)
+        out, key, store = _chat(messages, temperature, use_cache, model, response_format)
+    if store is not None and (accept is None or accept(out)):
+        store()
+    return out
+
+
+class _DeferredCache:
+    """chat() for chat_json: replies are cached only at commit(), once the caller validated them."""
+
+    def __init__(self) -> None:
+        self.keys: List[str] = []
+        self._writes: List[Callable[[], None]] = []
+
+    def chat(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        out, key, store = _chat(
+            messages,
+            kwargs.get("temperature", 0.2),
+            kwargs.get("use_cache", True),
+            kwargs.get("model", DEFAULT_MODEL_ID),
+            kwargs.get("response_format"),
+        )
+        if key is not None:
+            self.keys.append(key)
+        if store is not None:
+            self._writes.append(store)
+        return out
+
+    def commit(self) -> None:
+        for store in self._writes:
+            store()
+
+    def discard(self) -> None:
+        # Une réponse en cache qui ne passe plus la validation est oubliée
+        for key in self.keys:
+            response_cache.delete(key)
+
+
+def chat_stream(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.2,
+    model: str = DEFAULT_MODEL_ID,
+) -> Iterator[str]:
+    # Même appel que chat(), mais les morceaux sont rendus dès leur arrivée
+    return stream_completion(get_groq(), model=model, messages=messages, temperature=temperature)
+
+
+def achat_stream(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.2,
+    model: str = DEFAULT_MODEL_ID,
+) -> AsyncIterator[str]:
+    return astream_completion(get_async_groq(), model=model, messages=messages, temperature=temperature)
+
+
+# =============================================================================
+# STRUCTURED OUTPUT
+# =============================================================================
+
+# Modèles qui ont refusé response_format: on ne le renvoie plus
+_NO_RESPONSE_FORMAT: Set[str] = set()
+
+REPAIR_SYSTEM = "Tu corriges uniquement les champs indiqués d'un JSON. Réponds UNIQUEMENT en JSON valide."
+
+
+class SchemaValidationError(ValueError):
+    def __init__(self, message: str, report: Dict[str, Any]):
+        super().__init__(message)
+        self.report = report
+
+
+def _rejects_response_format(error: Exception) -> bool:
+    text = str(error).lower()
+    return "response_format" in text or "json_schema" in text or "json mode" in text
+
+
+def _repairable(errors: List[SchemaError]) -> bool:
+    # Un champ précis peut être redemandé; une racine invalide ou une liste vide non
+    return all(e.path and e.kind != "min_items" for e in errors)
+
+
+def _repair_fields(
+    value: Any,
+    errors: List[SchemaError],
+    schema: Dict[str, Any],
+    messages: List[Dict[str, str]],
+    model: str,
+    response_format: Optional[Dict[str, Any]],
+    ask: Callable[..., str] = chat,
+) -> Any:
+    """Un seul appel LLM qui ne renvoie que les champs fautifs."""
+    broken = {
+        e.dotted: {
+            "erreur": e.message,
+            "schema": subschema(schema, e.path),
+            "valeur_actuelle": get_path(value, e.path) if e.kind != "missing" else None,
+        }
+        for e in errors
+    }
+    user = (
+        f"Demande initiale:\n{messages[-1]['content'][:2000]}\n\n"
+        f"JSON actuel:\n{json.dumps(value, ensure_ascii=False)[:4000]}\n\n"
+        f"Champs à corriger:\n{json.dumps(broken, ensure_ascii=False)}\n\n"
+        'Retourne {"fixes": [{"path": "...", "value": ...}]} avec une entrée par champ.'
+    )
+    raw = ask(
+        messages=[{"role": "system", "content": REPAIR_SYSTEM}, {"role": "user", "content": user}],
+        temperature=0.0,
+        model=model,
+        response_format={"type": "json_object"} if response_format else None,
+    )
+    paths = {e.dotted: e.path for e in errors}
+    fixes = extract_json(raw)
+    for fix in fixes.get("fixes", []) if isinstance(fixes, dict) else []:
+        if isinstance(fix, dict) and fix.get("path") in paths:
+            set_path(value, paths[fix["path"]], fix.get("value"))
+    return value
+
+
+def chat_json(
+    messages: List[Dict[str, str]],
+    schema: Dict[str, Any],
+    name: str,
+    temperature: float = 0.2,
+    use_cache: bool = True,
+    model: str = DEFAULT_MODEL_ID,
+    fill: Optional[Callable[[Any], Any]] = None,
+) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Appel en mode sortie structurée (json_schema / json_object selon le modèle),
+    validation locale puis réparation ciblée des seuls champs invalides.
+
+    Retourne (valeur, rapport). Lève SchemaValidationError (un ValueError, avec
+    le rapport dans .report) si le JSON est introuvable ou si la réparation n'a
+    pas suffi: à l'appelant de régénérer entièrement. Les réponses ne sont
+    mises en cache qu'une fois le JSON validé.
+    """
+    deferred = _DeferredCache()
+    try:
+        value, report = _chat_json(messages, schema, name, temperature, use_cache, model, fill, deferred.chat)
+    except ValueError:
+        # SchemaValidationError, ou JSON de réparation illisible
+        deferred.discard()
+        raise
+    # Mise en cache seulement maintenant: une réponse invalide serait rejouée pendant tout le TTL
+    deferred.commit()
+    return value, report
+
+
+def _chat_json(
+    messages: List[Dict[str, str]],
+    schema: Dict[str, Any],
+    name: str,
+    temperature: float,
+    use_cache: bool,
+    model: str,
+    fill: Optional[Callable[[Any], Any]],
+    ask: Callable[..., str],
+) -> Tuple[Any, Dict[str, Any]]:
+    report: Dict[str, Any] = {"structured_output": "prompt_only", "local_fixes": 0, "repair_calls": 0, "retry_latency_s": 0.0}
+
+    response_format = None if model in _NO_RESPONSE_FORMAT else response_format_for(model, name, schema)
+    try:
+        raw = ask(messages, temperature=temperature, use_cache=use_cache, model=model, response_format=response_format)
+    except Exception as e:
+        if response_format is None or not _rejects_response_format(e):
+            raise
+        _NO_RESPONSE_FORMAT.add(model)
+        response_format = None
+        raw = ask(messages, temperature=temperature, use_cache=use_cache, model=model)
+    if response_format is not None:
+        report["structured_output"] = response_format["type"]
+
+    try:
+        value = extract_json(raw)
+    except ValueError as e:
+        raise SchemaValidationError(str(e), {**report, "raw": raw[:800]}) from e
+    if fill is not None:
+        value = fill(value)
+    value, report["local_fixes"] = coerce(value, schema)
+    errors = validate(value, schema)
+
+    if errors and _repairable(errors):
+        start = time.perf_counter()
+        value = _repair_fields(value, errors, schema, messages, model, response_format, ask)
+        report["repair_calls"] += 1
+        report["retry_latency_s"] = round(time.perf_counter() - start, 3)
+        value, fixes = coerce(value, schema)
+        report["local_fixes"] += fixes
+        errors = validate(value, schema)
+
+    if errors:
+        report["schema_errors"] = [f"{e.dotted}: {e.message}" for e in errors[:20]]
+        report["raw"] = raw[:800]
+        raise SchemaValidationError(f"JSON invalide pour le schéma '{name}': {report['schema_errors'][0]}", report)
+    return value, report
+
+
+def safe_json_loads(raw: str) -> Any:
+    # Un seul passage sur le texte (fences, prose, JSON tronqué: cf. common/json_extract.py)
+    return extract_json(raw)
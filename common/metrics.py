@@ -0,0 +1,271 @@
+"""
+Token / latency accounting for every LLM call.
+
+Counters and log-bucketed (HDR-style) latency histograms, labelled by
+part / stage / model. Part and stage come from the context (metrics_labels()),
+the model from the call itself. Every call that goes through the rate limiter
+is recorded here, so chat(), ask_chef, the Partie 4 loop and the LiteLLM
+models of Partie 5/6 all show up.
+
+Exports:
+- span_metadata(): compact summary to attach to a Langfuse span
+- to_prometheus() / snapshot(): Prometheus text format and JSON
+- write_snapshot(): both files in CHEFBOT_METRICS_DIR (also done at exit)
+
+Recording is a dict lookup and a few additions under a lock;
+CHEFBOT_METRICS=0 turns it off.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_METRICS_DIR = os.getenv("CHEFBOT_METRICS_DIR", os.path.join(ROOT, ".cache", "metrics"))
+ENABLED = os.getenv("CHEFBOT_METRICS", "1") != "0"
+
+LABEL_NAMES = ("part", "stage", "model")
+
+_labels: ContextVar[Dict[str, str]] = ContextVar("chefbot_metric_labels", default={})
+
+
+@contextmanager
+def metrics_labels(**labels: str) -> Iterator[None]:
+    """Set part / stage labels for every LLM call made inside the block (threads included via copy_context)."""
+    token = _labels.set({**_labels.get(), **{k: str(v) for k, v in labels.items()}})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def current_labels() -> Dict[str, str]:
+    """Labels set by the enclosing metrics_labels() blocks (to carry them into a fresh worker context)."""
+    return dict(_labels.get())
+
+
+# =============================================================================
+# HISTOGRAM
+# =============================================================================
+
+# 16 sous-intervalles par puissance de 2 -> erreur relative < 3.2%
+SUB_BUCKETS = 16
+MIN_VALUE_S = 1e-4
+
+
+def _bucket_index(value: float) -> int:
+    if value <= MIN_VALUE_S:
+        return 0
+    mantissa, exponent = math.frexp(value / MIN_VALUE_S)
+    return exponent * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+
+
+def _bucket_upper(index: int) -> float:
+    exponent, sub = divmod(index, SUB_BUCKETS)
+    return MIN_VALUE_S * 2 ** exponent * (0.5 + (sub + 1) / (2 * SUB_BUCKETS))
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        index = _bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(_bucket_upper(index), self.max)
+        return self.max
+
+    def buckets(self) -> List[Tuple[float, int]]:
+        """Cumulative (upper bound, count) pairs for the non-empty buckets."""
+        out, seen = [], 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            out.append((_bucket_upper(index), seen))
+        return out
+
+    def summary(self) -> Dict[str, Any]:
+        def _r(x: Optional[float]) -> Optional[float]:
+            return None if x is None else round(x, 4)
+
+        return {
+            "count": self.count,
+            "sum": round(self.total, 4),
+            "p50": _r(self.quantile(0.5)),
+            "p90": _r(self.quantile(0.9)),
+            "p99": _r(self.quantile(0.99)),
+            "max": _r(self.max),
+        }
+
+
+# =============================================================================
+# REGISTRY
+# =============================================================================
+
+Labels = Tuple[str, ...]
+
+COUNTERS = {
+    "llm_calls_total": "LLM calls (cache hits excluded)",
+    "llm_errors_total": "LLM calls that raised",
+    "llm_cache_hits_total": "chat() answers served by the response cache",
+    "llm_prompt_tokens_total": "Prompt tokens reported by the provider",
+    "llm_completion_tokens_total": "Completion tokens reported by the provider",
+}
+HISTOGRAMS = {
+    "llm_latency_seconds": "Network + generation time of one LLM call",
+    "llm_queue_wait_seconds": "Time spent waiting for the rate limiter",
+}
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._counters: Dict[str, Dict[Labels, float]] = {name: {} for name in COUNTERS}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {name: {} for name in HISTOGRAMS}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(model: str) -> Labels:
+        current = _labels.get()
+        return (current.get("part", ""), current.get("stage", ""), model)
+
+    def record_call(
+        self,
+        model: str,
+        latency_s: float,
+        queue_wait_s: float = 0.0,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        error: bool = False,
+    ) -> None:
+        if not ENABLED:
+            return
+        labels = self._labels(model)
+        with self._lock:
+            self._inc("llm_calls_total", labels, 1)
+            if error:
+                self._inc("llm_errors_total", labels, 1)
+            if prompt_tokens:
+                self._inc("llm_prompt_tokens_total", labels, prompt_tokens)
+            if completion_tokens:
+                self._inc("llm_completion_tokens_total", labels, completion_tokens)
+            self._hist("llm_latency_seconds", labels).record(latency_s)
+            self._hist("llm_queue_wait_seconds", labels).record(queue_wait_s)
+
+    def record_cache_hit(self, model: str) -> None:
+        if not ENABLED:
+            return
+        labels = self._labels(model)
+        with self._lock:
+            self._inc("llm_cache_hits_total", labels, 1)
+
+    def _inc(self, name: str, labels: Labels, value: float) -> None:
+        series = self._counters[name]
+        series[labels] = series.get(labels, 0) + value
+
+    def _hist(self, name: str, labels: Labels) -> Histogram:
+        series = self._histograms[name]
+        if labels not in series:
+            series[labels] = Histogram()
+        return series[labels]
+
+    def reset(self) -> None:
+        with self._lock:
+            for series in (*self._counters.values(), *self._histograms.values()):
+                series.clear()
+
+    # ------------------------------------------------------------- exports
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            series: Dict[Labels, Dict[str, Any]] = {}
+            for name, values in self._counters.items():
+                for labels, value in values.items():
+                    series.setdefault(labels, {})[name] = value
+            for name, values in self._histograms.items():
+                for labels, hist in values.items():
+                    series.setdefault(labels, {})[name] = hist.summary()
+        return {"series": [{**dict(zip(LABEL_NAMES, labels)), **values} for labels, values in sorted(series.items())]}
+
+    def span_metadata(self) -> Dict[str, Any]:
+        """Totals per model, small enough for Langfuse span metadata."""
+        by_model: Dict[str, Dict[str, Any]] = {}
+        latencies: Dict[str, Histogram] = {}
+        with self._lock:
+            for name, values in self._counters.items():
+                for (_, _, model), value in values.items():
+                    entry = by_model.setdefault(model, {})
+                    entry[name] = entry.get(name, 0) + value
+            for (_, _, model), hist in self._histograms["llm_latency_seconds"].items():
+                merged = latencies.setdefault(model, Histogram())
+                for index, count in hist.counts.items():
+                    merged.counts[index] = merged.counts.get(index, 0) + count
+                merged.count += hist.count
+                merged.total += hist.total
+                merged.max = max(merged.max, hist.max)
+        for model, hist in latencies.items():
+            by_model.setdefault(model, {})["latency_s"] = hist.summary()
+        return by_model
+
+    def to_prometheus(self) -> str:
+        def _fmt(labels: Labels, extra: str = "") -> str:
+            pairs = [f'{k}="{v}"' for k, v in zip(LABEL_NAMES, labels)]
+            return "{" + ",".join(pairs + ([extra] if extra else [])) + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            for name, values in self._counters.items():
+                lines += [f"# HELP chefbot_{name} {COUNTERS[name]}", f"# TYPE chefbot_{name} counter"]
+                lines += [f"chefbot_{name}{_fmt(labels)} {value:g}" for labels, value in sorted(values.items())]
+            for name, values in self._histograms.items():
+                lines += [f"# HELP chefbot_{name} {HISTOGRAMS[name]}", f"# TYPE chefbot_{name} histogram"]
+                for labels, hist in sorted(values.items()):
+                    for upper, cumulative in hist.buckets():
+                        le = 'le="%.6g"' % upper
+                        lines.append(f"chefbot_{name}_bucket{_fmt(labels, le)} {cumulative}")
+                    inf = 'le="+Inf"'
+                    lines.append(f"chefbot_{name}_bucket{_fmt(labels, inf)} {hist.count}")
+                    lines.append(f"chefbot_{name}_sum{_fmt(labels)} {hist.total:.6g}")
+                    lines.append(f"chefbot_{name}_count{_fmt(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, directory: str = DEFAULT_METRICS_DIR) -> str:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "metrics.prom"), "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        with open(os.path.join(directory, "metrics.json"), "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        return directory
+
+    def empty(self) -> bool:
+        return not any(self._counters["llm_calls_total"]) and not any(self._counters["llm_cache_hits_total"])
+
+
+metrics = MetricsRegistry()
+
+
+@atexit.register
+def _write_at_exit() -> None:
+    if ENABLED and not metrics.empty():
+        try:
+            metrics.write_snapshot()
+        except OSError:
+            pass
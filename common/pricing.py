@@ -0,0 +1,23 @@
+"""
+Groq list prices used to turn token usage into a cost estimate.
+
+USD per million tokens (input, output). Update when Groq changes its pricing;
+unknown models are costed at 0.
+"""
+from __future__ import annotations
+
+from typing import Dict, Tuple
+
+MODEL_PRICES_USD_PER_M: Dict[str, Tuple[float, float]] = {
+    "openai/gpt-oss-120b": (0.15, 0.75),
+    "openai/gpt-oss-20b": (0.10, 0.50),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+}
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    # "groq/llama-3.3-70b-versatile" (LiteLLM) -> "llama-3.3-70b-versatile"
+    name = model[len("groq/"):] if model.startswith("groq/") else model
+    price_in, price_out = MODEL_PRICES_USD_PER_M.get(name, (0.0, 0.0))
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
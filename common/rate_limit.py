@@ -0,0 +1,295 @@
+"""
+Process-wide rate limiting for every Groq / LiteLLM call.
+
+- two token buckets: requests/minute and tokens/minute (reservations may go
+  into debt; the caller sleeps until its reservation is covered)
+- AIMD concurrency: +1/limit slot per success, halved on a 429, and no new
+  call before the provider's retry-after has elapsed
+- queue-wait statistics (time spent waiting for a slot + bucket)
+- an attempt abandoned by common/resilience.py (deadline, hedge loser) gives
+  its concurrency slot back at once instead of when its request finally ends
+
+Defaults match Groq's free tier; set CHEFBOT_RPM / CHEFBOT_TPM /
+CHEFBOT_MAX_CONCURRENCY to the account limits.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from common.metrics import metrics
+
+T = TypeVar("T")
+
+# Réponse attendue ajoutée à l'estimation du prompt (corrigée avec l'usage réel)
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Debit `amount` now; return how long to wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            self.level -= amount
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float) -> None:
+        with self._lock:
+            self.level = min(self.capacity, self.level + amount)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after_s(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def estimate_tokens(messages: Any) -> int:
+    return len(json.dumps(messages, ensure_ascii=False, default=str)) // 4 + DEFAULT_COMPLETION_TOKENS
+
+
+class AttemptAbandoned(Exception):
+    """Raised instead of taking a slot for an attempt the caller no longer waits for."""
+
+
+class AttemptScope:
+    """
+    Slots taken by one attempt run in a worker thread by common/resilience.py.
+    abandon() gives them back at once; the request itself keeps running and its
+    real token usage is still recorded when it ends.
+    """
+
+    def __init__(self) -> None:
+        self.abandoned = False
+        self._slots: List["Slot"] = []
+        self._lock = threading.Lock()
+
+    def add(self, slot: "Slot") -> bool:
+        with self._lock:
+            if not self.abandoned:
+                self._slots.append(slot)
+            return not self.abandoned
+
+    def abandon(self) -> None:
+        with self._lock:
+            self.abandoned = True
+            slots, self._slots = self._slots, []
+        for slot in slots:
+            slot.release(None, adapt=False)
+
+
+# Tentative en cours dans ce contexte (posée par resilience._submit)
+attempt_scope: ContextVar[Optional[AttemptScope]] = ContextVar("chefbot_attempt_scope", default=None)
+
+
+class Slot:
+    def __init__(self, limiter: "RateLimiter", estimated_tokens: int, queue_wait_s: float, model: str):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.queue_wait_s = queue_wait_s
+        self.model = model
+        self.started = time.perf_counter()
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self._released = False
+
+    def record_usage(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+        """Correct the tokens/minute bucket with the real usage of the call."""
+        self.prompt_tokens, self.completion_tokens = prompt_tokens, completion_tokens
+        if prompt_tokens is not None or completion_tokens is not None:
+            self.limiter._tokens.refund(self.estimated_tokens - (prompt_tokens or 0) - (completion_tokens or 0))
+
+    def release(self, error: Optional[BaseException], adapt: bool = True) -> None:
+        """Give the concurrency slot back (once: an abandoned slot is released before close())."""
+        with self.limiter._cond:
+            if self._released:
+                return
+            self._released = True
+        self.limiter._release(error, adapt)
+
+    def close(self, error: Optional[BaseException]) -> None:
+        self.release(error)
+        metrics.record_call(
+            self.model,
+            latency_s=time.perf_counter() - self.started,
+            queue_wait_s=self.queue_wait_s,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            error=error is not None,
+        )
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rpm: float = 30,
+        tpm: float = 8000,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+    ):
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._cond = threading.Condition()
+
+        self.calls = 0
+        self.rate_limited = 0
+        self.queue_wait_total_s = 0.0
+        self.queue_wait_max_s = 0.0
+
+    # ------------------------------------------------------------- slots
+    def _try_enter(self) -> float:
+        """0 if a slot was taken, else how long to wait before retrying."""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._in_flight < max(self.min_concurrency, int(self.limit)):
+            self._in_flight += 1
+            return 0.0
+        return 0.05
+
+    def _release(self, error: Optional[BaseException], adapt: bool = True) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            # adapt=False: slot rendu par une tentative abandonnée, rien à apprendre sur le débit
+            if adapt and error is not None and is_rate_limit_error(error):
+                # AIMD: décroissance multiplicative + pause imposée par le fournisseur
+                self.rate_limited += 1
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                self._blocked_until = max(self._blocked_until, time.monotonic() + (retry_after_s(error) or 1.0))
+            elif adapt and error is None:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def _account(self, start: float) -> float:
+        waited = time.monotonic() - start
+        with self._cond:
+            self.calls += 1
+            self.queue_wait_total_s += waited
+            self.queue_wait_max_s = max(self.queue_wait_max_s, waited)
+        return waited
+
+    def _open(self, estimated_tokens: int, model: str, start: float) -> Slot:
+        slot = Slot(self, estimated_tokens, self._account(start), model)
+        scope = attempt_scope.get()
+        if scope is not None and not scope.add(slot):
+            # Tentative abandonnée pendant l'attente: la requête n'est pas envoyée
+            slot.release(None, adapt=False)
+            raise AttemptAbandoned("LLM attempt abandoned before it was sent")
+        return slot
+
+    @contextmanager
+    def slot(self, estimated_tokens: int, model: str = "") -> Iterator[Slot]:
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                delay = self._try_enter()
+                if not delay:
+                    break
+                self._cond.wait(delay)
+        delay = max(self._requests.reserve(1), self._tokens.reserve(estimated_tokens))
+        if delay > 0:
+            time.sleep(delay)
+
+        slot = self._open(estimated_tokens, model, start)
+        try:
+            yield slot
+        except BaseException as e:
+            slot.close(e)
+            raise
+        slot.close(None)
+
+    @asynccontextmanager
+    async def aslot(self, estimated_tokens: int, model: str = "") -> AsyncIterator[Slot]:
+        start = time.monotonic()
+        while True:
+            with self._cond:
+                delay = self._try_enter()
+            if not delay:
+                break
+            await asyncio.sleep(delay)
+        delay = max(self._requests.reserve(1), self._tokens.reserve(estimated_tokens))
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        slot = self._open(estimated_tokens, model, start)
+        try:
+            yield slot
+        except BaseException as e:
+            slot.close(e)
+            raise
+        slot.close(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "rate_limited": self.rate_limited,
+            "concurrency_limit": round(self.limit, 2),
+            "queue_wait_total_s": round(self.queue_wait_total_s, 3),
+            "queue_wait_max_s": round(self.queue_wait_max_s, 3),
+            "queue_wait_avg_s": round(self.queue_wait_total_s / self.calls, 3) if self.calls else None,
+        }
+
+
+def usage_tokens(response: Any) -> Tuple[Optional[int], Optional[int]]:
+    """(prompt_tokens, completion_tokens) of an OpenAI-style response."""
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(
+                rpm=float(os.getenv("CHEFBOT_RPM", "30")),
+                tpm=float(os.getenv("CHEFBOT_TPM", "8000")),
+                max_concurrency=int(os.getenv("CHEFBOT_MAX_CONCURRENCY", "8")),
+            )
+        return _rate_limiter
+
+
+def run_limited(
+    call: Callable[[], T],
+    messages: Any,
+    model: str = "",
+    usage: Callable[[T], Tuple[Optional[int], Optional[int]]] = usage_tokens,
+) -> T:
+    """Run one LLM call through the process-wide limiter (and record its metrics)."""
+    with get_rate_limiter().slot(estimate_tokens(messages), model) as slot:
+        result = call()
+        slot.record_usage(*usage(result))
+        return result
@@ -0,0 +1,278 @@
+"""
+Resilient LLM calls: jittered exponential backoff, optional hedging, deadlines.
+
+- transient errors (429, 5xx, timeouts, dropped connections) are retried with
+  "full jitter" backoff; a 429's retry-after is honoured
+- hedging (CHEFBOT_HEDGE=1): if an attempt is still running after the p95
+  latency observed for that model, a duplicate is sent and the first
+  successful answer wins (sync losers finish in the background without
+  holding a rate-limiter slot, async losers are cancelled)
+- every call has a deadline covering all its attempts (CHEFBOT_CALL_DEADLINE_S)
+
+Without hedging a sync attempt runs in the calling thread (no thread hop): the
+deadline is then checked between attempts and the HTTP timeout bounds each
+one. With hedging, attempts run on a shared pool; one that is abandoned (hedge
+loser, deadline) gives its rate-limiter slot back at once.
+
+Each attempt still goes through the rate limiter, so hedges and retries are
+counted against the RPM/TPM budget like any other call.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from common.rate_limit import AttemptScope, attempt_scope, is_rate_limit_error, retry_after_s
+
+T = TypeVar("T")
+
+# Échantillons minimum avant de calculer un p95 fiable pour le hedging
+MIN_HEDGE_SAMPLES = 20
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = field(default_factory=lambda: int(os.getenv("CHEFBOT_MAX_ATTEMPTS", "4")))
+    base_delay_s: float = 0.5
+    max_delay_s: float = 20.0
+    deadline_s: float = field(default_factory=lambda: float(os.getenv("CHEFBOT_CALL_DEADLINE_S", "180")))
+    hedge: bool = field(default_factory=lambda: os.getenv("CHEFBOT_HEDGE", "0") == "1")
+    hedge_min_delay_s: float = 1.0
+
+    def backoff_s(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(0, min(self.max_delay_s, self.base_delay_s * 2 ** attempt))
+        hint = retry_after_s(error) if is_rate_limit_error(error) else None
+        return max(delay, hint or 0.0)
+
+
+def is_transient(error: BaseException) -> bool:
+    if is_rate_limit_error(error) or isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status >= 500 or status == 408
+    name = type(error).__name__
+    return any(word in name for word in ("Timeout", "Connection", "ServiceUnavailable", "InternalServer"))
+
+
+# =============================================================================
+# LATENCY TRACKING (p95 par modèle -> délai de hedging)
+# =============================================================================
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, latency_s: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(latency_s)
+
+    def quantile(self, key: str, q: float = 0.95) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+latencies = LatencyTracker()
+
+_stats = {"calls": 0, "retries": 0, "hedges_sent": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def resilience_stats() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _hedge_delay(key: str, policy: RetryPolicy) -> Optional[float]:
+    if not policy.hedge:
+        return None
+    p95 = latencies.quantile(key)
+    return None if p95 is None else max(policy.hedge_min_delay_s, p95)
+
+
+# =============================================================================
+# SYNC
+# =============================================================================
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="chefbot-llm")
+
+
+def _submit(call: Callable[[], T]) -> Tuple["Future[T]", AttemptScope]:
+    # copy_context: les spans Langfuse du thread appelant restent parents
+    ctx = copy_context()
+    scope = AttemptScope()
+    ctx.run(attempt_scope.set, scope)
+    return _executor.submit(ctx.run, call), scope
+
+
+def _attempt_inline(call: Callable[[], T], key: str, policy: RetryPolicy, deadline: float) -> T:
+    if time.monotonic() >= deadline:
+        _count("deadline_exceeded")
+        raise DeadlineExceeded(f"LLM call exceeded its {policy.deadline_s:g}s deadline")
+    start = time.monotonic()
+    result = call()
+    latencies.record(key, time.monotonic() - start)
+    return result
+
+
+def _attempt(call: Callable[[], T], key: str, policy: RetryPolicy, deadline: float) -> T:
+    if not policy.hedge:
+        return _attempt_inline(call, key, policy, deadline)
+
+    start = time.monotonic()
+    first, scope = _submit(call)
+    pending: Dict[Future, AttemptScope] = {first: scope}
+    hedge: Optional[Future] = None
+    hedge_delay = _hedge_delay(key, policy)
+    error: Optional[BaseException] = None
+
+    try:
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = remaining
+            if hedge_delay is not None and len(pending) == 1 and error is None:
+                timeout = min(remaining, max(0.0, start + hedge_delay - time.monotonic()))
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                if hedge_delay is not None and error is None and len(pending) == 1:
+                    _count("hedges_sent")
+                    hedge, scope = _submit(call)
+                    pending[hedge] = scope
+                    hedge_delay = None
+                continue
+
+            for future in done:
+                del pending[future]
+                if future.exception() is None:
+                    latencies.record(key, time.monotonic() - start)
+                    if future is hedge:
+                        _count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+    finally:
+        # Tentatives encore en cours: plus attendues, leur slot du limiteur est rendu
+        for scope in pending.values():
+            scope.abandon()
+
+    if error is not None and not pending:
+        raise error
+    _count("deadline_exceeded")
+    raise DeadlineExceeded(f"LLM call exceeded its {policy.deadline_s:g}s deadline")
+
+
+def resilient_call(call: Callable[[], T], key: str = "default", policy: Optional[RetryPolicy] = None) -> T:
+    """Run `call` with retries on transient errors, optional hedging and a deadline."""
+    policy = policy or RetryPolicy()
+    deadline = time.monotonic() + policy.deadline_s
+    _count("calls")
+
+    for attempt in range(policy.max_attempts):
+        try:
+            return _attempt(call, key, policy, deadline)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if not is_transient(e) or attempt == policy.max_attempts - 1:
+                raise
+            delay = policy.backoff_s(attempt, e)
+            if time.monotonic() + delay >= deadline:
+                raise
+            _count("retries")
+            time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+# =============================================================================
+# ASYNC
+# =============================================================================
+
+async def _aattempt(make_call: Callable[[], Awaitable[T]], key: str, policy: RetryPolicy, deadline: float) -> T:
+    start = time.monotonic()
+    pending = {asyncio.ensure_future(make_call())}
+    hedge: Optional[asyncio.Future] = None
+    hedge_delay = _hedge_delay(key, policy)
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = remaining
+            if hedge_delay is not None and len(pending) == 1 and error is None:
+                timeout = min(remaining, max(0.0, start + hedge_delay - time.monotonic()))
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                if hedge_delay is not None and error is None and len(pending) == 1:
+                    _count("hedges_sent")
+                    hedge = asyncio.ensure_future(make_call())
+                    pending.add(hedge)
+                    hedge_delay = None
+                continue
+
+            for task in done:
+                if task.exception() is None:
+                    latencies.record(key, time.monotonic() - start)
+                    if task is hedge:
+                        _count("hedge_wins")
+                    return task.result()
+                error = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if error is not None and not pending:
+        raise error
+    _count("deadline_exceeded")
+    raise DeadlineExceeded(f"LLM call exceeded its {policy.deadline_s:g}s deadline")
+
+
+async def aresilient_call(
+    make_call: Callable[[], Awaitable[T]],
+    key: str = "default",
+    policy: Optional[RetryPolicy] = None,
+) -> T:
+    """Async counterpart of resilient_call; `make_call` builds a fresh coroutine per attempt."""
+    policy = policy or RetryPolicy()
+    deadline = time.monotonic() + policy.deadline_s
+    _count("calls")
+
+    for attempt in range(policy.max_attempts):
+        try:
+            return await _aattempt(make_call, key, policy, deadline)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if not is_transient(e) or attempt == policy.max_attempts - 1:
+                raise
+            delay = policy.backoff_s(attempt, e)
+            if time.monotonic() + delay >= deadline:
+                raise
+            _count("retries")
+            await asyncio.sleep(delay)
+    raise AssertionError("unreachable")
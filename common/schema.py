@@ -0,0 +1,171 @@
+"""
+Minimal JSON-schema support for structured LLM answers.
+
+- response_format_for(): provider structured-output parameter (json_schema on
+  models that support it, json_object otherwise).
+- coerce(): cheap local repair (defaults, "3" -> 3, scalar -> [scalar]).
+- validate(): remaining errors with their path, so only the broken fields
+  need to be asked again.
+
+Only the subset of JSON Schema we use is handled: type, properties, required,
+items, minItems, enum, default.
+"""
+from __future__ import annotations
+
+import copy
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple, Union
+
+Path = Tuple[Union[str, int], ...]
+
+# Modèles Groq qui acceptent response_format={"type": "json_schema", ...}
+JSON_SCHEMA_MODELS = {
+    "openai/gpt-oss-120b",
+    "openai/gpt-oss-20b",
+    "moonshotai/kimi-k2-instruct",
+    "meta-llama/llama-4-maverick-17b-128e-instruct",
+    "meta-llama/llama-4-scout-17b-16e-instruct",
+}
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+
+@dataclass
+class SchemaError:
+    path: Path
+    kind: str  # missing / type / enum / min_items
+    message: str
+
+    @property
+    def dotted(self) -> str:
+        out = ""
+        for part in self.path:
+            out += f"[{part}]" if isinstance(part, int) else (f".{part}" if out else part)
+        return out or "$"
+
+
+def _strip_defaults(schema: Any) -> Any:
+    if isinstance(schema, dict):
+        return {k: _strip_defaults(v) for k, v in schema.items() if k != "default"}
+    if isinstance(schema, list):
+        return [_strip_defaults(v) for v in schema]
+    return schema
+
+
+def response_format_for(model: str, name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    if model in JSON_SCHEMA_MODELS:
+        return {"type": "json_schema", "json_schema": {"name": name, "schema": _strip_defaults(schema)}}
+    return {"type": "json_object"}
+
+
+def _nullable(schema: Dict[str, Any]) -> bool:
+    types = schema.get("type")
+    return isinstance(types, list) and "null" in types
+
+
+def _value_type(schema: Dict[str, Any]) -> Any:
+    # "type": ["array", "null"] -> "array" (un champ nullable se contrôle sur son type non nul)
+    types = schema.get("type")
+    if isinstance(types, list):
+        return next((t for t in types if t != "null"), None)
+    return types
+
+
+def _is_type(value: Any, expected: str) -> bool:
+    if expected in ("integer", "number") and isinstance(value, bool):
+        return False
+    return isinstance(value, _TYPES[expected])
+
+
+def coerce(value: Any, schema: Dict[str, Any]) -> Tuple[Any, int]:
+    """Return (repaired copy, number of local fixes)."""
+    fixes = 0
+
+    def _walk(v: Any, s: Dict[str, Any]) -> Any:
+        nonlocal fixes
+        expected = _value_type(s)
+        if expected == "integer" and isinstance(v, str) and v.strip().lstrip("-").isdigit():
+            fixes += 1
+            return int(v.strip())
+        if expected == "integer" and isinstance(v, float) and v.is_integer():
+            fixes += 1
+            return int(v)
+        if expected == "number" and isinstance(v, str):
+            try:
+                fixes += 1
+                return float(v.replace(",", "."))
+            except ValueError:
+                fixes -= 1
+        if expected == "string" and isinstance(v, (int, float)) and not isinstance(v, bool):
+            fixes += 1
+            return str(v)
+        if expected == "array":
+            if v is not None and not isinstance(v, list):
+                fixes += 1
+                v = [v]
+            if isinstance(v, list) and "items" in s:
+                return [_walk(item, s["items"]) for item in v]
+        if expected == "object" and isinstance(v, dict):
+            out = dict(v)
+            for key, sub in s.get("properties", {}).items():
+                if out.get(key) is None and "default" in sub:
+                    fixes += 1
+                    out[key] = copy.deepcopy(sub["default"])
+                elif key in out:
+                    out[key] = _walk(out[key], sub)
+            return out
+        return v
+
+    return _walk(copy.deepcopy(value), schema), fixes
+
+
+def validate(value: Any, schema: Dict[str, Any], path: Path = ()) -> List[SchemaError]:
+    if value is None and _nullable(schema):
+        return []
+    expected = _value_type(schema)
+    if expected and not _is_type(value, expected):
+        return [SchemaError(path, "type", f"attendu {expected}, reçu {type(value).__name__}")]
+    if "enum" in schema and value not in schema["enum"]:
+        return [SchemaError(path, "enum", f"valeur hors de {schema['enum']}")]
+
+    errors: List[SchemaError] = []
+    if expected == "object":
+        for key in schema.get("required", []):
+            # Requis pour le mode strict, mais un champ nullable absent vaut null en local
+            if value.get(key) is None and not _nullable(schema.get("properties", {}).get(key, {})):
+                errors.append(SchemaError(path + (key,), "missing", "champ manquant"))
+        for key, sub in schema.get("properties", {}).items():
+            if value.get(key) is not None:
+                errors.extend(validate(value[key], sub, path + (key,)))
+    elif expected == "array":
+        if len(value) < schema.get("minItems", 0):
+            errors.append(SchemaError(path, "min_items", f"au moins {schema['minItems']} éléments"))
+        if "items" in schema:
+            for i, item in enumerate(value):
+                errors.extend(validate(item, schema["items"], path + (i,)))
+    return errors
+
+
+def subschema(schema: Dict[str, Any], path: Path) -> Dict[str, Any]:
+    for part in path:
+        schema = schema["items"] if isinstance(part, int) else schema.get("properties", {}).get(part, {})
+    return schema
+
+
+def set_path(value: Any, path: Path, new: Any) -> None:
+    for part in path[:-1]:
+        value = value[part]
+    value[path[-1]] = new
+
+
+def get_path(value: Any, path: Path) -> Any:
+    for part in path:
+        value = value[part]
+    return value
@@ -0,0 +1,178 @@
+"""
+Streaming helpers shared by the ChefBot parts.
+
+Turns a Groq streaming completion into a plain iterator of text chunks and
+records time-to-first-token, tokens/sec and total latency on a Langfuse
+generation span that lives exactly as long as the stream.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langfuse import get_client
+
+from common.rate_limit import estimate_tokens, get_rate_limiter
+
+
+@dataclass
+class StreamStats:
+    start: float = field(default_factory=time.perf_counter)
+    first_token_at: Optional[float] = None
+    first_token_time: Optional[datetime] = None
+    end: Optional[float] = None
+    chunks: int = 0
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    queue_wait_s: Optional[float] = None
+    parts: List[str] = field(default_factory=list)
+
+    def on_chunk(self, chunk: Any) -> str:
+        """Update the counters with one streamed chunk and return its text delta."""
+        usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+        if usage is not None:
+            self.prompt_tokens = getattr(usage, "prompt_tokens", self.prompt_tokens)
+            self.completion_tokens = getattr(usage, "completion_tokens", self.completion_tokens)
+
+        choices = getattr(chunk, "choices", None) or []
+        text = (getattr(choices[0].delta, "content", None) or "") if choices else ""
+        if text:
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+                self.first_token_time = datetime.now(timezone.utc)
+            self.chunks += 1
+            self.parts.append(text)
+        return text
+
+    def finish(self) -> None:
+        if self.end is None:
+            self.end = time.perf_counter()
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def ttft_s(self) -> Optional[float]:
+        return None if self.first_token_at is None else self.first_token_at - self.start
+
+    @property
+    def total_s(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def tokens_per_s(self) -> Optional[float]:
+        # Débit de génération: tokens produits après le premier token.
+        tokens = self.completion_tokens if self.completion_tokens is not None else self.chunks
+        if self.first_token_at is None or not tokens:
+            return None
+        gen_s = (self.end or time.perf_counter()) - self.first_token_at
+        return tokens / gen_s if gen_s > 0 else None
+
+    def as_metadata(self) -> Dict[str, Any]:
+        def _r(x: Optional[float]) -> Optional[float]:
+            return None if x is None else round(x, 3)
+
+        return {
+            "stream": True,
+            "ttft_s": _r(self.ttft_s),
+            "tokens_per_s": _r(self.tokens_per_s),
+            "total_latency_s": _r(self.total_s),
+            "chunks": self.chunks,
+            "completion_tokens": self.completion_tokens,
+            "queue_wait_s": _r(self.queue_wait_s),
+        }
+
+
+
+def _start_generation(name: str, model: str, messages: List[Dict[str, str]], temperature: float, metadata: Optional[Dict[str, Any]]):
+    return get_client().start_observation(
+        name=name,
+        as_type="generation",
+        model=model,
+        input=messages,
+        model_parameters={"temperature": temperature},
+        metadata=metadata,
+    )
+
+
+def _end_generation(generation: Any, stats: StreamStats, metadata: Optional[Dict[str, Any]]) -> None:
+    stats.finish()
+    usage = {}
+    if stats.prompt_tokens is not None:
+        usage["input"] = stats.prompt_tokens
+    if stats.completion_tokens is not None:
+        usage["output"] = stats.completion_tokens
+    generation.update(
+        output=stats.text,
+        completion_start_time=stats.first_token_time,
+        usage_details=usage or None,
+        metadata={**(metadata or {}), **stats.as_metadata()},
+    )
+    generation.end()
+
+
+def stream_completion(
+    client: Any,
+    *,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    name: str = "chat_stream",
+    metadata: Optional[Dict[str, Any]] = None,
+    **kwargs: Any,
+) -> Iterator[str]:
+    """Yield text chunks from `client.chat.completions.create(stream=True)`."""
+    stats = StreamStats()
+    generation = _start_generation(name, model, messages, temperature, metadata)
+    try:
+        # Le créneau du limiteur est tenu pendant toute la durée du flux
+        with get_rate_limiter().slot(estimate_tokens(messages), model) as slot:
+            stats = StreamStats(queue_wait_s=slot.queue_wait_s)
+            stream = client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, stream=True, **kwargs
+            )
+            for chunk in stream:
+                text = stats.on_chunk(chunk)
+                if text:
+                    yield text
+            slot.record_usage(stats.prompt_tokens, stats.completion_tokens)
+    except Exception as e:
+        generation.update(level="ERROR", status_message=str(e))
+        raise
+    finally:
+        _end_generation(generation, stats, metadata)
+
+
+async def astream_completion(
+    client: Any,
+    *,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    name: str = "chat_stream",
+    metadata: Optional[Dict[str, Any]] = None,
+    **kwargs: Any,
+) -> AsyncIterator[str]:
+    """Async counterpart of stream_completion for an AsyncGroq client."""
+    stats = StreamStats()
+    generation = _start_generation(name, model, messages, temperature, metadata)
+    try:
+        # Le créneau du limiteur est tenu pendant toute la durée du flux
+        async with get_rate_limiter().aslot(estimate_tokens(messages), model) as slot:
+            stats = StreamStats(queue_wait_s=slot.queue_wait_s)
+            stream = await client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, stream=True, **kwargs
+            )
+            async for chunk in stream:
+                text = stats.on_chunk(chunk)
+                if text:
+                    yield text
+            slot.record_usage(stats.prompt_tokens, stats.completion_tokens)
+    except Exception as e:
+        generation.update(level="ERROR", status_message=str(e))
+        raise
+    finally:
+        _end_generation(generation, stats, metadata)
@@ -0,0 +1,291 @@
+"""
+Tracing policy on top of Langfuse's @observe.
+
+`observe` is a drop-in replacement for `langfuse.observe` that decides, for
+each call, whether a span is actually created:
+
+- head-based sampling: a root span is kept with the rate configured for its
+  name, and its descendants follow that decision (a dropped trace never
+  produces orphan child traces); a nested span is only sampled again when
+  its name has its own rate ("*" applies to roots only)
+- errors are always traced: a call that raises while not sampled still
+  sends one ERROR span with its input and the exception
+- leaf functions (`@observe(leaf=True)`, e.g. the simulated tools) become
+  aggregated counters (calls, errors, time) instead of spans; the counters
+  are attached to the metadata of the enclosing span and kept process-wide
+  in `span_counters`
+
+Configuration:
+- CHEFBOT_TRACE_SAMPLE: "0.1" (every name) or "experiment=1,planner=0.2,*=0.5"
+- CHEFBOT_TRACE_LEAVES: "counters" (default) or "spans" to trace leaves again
+- CHEFBOT_TRACE_POLICY=0: plain langfuse.observe, no policy at all
+"""
+from __future__ import annotations
+
+import atexit
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from langfuse import get_client
+from langfuse import observe as langfuse_observe
+
+from common.metrics import DEFAULT_METRICS_DIR
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+ENABLED = os.getenv("CHEFBOT_TRACE_POLICY", "1") != "0"
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    """ "0.2" -> {"*": 0.2}; "plan=1,*=0.5" -> {"plan": 1.0, "*": 0.5} """
+    rates: Dict[str, float] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, sep, value = item.rpartition("=")
+        rates[name.strip() if sep else "*"] = min(1.0, max(0.0, float(value)))
+    return rates
+
+
+class TracingPolicy:
+    def __init__(
+        self,
+        rates: Optional[Dict[str, float]] = None,
+        leaves_as_counters: bool = True,
+        seed: Optional[int] = None,
+    ):
+        self.rates = dict(rates or {})
+        self.leaves_as_counters = leaves_as_counters
+        self._random = random.Random(seed).random
+
+    @classmethod
+    def from_env(cls) -> "TracingPolicy":
+        return cls(
+            rates=_parse_rates(os.getenv("CHEFBOT_TRACE_SAMPLE", "")),
+            leaves_as_counters=os.getenv("CHEFBOT_TRACE_LEAVES", "counters") != "spans",
+        )
+
+    def rate(self, name: str) -> float:
+        return self.rates.get(name, self.rates.get("*", 1.0))
+
+    def sample(self, name: str) -> bool:
+        rate = self.rate(name)
+        return rate >= 1.0 or (rate > 0.0 and self._random() < rate)
+
+
+_policy = TracingPolicy.from_env()
+
+
+def get_tracing_policy() -> TracingPolicy:
+    return _policy
+
+
+def set_tracing_policy(policy: TracingPolicy) -> TracingPolicy:
+    """Replace the process-wide policy (tests, benchmarks); returns the previous one."""
+    global _policy
+    previous, _policy = _policy, policy
+    return previous
+
+
+# =============================================================================
+# LEAF COUNTERS
+# =============================================================================
+
+class SpanCounters:
+    """Calls / errors / time per span name for calls that produced no span."""
+
+    def __init__(self) -> None:
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, kind: str, elapsed_s: float = 0.0, error: bool = False) -> None:
+        with self._lock:
+            entry = self._stats.get(name)
+            if entry is None:
+                entry = self._stats[name] = {"counted": 0, "sampled_out": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0}
+            entry[kind] += 1
+            entry["errors"] += error
+            entry["total_s"] += elapsed_s
+            entry["max_s"] = max(entry["max_s"], elapsed_s)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: {k: round(v, 6) if isinstance(v, float) else v for k, v in entry.items()} for name, entry in sorted(self._stats.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def write_snapshot(self, directory: str = DEFAULT_METRICS_DIR) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "tracing.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        return path
+
+
+span_counters = SpanCounters()
+
+# None = pas encore de décision (racine), True = trace gardée, False = trace abandonnée
+_sampled: ContextVar[Optional[bool]] = ContextVar("chefbot_trace_sampled", default=None)
+# Compteurs des feuilles appelées sous le span courant, remontés dans ses métadonnées
+_leaf_calls: ContextVar[Optional[Dict[str, Dict[str, float]]]] = ContextVar("chefbot_leaf_calls", default=None)
+
+
+def _count_leaf(name: str, elapsed_s: float, error: bool) -> None:
+    span_counters.record(name, "counted", elapsed_s, error)
+    local = _leaf_calls.get()
+    if local is not None:
+        entry = local.setdefault(name, {"calls": 0, "errors": 0, "total_s": 0.0})
+        entry["calls"] += 1
+        entry["errors"] += error
+        entry["total_s"] += elapsed_s
+
+
+def _flush_leaf_calls(local: Dict[str, Dict[str, float]]) -> None:
+    if local:
+        leaf_calls = {name: {**entry, "total_s": round(entry["total_s"], 6)} for name, entry in local.items()}
+        get_client().update_current_span(metadata={"leaf_calls": leaf_calls})
+
+
+def _error_span(name: str, mode: str, args: tuple, kwargs: dict, error: BaseException, elapsed_s: float) -> None:
+    # Appel non tracé qui échoue: un span ERROR isolé, pour ne jamais perdre une erreur
+    try:
+        span = get_client().start_span(
+            name=name,
+            input={"args": args, "kwargs": kwargs},
+            metadata={"untraced_reason": mode, "elapsed_s": round(elapsed_s, 6)},
+            level="ERROR",
+            status_message=f"{type(error).__name__}: {error}",
+        )
+        span.end()
+    except Exception:
+        pass
+
+
+# =============================================================================
+# DECORATOR
+# =============================================================================
+
+def observe(func: Optional[F] = None, *, name: Optional[str] = None, leaf: bool = False, **kwargs: Any) -> Any:
+    """langfuse.observe with sampling, error capture and leaf counters (see module docstring)."""
+    if func is None:
+        return lambda f: observe(f, name=name, leaf=leaf, **kwargs)
+    if not ENABLED:
+        return langfuse_observe(func, name=name, **kwargs)
+
+    span_name = name or func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def collecting_async(*args: Any, **kw: Any) -> Any:
+            token = _leaf_calls.set({})
+            try:
+                return await func(*args, **kw)
+            finally:
+                _flush_leaf_calls(_leaf_calls.get() or {})
+                _leaf_calls.reset(token)
+
+        traced = langfuse_observe(collecting_async, name=span_name, **kwargs)
+
+        @functools.wraps(func)
+        async def async_wrapper(*args: Any, **kw: Any) -> Any:
+            mode = _decide(span_name, leaf)
+            if mode == "span":
+                token = _sampled.set(True)
+                try:
+                    return await traced(*args, **kw)
+                finally:
+                    _sampled.reset(token)
+            token = _sampled.set(False) if mode == "dropped" else None
+            start = time.perf_counter()
+            try:
+                result = await func(*args, **kw)
+            except BaseException as e:
+                _untraced_done(span_name, mode, time.perf_counter() - start, args, kw, e)
+                raise
+            finally:
+                if token is not None:
+                    _sampled.reset(token)
+            _untraced_done(span_name, mode, time.perf_counter() - start)
+            return result
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def collecting(*args: Any, **kw: Any) -> Any:
+        token = _leaf_calls.set({})
+        try:
+            return func(*args, **kw)
+        finally:
+            _flush_leaf_calls(_leaf_calls.get() or {})
+            _leaf_calls.reset(token)
+
+    traced = langfuse_observe(collecting, name=span_name, **kwargs)
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kw: Any) -> Any:
+        mode = _decide(span_name, leaf)
+        if mode == "span":
+            token = _sampled.set(True)
+            try:
+                return traced(*args, **kw)
+            finally:
+                _sampled.reset(token)
+        token = _sampled.set(False) if mode == "dropped" else None
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kw)
+        except BaseException as e:
+            _untraced_done(span_name, mode, time.perf_counter() - start, args, kw, e)
+            raise
+        finally:
+            if token is not None:
+                _sampled.reset(token)
+        _untraced_done(span_name, mode, time.perf_counter() - start)
+        return result
+
+    return wrapper
+
+
+def _decide(name: str, leaf: bool) -> str:
+    """'span', 'counter' (leaf, parent decision unchanged) or 'dropped' (this span and its subtree)."""
+    parent = _sampled.get()
+    if parent is False:
+        return "dropped"
+    if leaf and _policy.leaves_as_counters:
+        return "counter"
+    # Sous une trace gardée, seul un taux propre au nom ré-échantillonne ("*" ne vaut que pour les racines)
+    if parent is True and name not in _policy.rates:
+        return "span"
+    return "span" if _policy.sample(name) else "dropped"
+
+
+def _untraced_done(
+    name: str,
+    mode: str,
+    elapsed_s: float,
+    args: tuple = (),
+    kwargs: Optional[dict] = None,
+    error: Optional[BaseException] = None,
+) -> None:
+    if mode == "counter":
+        _count_leaf(name, elapsed_s, error is not None)
+    else:
+        span_counters.record(name, "sampled_out", elapsed_s, error is not None)
+    if isinstance(error, Exception):
+        _error_span(name, mode, args, kwargs or {}, error, elapsed_s)
+
+
+@atexit.register
+def _write_at_exit() -> None:
+    if ENABLED and span_counters.snapshot():
+        try:
+            span_counters.write_snapshot()
+        except OSError:
+            pass